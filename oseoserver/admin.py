@@ -165,6 +165,7 @@ class OrderAdmin(admin.ModelAdmin):
                 "priority",
                 "packaging",
                 "extensions",
+                "estimated_batches",
                 #"selected_options",
             )
         }),
@@ -198,8 +199,23 @@ class OrderAdmin(admin.ModelAdmin):
         "status_changed_on",
         "completed_on",
         "last_describe_result_access_request",
+        "estimated_batches",
     )
     date_hierarchy = "created_on"
+    actions = ["refresh_estimated_batches"]
+
+    def refresh_estimated_batches(self, request, queryset):
+        massive_orders = queryset.filter(
+            order_type=models.Order.MASSIVE_ORDER)
+        for order in massive_orders:
+            order.refresh_estimated_batches()
+        self.message_user(
+            request,
+            message="Refreshed the estimated number of batches of {} "
+                    "massive orders".format(len(massive_orders))
+        )
+    refresh_estimated_batches.short_description = (
+        "Refresh the estimated number of batches of selected massive orders")
 
 
 @admin.register(models.OrderPendingModeration)
@@ -400,3 +416,32 @@ class DeliveryInformationAdmin(admin.ModelAdmin):
     readonly_fields = (
         "order",
     )
+
+
+@admin.register(models.Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "kind",
+        "order",
+        "created_on",
+        "sent_on",
+        "attempts",
+    )
+    list_filter = (
+        "kind",
+    )
+    readonly_fields = (
+        "kind",
+        "order",
+        "arguments",
+        "created_on",
+        "sent_on",
+        "error",
+    )
+    actions = ["retry_notifications"]
+
+    def retry_notifications(self, request, queryset):
+        queryset.filter(sent_on__isnull=True).update(attempts=0, error="")
+    retry_notifications.short_description = (
+        "Retry sending the selected notifications")
@@ -1,4 +1,10 @@
+import logging
+
 from django.apps import AppConfig
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
+
 
 class OseoServerConfig(AppConfig):
     name = "oseoserver"
@@ -6,3 +12,10 @@ class OseoServerConfig(AppConfig):
 
     def ready(self):
         import oseoserver.signals.handlers
+        from .registry import validate_settings
+        # configuration problems are only reported, so that deployments
+        # whose settings used to be accepted keep starting up
+        try:
+            validate_settings()
+        except ImproperlyConfigured as err:
+            logger.warning(err)
@@ -0,0 +1,143 @@
+# Copyright 2017 Ricardo Garcia Silva
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Grouping of a batch's parallel order items into chunks.
+
+When the ``OSEOSERVER_ITEM_CHUNK_SIZE`` setting is greater than one, the
+``process_batch`` task sends each chunk of items as a single
+``process_item_chunk`` task, instead of sending a task for each item.
+
+Chunks are sized so that their items take around
+``OSEOSERVER_ITEM_CHUNK_DURATION`` seconds to process, according to the
+average duration of the items of each collection. This average is updated
+whenever an item is processed.
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+import hashlib
+import logging
+
+from django.core.cache import cache
+
+from . import settings
+
+logger = logging.getLogger(__name__)
+
+ITEM_DURATION_CACHE_KEY = "oseoserver-item-duration-{}"
+# weight of each new measurement in the average item duration
+DURATION_SMOOTHING = 0.2
+
+
+def get_chunk_size(collection):
+    """Return how many items of a collection should be sent in each chunk.
+
+    Parameters
+    ----------
+    collection: str
+        Name of the collection
+
+    Returns
+    -------
+    int
+        The chunk size. Collections whose items have not been measured yet
+        use the maximum chunk size
+
+    """
+
+    max_size = settings.get_item_chunk_size()
+    duration = get_item_duration(collection)
+    if duration is None or duration <= 0:
+        size = max_size
+    else:
+        size = int(settings.get_item_chunk_duration() // duration)
+    return max(1, min(size, max_size))
+
+
+def get_item_duration(collection):
+    """Return the average time, in seconds, to process an item.
+
+    Parameters
+    ----------
+    collection: str
+        Name of the collection
+
+    Returns
+    -------
+    float or None
+        The average duration, or None if no item of the collection has been
+        processed yet
+
+    """
+
+    return cache.get(_get_cache_key(collection))
+
+
+def record_item_duration(collection, duration):
+    """Add the duration of a processed item to its collection's average.
+
+    Parameters
+    ----------
+    collection: str
+        Name of the collection
+    duration: float
+        Time, in seconds, that the item took to be processed
+
+    """
+
+    previous = get_item_duration(collection)
+    if previous is None:
+        average = duration
+    else:
+        average = (previous * (1 - DURATION_SMOOTHING) +
+                   duration * DURATION_SMOOTHING)
+    cache.set(_get_cache_key(collection), average, timeout=None)
+
+
+def split_items(item_ids, collections):
+    """Split order items into chunks, according to their collection.
+
+    Parameters
+    ----------
+    item_ids: list
+        Primary keys of the order items
+    collections: dict
+        The name of the collection of each order item, keyed by its
+        primary key
+
+    Returns
+    -------
+    list
+        Lists of item ids. Items of different collections are never put in
+        the same chunk
+
+    """
+
+    by_collection = {}
+    for item_id in item_ids:
+        by_collection.setdefault(collections[item_id], []).append(item_id)
+    chunks = []
+    for collection, collection_items in sorted(by_collection.items()):
+        size = get_chunk_size(collection)
+        logger.debug("Using chunks of {} items for collection {!r}".format(
+            size, collection))
+        chunks.extend(collection_items[index:index + size]
+                      for index in range(0, len(collection_items), size))
+    return chunks
+
+
+def _get_cache_key(collection):
+    digest = hashlib.sha1(collection.encode("utf-8")).hexdigest()
+    return ITEM_DURATION_CACHE_KEY.format(digest)
@@ -0,0 +1,127 @@
+# Copyright 2017 Ricardo Garcia Silva
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Find the collections of order items that do not specify one.
+
+Submit requests may omit the collection of the ordered products, in which
+case it must be looked up in the catalogues by the item processor. The
+functions in this module look up all of the items of an order at once and
+cache the results, including the items that could not be found.
+
+Item processors may implement an optional ``get_collection_ids`` method,
+which receives a list of item identifiers and returns a mapping with the
+collection identifier of each one of them. Identifiers that do not belong
+to any collection are mapped to None and identifiers that could not be
+checked, for example because a catalogue is down, are left out of the
+mapping, so that they are not cached. Item processors that do not implement
+this method have their ``get_collection_id`` method called concurrently for
+each item.
+
+"""
+
+from __future__ import absolute_import
+from functools import partial
+import hashlib
+import logging
+from multiprocessing.pool import ThreadPool
+
+from django.core.cache import cache
+
+from . import errors
+from . import settings
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_ID_CACHE_KEY = "oseoserver-collection-id-{}"
+# cached value for items that do not belong to any known collection
+_NOT_FOUND = ""
+
+
+def resolve_collection_ids(item_ids, item_processor):
+    """Find the collection identifier of each of the input item identifiers.
+
+    Parameters
+    ----------
+    item_ids: list
+        Identifiers of the ordered products
+    item_processor: object
+        The item processor that looks up the collections in the catalogues
+
+    Returns
+    -------
+    dict
+        A mapping with the collection identifier of each of the input item
+        identifiers, or None if it could not be found
+
+    """
+
+    keys = dict((item_id, _get_cache_key(item_id)) for item_id in item_ids)
+    cached = cache.get_many(list(keys.values()))
+    result = {}
+    missing = []
+    for item_id, key in keys.items():
+        if key in cached:
+            result[item_id] = cached[key] or None
+        else:
+            missing.append(item_id)
+    logger.debug("Found {} cached item collections, looking up {} "
+                 "more...".format(len(result), len(missing)))
+    if len(missing) > 0:
+        found = _find_collection_ids(missing, item_processor)
+        cache.set_many(
+            dict((keys[item_id], collection_id) for item_id, collection_id
+                 in found.items() if collection_id is not None),
+            timeout=settings.get_collection_id_cache_timeout()
+        )
+        cache.set_many(
+            dict((keys[item_id], _NOT_FOUND) for item_id, collection_id
+                 in found.items() if collection_id is None),
+            timeout=settings.get_collection_id_negative_cache_timeout()
+        )
+        for item_id in missing:
+            result[item_id] = found.get(item_id)
+    return result
+
+
+def _find_collection_ids(item_ids, item_processor):
+    get_collection_ids = getattr(item_processor, "get_collection_ids", None)
+    if get_collection_ids is not None:
+        result = get_collection_ids(item_ids)
+    else:
+        max_requests = settings.get_catalogue_max_concurrent_requests()
+        pool = ThreadPool(min(len(item_ids), max_requests))
+        try:
+            collection_ids = pool.map(
+                partial(_get_collection_id, item_processor), item_ids)
+        finally:
+            pool.close()
+            pool.join()
+        result = dict(zip(item_ids, collection_ids))
+    return result
+
+
+def _get_cache_key(item_id):
+    # item identifiers may have characters that are not valid in cache keys
+    digest = hashlib.sha1(item_id.encode("utf-8")).hexdigest()
+    return COLLECTION_ID_CACHE_KEY.format(digest)
+
+
+def _get_collection_id(item_processor, item_id):
+    try:
+        collection_id = item_processor.get_collection_id(item_id)
+    except errors.OseoServerError:
+        logger.warning("Could not find the collection of item "
+                       "{!r}".format(item_id))
+        collection_id = None
+    return collection_id
@@ -0,0 +1,156 @@
+# Copyright 2017 Ricardo Garcia Silva
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Per-collection limits on the number of items processed at once.
+
+Collections may set a ``max_concurrent_items`` key in their configuration.
+The ``process_item`` task acquires one of the collection's slots before
+processing an item and releases it afterwards. Slots are tracked in redis
+when the ``OSEOSERVER_CONCURRENCY_REDIS_URL`` setting is defined and in
+the database otherwise. Each slot expires after
+``OSEOSERVER_ITEM_SLOT_TIMEOUT`` seconds, so that the slots of workers that
+die are eventually freed.
+
+"""
+
+from __future__ import absolute_import
+import datetime as dt
+import logging
+import time
+
+from django.db import IntegrityError
+from django.db import transaction
+import pytz
+
+from . import models
+from . import settings
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_TEMPLATE = "oseoserver:item-slots:{}"
+
+# KEYS[1]: the collection's sorted set, holding item ids scored by the time
+# their slot expires
+# ARGV: current time, slot limit, item id, expiry time, key timeout
+_REDIS_ACQUIRE_SCRIPT = """
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", ARGV[1])
+if redis.call("ZSCORE", KEYS[1], ARGV[3]) or
+        redis.call("ZCARD", KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call("ZADD", KEYS[1], ARGV[4], ARGV[3])
+    redis.call("EXPIRE", KEYS[1], ARGV[5])
+    return 1
+end
+return 0
+"""
+
+_redis_client = None
+
+
+def acquire_item_slot(collection, order_item_id, max_items):
+    """Try to acquire a processing slot for an order item.
+
+    Acquiring a slot for an item that already holds one renews it.
+
+    Parameters
+    ----------
+    collection: str
+        Name of the collection of the order item
+    order_item_id: int
+        Primary key of the order item
+    max_items: int
+        Number of slots of the collection
+
+    Returns
+    -------
+    bool
+        Whether the slot has been acquired
+
+    """
+
+    timeout = settings.get_item_slot_timeout()
+    client = _get_redis_client()
+    if client is not None:
+        now = time.time()
+        acquire = client.register_script(_REDIS_ACQUIRE_SCRIPT)
+        acquired = bool(acquire(
+            keys=[REDIS_KEY_TEMPLATE.format(collection)],
+            args=[now, max_items, order_item_id, now + timeout, timeout]
+        ))
+    else:
+        acquired = _acquire_database_slot(
+            collection, order_item_id, max_items, timeout)
+    logger.debug("Slot for item {} of collection {!r} acquired: {}".format(
+        order_item_id, collection, acquired))
+    return acquired
+
+
+def release_item_slot(collection, order_item_id):
+    """Release the processing slot held by an order item.
+
+    Parameters
+    ----------
+    collection: str
+        Name of the collection of the order item
+    order_item_id: int
+        Primary key of the order item
+
+    """
+
+    client = _get_redis_client()
+    if client is not None:
+        client.zrem(REDIS_KEY_TEMPLATE.format(collection), order_item_id)
+    else:
+        models.ItemProcessingSlot.objects.filter(
+            order_item_id=order_item_id).delete()
+
+
+def _acquire_database_slot(collection, order_item_id, max_items, timeout):
+    now = dt.datetime.now(pytz.utc)
+    expires_on = now + dt.timedelta(seconds=timeout)
+    slots = models.ItemProcessingSlot.objects.filter(collection=collection)
+    slots.filter(expires_on__lt=now).delete()
+    if slots.filter(order_item_id=order_item_id).update(
+            expires_on=expires_on):
+        return True
+    taken = set(slots.values_list("slot", flat=True))
+    for slot in (s for s in range(max_items) if s not in taken):
+        # the unique constraint on the slot prevents it from being taken by
+        # a concurrent worker
+        try:
+            with transaction.atomic():
+                models.ItemProcessingSlot.objects.create(
+                    collection=collection,
+                    slot=slot,
+                    order_item_id=order_item_id,
+                    expires_on=expires_on
+                )
+        except IntegrityError:
+            logger.debug("Slot {} of collection {!r} has been taken "
+                         "meanwhile".format(slot, collection))
+        else:
+            return True
+    return False
+
+
+def _get_redis_client():
+    global _redis_client
+    url = settings.get_concurrency_redis_url()
+    if url is None:
+        client = None
+    else:
+        if _redis_client is None:
+            import redis
+            _redis_client = redis.StrictRedis.from_url(url)
+        client = _redis_client
+    return client
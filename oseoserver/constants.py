@@ -13,6 +13,7 @@ NAMESPACES = {
     "ows": "http://www.opengis.net/ows/2.0",
     "oseo": "http://www.opengis.net/oseo/1.0",
     "xml": "http://www.w3.org/XML/1998/namespace",
+    "oseoserver": "https://github.com/pyoseo/django-oseoserver",
 }
 
 
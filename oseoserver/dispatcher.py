@@ -0,0 +1,211 @@
+# Copyright 2017 Ricardo Garcia Silva
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Fair share dispatching of order items to celery.
+
+When the ``OSEOSERVER_FAIR_SHARE_DISPATCH`` setting is enabled, the
+``process_batch`` task does not send the parallel items of a batch to
+celery. It hands the batch to ``enqueue_batch`` instead and its items wait
+in the backlog of the batch's user. The ``dispatch_items`` function then
+releases items from every user's backlog, until each user has
+``OSEOSERVER_MAX_DISPATCHED_ITEMS_PER_USER`` items queued or in production.
+Items are sent round robin between users, with the users that have
+FAST_TRACK items first. It runs again whenever an item finishes. The
+``dispatch_items`` task must also be run periodically in a celery beat
+worker, in order to release any items that are left waiting.
+
+"""
+
+from __future__ import absolute_import
+import datetime as dt
+import logging
+
+try:
+    from itertools import zip_longest
+except ImportError:  # python2
+    from itertools import izip_longest as zip_longest
+
+import celery
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case
+from django.db.models import IntegerField
+from django.db.models import Value
+from django.db.models import When
+import pytz
+
+from . import models
+from . import settings
+from . import utilities
+from .requestprocessor import FINISHED_STATUSES
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_CACHE_KEY = "oseoserver-fair-share-dispatch"
+# seconds to wait before dispatching, so that items that finish close
+# together are handled by a single run
+DISPATCH_DELAY = 1
+
+
+def dispatch_items():
+    """Release items from the users' backlogs and send them to celery.
+
+    Returns
+    -------
+    int
+        The number of items that have been sent
+
+    """
+
+    cache.delete(DISPATCH_CACHE_KEY)
+    pending = _get_pending_items()
+    user_ids = set(pending.values_list(
+        "batch__order__user", flat=True).distinct().order_by())
+    fast_track_ids = set(pending.filter(
+        batch__order__priority=models.Order.FAST_TRACK
+    ).values_list("batch__order__user", flat=True).distinct().order_by())
+    ordered_users = sorted(
+        user_ids, key=lambda user_id: (user_id not in fast_track_ids, user_id))
+    max_items = settings.get_max_dispatched_items_per_user()
+    with transaction.atomic():
+        released = [_release_user_items(user_id, max_items)
+                    for user_id in ordered_users]
+        batches = models.Batch.objects.filter(pk__in=set(
+            batch_id for items in released for item_id, batch_id in items
+        )).select_related("order")
+        batch_info = dict(
+            (batch.pk, (batch.batch_data_key,
+                        utilities.get_task_routing(batch.order.order_type,
+                                                   batch.order.priority)))
+            for batch in batches
+        )
+        item_tasks = []
+        for round_items in zip_longest(*released):
+            for item_id, batch_id in (i for i in round_items if i is not None):
+                batch_data_key, routing = batch_info[batch_id]
+                item_tasks.append((item_id, batch_data_key, routing))
+        transaction.on_commit(lambda: _send_item_tasks(item_tasks))
+    logger.debug("Dispatched {} items for {} users".format(
+        len(item_tasks), len(ordered_users)))
+    return len(item_tasks)
+
+
+def enqueue_batch(batch, dispatched_item_ids=None):
+    """Put the items of a batch in the backlog of its user.
+
+    The batch data that the item processors have prepared must already
+    have been stored with ``Batch.store_batch_data``.
+
+    Parameters
+    ----------
+    batch: models.Batch
+        The batch to enqueue
+    dispatched_item_ids: list, optional
+        Ids of the batch's items that are sent to celery by the caller,
+        like the items that must be processed sequentially. They are not
+        put in the backlog but they do count as dispatched
+
+    """
+
+    batch.fair_share = True
+    models.Batch.objects.filter(pk=batch.pk).update(
+        fair_share=batch.fair_share)
+    if dispatched_item_ids:
+        models.OrderItem.objects.filter(pk__in=dispatched_item_ids).update(
+            dispatched_on=dt.datetime.now(pytz.utc))
+    schedule_dispatch()
+
+
+def schedule_dispatch():
+    """Send the task that dispatches items after the current transaction.
+
+    Several calls that happen close together result in a single task, as
+    long as django uses a cache that is shared between processes. Items
+    that are left waiting if a task is lost are released by the periodic
+    run of the ``dispatch_items`` task.
+
+    """
+
+    def send_dispatch_task():
+        # the key is only set after the transaction is committed, so that
+        # rolled back transactions do not hold back the next dispatches
+        if cache.add(DISPATCH_CACHE_KEY, True,
+                     timeout=DISPATCH_DELAY + 60):
+            try:
+                celery.current_app.send_task(
+                    "oseoserver.tasks.dispatch_items",
+                    countdown=DISPATCH_DELAY
+                )
+            except Exception:
+                cache.delete(DISPATCH_CACHE_KEY)
+                raise
+
+    transaction.on_commit(send_dispatch_task)
+
+
+def _get_pending_items():
+    return models.OrderItem.objects.filter(
+        batch__fair_share=True,
+        dispatched_on__isnull=True
+    ).exclude(status__in=FINISHED_STATUSES)
+
+
+def _release_user_items(user_id, max_items):
+    """Mark the next items of a user's backlog as dispatched.
+
+    The user's active item counter row is locked, so that concurrent
+    dispatchers do not release more items than allowed.
+
+    Returns
+    -------
+    list
+        (item_id, batch_id) tuples with the released items
+
+    """
+
+    models.ActiveItemCounter.get_active_items(user_id)
+    models.ActiveItemCounter.objects.select_for_update().get(user_id=user_id)
+    in_flight = models.OrderItem.objects.filter(
+        batch__order__user=user_id,
+        dispatched_on__isnull=False
+    ).exclude(status__in=FINISHED_STATUSES).count()
+    available = max_items - in_flight
+    if available > 0:
+        released = list(_get_pending_items().filter(
+            batch__order__user=user_id
+        ).annotate(
+            priority_rank=Case(
+                When(batch__order__priority=models.Order.FAST_TRACK,
+                     then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField()
+            )
+        ).order_by("priority_rank", "batch_id", "id").values_list(
+            "id", "batch_id")[:available])
+        models.OrderItem.objects.filter(
+            pk__in=[item_id for item_id, batch_id in released]
+        ).update(dispatched_on=dt.datetime.now(pytz.utc))
+    else:
+        released = []
+    return released
+
+
+def _send_item_tasks(item_tasks):
+    for item_id, batch_data_key, routing in item_tasks:
+        celery.current_app.send_task(
+            "oseoserver.tasks.process_item",
+            (item_id,),
+            {"batch_data_key": batch_data_key},
+            **routing
+        )
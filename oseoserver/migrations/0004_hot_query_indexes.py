@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-16 20:09
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('oseoserver', '0003_batch_additional_status_info'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderitem',
+            name='identifier',
+            field=models.CharField(blank=True, db_index=True, help_text='identifier for this order item. It is the product Id in the catalog', max_length=255),
+        ),
+        migrations.AlterIndexTogether(
+            name='order',
+            index_together=set([('order_type', 'status'), ('user', 'status_changed_on'), ('user', 'status')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='orderitem',
+            index_together=set([('available', 'expires_on'), ('batch', 'status')]),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-16 20:11
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Case, Count, When
+
+
+def initialize_item_counters(apps, schema_editor):
+    OrderItem = apps.get_model("oseoserver", "OrderItem")
+    Batch = apps.get_model("oseoserver", "Batch")
+    counts = OrderItem.objects.filter(batch__isnull=False).values(
+        "batch").annotate(
+        total_items=Count("id"),
+        completed_items=Count(Case(When(status="Completed", then=1))),
+        failed_items=Count(Case(When(status="Failed", then=1))),
+    ).order_by()
+    for batch_counts in counts:
+        Batch.objects.filter(pk=batch_counts.pop("batch")).update(
+            **batch_counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oseoserver', '0004_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batch',
+            name='completed_items',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of order items that have been completed'),
+        ),
+        migrations.AddField(
+            model_name='batch',
+            name='failed_items',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of order items that have failed'),
+        ),
+        migrations.AddField(
+            model_name='batch',
+            name='total_items',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of order items in the batch'),
+        ),
+        migrations.RunPython(initialize_item_counters,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-16 20:18
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oseoserver', '0005_batch_item_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='estimated_batches',
+            field=models.PositiveIntegerField(blank=True, help_text='Estimated total number of batches of a massive order. It is calculated by the item processor when the first batch is created', null=True),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-16 20:21
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oseoserver', '0006_order_estimated_batches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batch',
+            name='identifiers_checkpoint',
+            field=models.TextField(blank=True, editable=False, help_text='JSON mapping with the position where the item processor stopped listing the item identifiers of each item specification for this batch. Used by massive orders'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-16 20:26
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oseoserver', '0007_batch_identifiers_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='submit_request',
+            field=models.TextField(blank=True, help_text='Raw Submit request of an order that is still waiting to be validated, when Submit requests are processed asynchronously'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-16 20:28
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oseoserver', '0008_order_submit_request'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('moderation_request', 'moderation_request'), ('order_moderated', 'order_moderated'), ('order_cancelled', 'order_cancelled'), ('subscription_terminated', 'subscription_terminated')], max_length=50)),
+                ('arguments', models.TextField(blank=True, help_text='JSON encoded keyword arguments of the notification')),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('sent_on', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0, help_text='Number of times that sending the notification has failed')),
+                ('error', models.TextField(blank=True, help_text='Error of the last failed attempt at sending the notification')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='oseoserver.Order')),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='notification',
+            index_together=set([('sent_on', 'attempts')]),
+        ),
+    ]
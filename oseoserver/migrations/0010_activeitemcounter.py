@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-16 20:29
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('oseoserver', '0009_notification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActiveItemCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='oseoserver_active_item_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('active_items', models.PositiveIntegerField(default=0)),
+                ('reconciled_on', models.DateTimeField(blank=True, help_text='When the counter was last recalculated from the order items', null=True)),
+            ],
+        ),
+    ]
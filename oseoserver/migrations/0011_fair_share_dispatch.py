@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-16 20:32
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oseoserver', '0010_activeitemcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batch',
+            name='batch_data',
+            field=models.TextField(blank=True, editable=False, help_text="JSON encoded data that the item processors have prepared for the batch's items. Used by the fair share dispatcher"),
+        ),
+        migrations.AddField(
+            model_name='batch',
+            name='fair_share',
+            field=models.BooleanField(default=False, editable=False, help_text="Whether the batch's order items are released for processing by the fair share dispatcher"),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='dispatched_on',
+            field=models.DateTimeField(blank=True, editable=False, help_text='When the item was sent for processing by the fair share dispatcher', null=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='orderitem',
+            index_together=set([('batch', 'status'), ('dispatched_on', 'status'), ('available', 'expires_on')]),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-16 20:34
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oseoserver', '0011_fair_share_dispatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemProcessingSlot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('collection', models.CharField(max_length=255)),
+                ('slot', models.PositiveIntegerField()),
+                ('expires_on', models.DateTimeField(help_text='When the slot is freed in case the item does not release it')),
+                ('order_item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='processing_slot', to='oseoserver.OrderItem')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='itemprocessingslot',
+            unique_together=set([('collection', 'slot')]),
+        ),
+    ]
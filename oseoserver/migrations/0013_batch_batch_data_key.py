@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-16 20:36
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oseoserver', '0012_itemprocessingslot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batch',
+            name='batch_data_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Digest of the batch data. Item processing tasks receive it instead of the data itself', max_length=40),
+        ),
+        migrations.AlterField(
+            model_name='batch',
+            name='batch_data',
+            field=models.TextField(blank=True, editable=False, help_text="JSON encoded data that the item processors have prepared for the batch's items"),
+        ),
+    ]
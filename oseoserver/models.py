@@ -15,22 +15,146 @@
 """Database models for oseoserver."""
 
 from __future__ import absolute_import
+from collections import OrderedDict
 import datetime as dt
+import hashlib
+import json
 import sys
+import threading
 import traceback
 import logging
 
 from django.db import models
+from django.db import transaction
+from django.db.models import Case
+from django.db.models import Count
+from django.db.models import F
+from django.db.models import Q
+from django.db.models import When
+from django.db.models.functions import Greatest
 from django.conf import settings as django_settings
 from django.utils.encoding import python_2_unicode_compatible
+import celery
+from django.core.cache import cache
 import pytz
 
 from . import utilities
 from . import settings
+from .registry import get_registry
 
 logger = logging.getLogger(__name__)
 
 
+@python_2_unicode_compatible
+class ActiveItemCounter(models.Model):
+    """Number of order items of a user that are currently in production.
+
+    The counter is updated whenever an order item enters or leaves the
+    IN_PRODUCTION status, so that the number of active items of a user can
+    be checked without counting them. Counters are created the first time
+    they are needed and the ``reconcile_active_item_counters`` task fixes
+    them periodically, in case they drift.
+
+    """
+
+    user = models.OneToOneField(
+        django_settings.AUTH_USER_MODEL,
+        primary_key=True,
+        related_name="oseoserver_active_item_counter"
+    )
+    active_items = models.PositiveIntegerField(default=0)
+    reconciled_on = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the counter was last recalculated from the order "
+                  "items"
+    )
+
+    def __str__(self):
+        return "{0.user_id}: {0.active_items}".format(self)
+
+    @classmethod
+    def add_items(cls, batch_id, delta):
+        """Add to the counter of the user that owns the input batch.
+
+        Parameters
+        ----------
+        batch_id: int
+            Primary key of the batch whose items have changed status
+        delta: int
+            Number of items that have entered the IN_PRODUCTION status. It
+            is negative when items have left it
+
+        """
+
+        updated = cls.objects.filter(
+            user__oseoserver_order_orders__batches=batch_id
+        ).update(active_items=Greatest(F("active_items") + delta, 0))
+        if updated == 0:
+            user_id = Order.objects.filter(batches=batch_id).values_list(
+                "user_id", flat=True).get()
+            cls.reconcile(user_ids=[user_id])
+
+    @classmethod
+    def get_active_items(cls, user_id):
+        """Return the number of order items of a user that are in production.
+
+        Parameters
+        ----------
+        user_id: int
+            Primary key of the user
+
+        """
+
+        try:
+            result = cls.objects.values_list(
+                "active_items", flat=True).get(user_id=user_id)
+        except cls.DoesNotExist:
+            result = cls.reconcile(user_ids=[user_id])[user_id]
+        return result
+
+    @classmethod
+    def reconcile(cls, user_ids=None):
+        """Recalculate counters by counting the order items in production.
+
+        Parameters
+        ----------
+        user_ids: list, optional
+            Primary keys of the users whose counters are to be recalculated.
+            All existing counters and the counters of any user with items in
+            production are recalculated if not given
+
+        Returns
+        -------
+        dict
+            The number of active items of each recalculated user
+
+        """
+
+        active = OrderItem.objects.filter(
+            status=CustomizableItem.IN_PRODUCTION)
+        counters = cls.objects.all()
+        if user_ids is not None:
+            active = active.filter(batch__order__user__in=user_ids)
+            counters = counters.filter(user__in=user_ids)
+        counts = dict(
+            active.values_list("batch__order__user").annotate(
+                total=Count("id")).order_by()
+        )
+        now = dt.datetime.now(pytz.utc)
+        with transaction.atomic():
+            counters.exclude(user__in=list(counts)).update(
+                active_items=0, reconciled_on=now)
+            for user_id in user_ids or []:
+                counts.setdefault(user_id, 0)
+            for user_id, total in counts.items():
+                cls.objects.update_or_create(
+                    user_id=user_id,
+                    defaults={"active_items": total, "reconciled_on": now}
+                )
+        return counts
+
+
 @python_2_unicode_compatible
 class AbstractDeliveryAddress(models.Model):
     first_name = models.CharField(max_length=50, blank=True)
@@ -233,6 +357,26 @@ class Order(CustomizableItem):
         default=NONE,
         choices=STATUS_NOTIFICATION_CHOICES
     )
+    estimated_batches = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Estimated total number of batches of a massive order. It "
+                  "is calculated by the item processor when the first batch "
+                  "is created"
+    )
+    submit_request = models.TextField(
+        blank=True,
+        help_text="Raw Submit request of an order that is still waiting to "
+                  "be validated, when Submit requests are processed "
+                  "asynchronously"
+    )
+
+    class Meta:
+        index_together = [
+            ("user", "status_changed_on"),
+            ("user", "status"),
+            ("order_type", "status"),
+        ]
 
     def __str__(self):
         return '{0.order_type}, {0.id}, {0.reference!r}'.format(self)
@@ -256,13 +400,36 @@ class Order(CustomizableItem):
             })
         return result
 
+    def refresh_estimated_batches(self):
+        """Ask the item processor for the total number of massive batches.
+
+        The item processor usually needs to query the catalogue in order to
+        estimate the number of batches, so the result is stored in the
+        order's ``estimated_batches`` field.
+
+        """
+
+        processor = utilities.get_item_processor(self.order_type)
+        item_spec = self.item_specifications.get()
+        start, end = processor.get_order_duration(item_spec)
+        total_batches = processor.estimate_number_massive_order_batches(
+            collection=item_spec.collection,
+            start=start,
+            end=end,
+            items_per_batch=settings.get_max_order_items(),
+        )
+        self.estimated_batches = total_batches
+        Order.objects.filter(pk=self.pk).update(
+            estimated_batches=self.estimated_batches)
+        return self.estimated_batches
+
 
 class OrderPendingModerationManager(models.Manager):
 
     def get_queryset(self):
         return super(OrderPendingModerationManager,
                      self).get_queryset().filter(
-            status=Order.SUBMITTED)
+            status=Order.SUBMITTED, submit_request="")
 
 
 @python_2_unicode_compatible
@@ -277,6 +444,65 @@ class OrderPendingModeration(Order):
         return super(OrderPendingModeration, self).__str__()
 
 
+@python_2_unicode_compatible
+class Notification(models.Model):
+    """A notification about an order that is waiting to be sent.
+
+    Notifications are saved in the same transaction as the order changes
+    that trigger them and are sent later on by a celery worker, which keeps
+    the rendering of e-mail templates out of the request path.
+
+    """
+
+    MODERATION_REQUEST = "moderation_request"
+    ORDER_MODERATED = "order_moderated"
+    ORDER_CANCELLED = "order_cancelled"
+    SUBSCRIPTION_TERMINATED = "subscription_terminated"
+    KIND_CHOICES = [
+        (MODERATION_REQUEST, MODERATION_REQUEST),
+        (ORDER_MODERATED, ORDER_MODERATED),
+        (ORDER_CANCELLED, ORDER_CANCELLED),
+        (SUBSCRIPTION_TERMINATED, SUBSCRIPTION_TERMINATED),
+    ]
+
+    kind = models.CharField(
+        max_length=50,
+        choices=KIND_CHOICES
+    )
+    order = models.ForeignKey(
+        "Order",
+        related_name="notifications"
+    )
+    arguments = models.TextField(
+        blank=True,
+        help_text="JSON encoded keyword arguments of the notification"
+    )
+    created_on = models.DateTimeField(
+        auto_now_add=True
+    )
+    sent_on = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Number of times that sending the notification has failed"
+    )
+    error = models.TextField(
+        blank=True,
+        help_text="Error of the last failed attempt at sending the "
+                  "notification"
+    )
+
+    class Meta:
+        index_together = [
+            ("sent_on", "attempts"),
+        ]
+
+    def __str__(self):
+        return "{0.kind}, order {0.order_id}".format(self)
+
+
 class ItemSpecification(models.Model):
     """Specification from which actual order items are generated at runtime."""
     order = models.ForeignKey(
@@ -323,11 +549,41 @@ class ItemSpecification(models.Model):
         return option
 
 
+@python_2_unicode_compatible
+class ItemProcessingSlot(models.Model):
+    """A slot for processing an item of a collection with limited concurrency.
+
+    Collections may set ``max_concurrent_items`` in their configuration.
+    Their items must hold one of the collection's slots while they are being
+    processed. This model stores the slots when no redis server is
+    configured for tracking them.
+
+    """
+
+    collection = models.CharField(max_length=255)
+    slot = models.PositiveIntegerField()
+    order_item = models.OneToOneField(
+        "OrderItem",
+        related_name="processing_slot"
+    )
+    expires_on = models.DateTimeField(
+        help_text="When the slot is freed in case the item does not "
+                  "release it"
+    )
+
+    class Meta:
+        unique_together = ("collection", "slot")
+
+    def __str__(self):
+        return "{0.collection}: {0.slot}".format(self)
+
+
 @python_2_unicode_compatible
 class OrderItem(CustomizableItem):
     identifier = models.CharField(
         max_length=255,
         blank=True,
+        db_index=True,
         help_text="identifier for this order item. It is the product Id in "
                   "the catalog"
     )
@@ -360,6 +616,25 @@ class OrderItem(CustomizableItem):
         default=0,
         help_text="Number of times this order item has been downloaded."
     )
+    dispatched_on = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="When the item was sent for processing by the fair share "
+                  "dispatcher"
+    )
+
+    # status of the item when it was last loaded from or saved to the
+    # database. It is used for keeping the batch's item counters up to date
+    _UNKNOWN_STATUS = object()
+    _saved_status = None
+
+    class Meta:
+        index_together = [
+            ("batch", "status"),
+            ("available", "expires_on"),
+            ("dispatched_on", "status"),
+        ]
 
     def __str__(self):
         return ("id: {0.id}, batch: {0.batch}".format(self))
@@ -469,9 +744,9 @@ class OrderItem(CustomizableItem):
 
     def export_options(self):
         valid_options = {}
-        options_conf = settings.get_processing_options()
+        options_conf = get_registry().options_by_name
         for option in self.get_options():
-            conf = [c for c in options_conf if c["name"] == option.option][0]
+            conf = options_conf[option.option]
             if conf.get("multiple_entries"):
                 valid_options.setdefault(option.option, [])
                 valid_options[option.option].append(option.value)
@@ -522,6 +797,15 @@ class OrderItem(CustomizableItem):
         )
         return url
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(OrderItem, cls).from_db(db, field_names, values)
+        if "status" in field_names:
+            instance._saved_status = values[field_names.index("status")]
+        else:
+            instance._saved_status = cls._UNKNOWN_STATUS
+        return instance
+
     def save(self, *args, **kwargs):
         """Save instance into the database.
 
@@ -530,12 +814,23 @@ class OrderItem(CustomizableItem):
 
         """
 
+        adding = self._state.adding
         super(OrderItem, self).save(*args, **kwargs)
-        if self.status not in (self.ACCEPTED,
-                               self.CANCELLED,
-                               self.SUBMITTED,
-                               self.SUSPENDED):
-            self.update_batch_status()
+        if self.batch_id is not None:
+            self._update_active_item_counter(adding)
+        if self.batch_id is None:
+            pass
+        elif settings.get_status_propagation() == Batch.DEFERRED_PROPAGATION:
+            if adding or self.status != self._saved_status:
+                Batch.schedule_status_propagation(self.batch_id)
+        else:
+            self._update_batch_counters(adding)
+            if self.status not in (self.ACCEPTED,
+                                   self.CANCELLED,
+                                   self.SUBMITTED,
+                                   self.SUSPENDED):
+                self.update_batch_status()
+        self._saved_status = self.status
 
     def set_status(self, status, additional_info=""):
         previous_status = self.status
@@ -553,40 +848,24 @@ class OrderItem(CustomizableItem):
         This method is called whenever an order item is saved.
         """
 
-        batch = self.batch
-        now = dt.datetime.now(pytz.utc)
-        additional = ""
-        completed_items = 0
-        failed_items = 0
-        for item in batch.order_items.all():
-            if item.status == CustomizableItem.COMPLETED:
-                completed_items += 1
-            elif item.status == CustomizableItem.FAILED:
-                failed_items += 1
-                additional = " ".join((
-                    additional,
-                    item.item_specification.item_id,
-                    item.additional_status_info
-                ))
-        if batch.order_items.count() == completed_items + failed_items:
-            completed_on = now
-            if failed_items > 0:
-                new_status = CustomizableItem.FAILED
-            else:
-                new_status = CustomizableItem.COMPLETED
-        else:
-            completed_on = None
-            new_status = CustomizableItem.IN_PRODUCTION
-            additional = "Items are being processed"
-        previous_status = batch.status
-        if previous_status != new_status:
-            logger.debug("Updating item's batch status "
-                         "to {}...".format(new_status))
-            batch.status = new_status
-            batch.additional_status_info = additional
-            batch.updated_on = now
-            batch.completed_on = completed_on
-            batch.save()
+        self.batch.update_status()
+
+    def remove_from_batch_counters(self):
+        """Remove this item from its batch's item counters
+
+        This method is called whenever an order item is deleted. Only the
+        counters are updated. A batch that is left with only finished items
+        is updated by the ``propagate_stale_batch_statuses`` task.
+
+        """
+
+        completed = int(self.status == self.COMPLETED)
+        failed = int(self.status == self.FAILED)
+        Batch.objects.filter(pk=self.batch_id).update(
+            total_items=F("total_items") - 1,
+            completed_items=F("completed_items") - completed,
+            failed_items=F("failed_items") - failed,
+        )
 
     def _create_expiry_date(self):
         generic_order_config = utilities.get_generic_order_config(
@@ -596,6 +875,45 @@ class OrderItem(CustomizableItem):
             days=generic_order_config.get("item_availability_days", 1))
         return expiry_date
 
+    def _update_active_item_counter(self, adding):
+        """Update the active items counter of the user with this transition"""
+
+        if not adding and self._saved_status is self._UNKNOWN_STATUS:
+            user_id = Order.objects.filter(
+                batches=self.batch_id).values_list("user_id", flat=True).get()
+            ActiveItemCounter.reconcile(user_ids=[user_id])
+        else:
+            previous = None if adding else self._saved_status
+            delta = (int(self.status == self.IN_PRODUCTION) -
+                     int(previous == self.IN_PRODUCTION))
+            if delta != 0:
+                ActiveItemCounter.add_items(self.batch_id, delta)
+
+    def _update_batch_counters(self, adding):
+        """Update the batch's item counters with this item's transition
+
+        The counters are updated atomically in the database, so that
+        concurrent updates of items of the same batch do not overwrite each
+        other.
+
+        """
+
+        if not adding and self._saved_status is self._UNKNOWN_STATUS:
+            self.batch.recount_items()
+        else:
+            previous = None if adding else self._saved_status
+            completed = (int(self.status == self.COMPLETED) -
+                         int(previous == self.COMPLETED))
+            failed = (int(self.status == self.FAILED) -
+                      int(previous == self.FAILED))
+            if adding or completed != 0 or failed != 0:
+                Batch.objects.filter(pk=self.batch_id).update(
+                    total_items=F("total_items") + int(adding),
+                    completed_items=F("completed_items") + completed,
+                    failed_items=F("failed_items") + failed,
+                )
+                self.batch.refresh_from_db(fields=Batch.ITEM_COUNTER_FIELDS)
+
 
 @python_2_unicode_compatible
 class SelectedItemOption(models.Model):
@@ -732,6 +1050,61 @@ class Batch(models.Model):
         help_text="Additional information about the status",
         blank=True
     )
+    total_items = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Number of order items in the batch"
+    )
+    completed_items = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Number of order items that have been completed"
+    )
+    failed_items = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Number of order items that have failed"
+    )
+
+    identifiers_checkpoint = models.TextField(
+        blank=True,
+        editable=False,
+        help_text="JSON mapping with the position where the item processor "
+                  "stopped listing the item identifiers of each item "
+                  "specification for this batch. Used by massive orders"
+    )
+    fair_share = models.BooleanField(
+        default=False,
+        editable=False,
+        help_text="Whether the batch's order items are released for "
+                  "processing by the fair share dispatcher"
+    )
+    batch_data = models.TextField(
+        blank=True,
+        editable=False,
+        help_text="JSON encoded data that the item processors have prepared "
+                  "for the batch's items"
+    )
+    batch_data_key = models.CharField(
+        max_length=40,
+        blank=True,
+        editable=False,
+        db_index=True,
+        help_text="Digest of the batch data. Item processing tasks receive "
+                  "it instead of the data itself"
+    )
+
+    ITEM_COUNTER_FIELDS = ("total_items", "completed_items", "failed_items")
+
+    # number of batch data entries that each worker process keeps in memory
+    BATCH_DATA_MEMO_SIZE = 32
+    _batch_data_memo = OrderedDict()
+    _batch_data_memo_lock = threading.Lock()
+
+    # values for the OSEOSERVER_STATUS_PROPAGATION setting
+    IMMEDIATE_PROPAGATION = "immediate"
+    DEFERRED_PROPAGATION = "deferred"
+    PROPAGATION_CACHE_KEY = "oseoserver-batch-{}-status-propagation"
 
     class Meta:
         verbose_name_plural = "batches"
@@ -739,22 +1112,252 @@ class Batch(models.Model):
     def __str__(self):
         return "id: {0.id}, order: {0.order.id}".format(self)
 
+    def create_order_items(self, order_items):
+        """Save new order items for this batch with a single query.
+
+        The order items are validated without checking their foreign keys
+        on the database one by one, as they point to this batch and to the
+        item specifications of its order. The batch's item counters and
+        status are then updated once for all of the new items.
+
+        Parameters
+        ----------
+        order_items: list
+            The unsaved ``OrderItem`` instances
+
+        Returns
+        -------
+        list
+            The saved order items
+
+        """
+
+        for order_item in order_items:
+            order_item.batch = self
+            order_item.full_clean(exclude=["batch", "item_specification"])
+        created = OrderItem.objects.bulk_create(order_items)
+        for order_item in created:
+            order_item._saved_status = order_item.status
+        in_production = [order_item.status for order_item in created].count(
+            CustomizableItem.IN_PRODUCTION)
+        if in_production > 0:
+            ActiveItemCounter.add_items(self.pk, in_production)
+        if len(created) == 0:
+            pass
+        elif settings.get_status_propagation() == self.DEFERRED_PROPAGATION:
+            self.schedule_status_propagation(self.pk)
+        else:
+            statuses = [order_item.status for order_item in created]
+            Batch.objects.filter(pk=self.pk).update(
+                total_items=F("total_items") + len(created),
+                completed_items=F("completed_items") + statuses.count(
+                    CustomizableItem.COMPLETED),
+                failed_items=F("failed_items") + statuses.count(
+                    CustomizableItem.FAILED),
+            )
+            self.refresh_from_db(fields=self.ITEM_COUNTER_FIELDS)
+            items_started = set(statuses) - {CustomizableItem.ACCEPTED,
+                                             CustomizableItem.CANCELLED,
+                                             CustomizableItem.SUBMITTED,
+                                             CustomizableItem.SUSPENDED}
+            if any(items_started):
+                self.update_status()
+        return created
+
+    @classmethod
+    def get_batch_data(cls, batch_data_key):
+        """Return the batch data that has been stored under the input key.
+
+        Batch data is looked up in the database only the first time that a
+        worker process needs it. As keys are derived from the data's
+        contents, the memoized data never becomes stale. The data is kept
+        encoded, so each call returns its own copy, which item processors
+        may modify freely.
+
+        Parameters
+        ----------
+        batch_data_key: str
+            The key returned by ``store_batch_data``
+
+        Returns
+        -------
+        dict
+            The data that the item processors have prepared for a batch
+
+        """
+
+        with cls._batch_data_memo_lock:
+            encoded = cls._batch_data_memo.pop(batch_data_key, None)
+        if encoded is None:
+            encoded = cls.objects.filter(
+                batch_data_key=batch_data_key
+            ).values_list("batch_data", flat=True).first()
+            if encoded is None:
+                raise cls.DoesNotExist(
+                    "No batch data stored under {!r}".format(batch_data_key))
+        with cls._batch_data_memo_lock:
+            while len(cls._batch_data_memo) >= cls.BATCH_DATA_MEMO_SIZE:
+                cls._batch_data_memo.popitem(last=False)
+            cls._batch_data_memo[batch_data_key] = encoded
+        return json.loads(encoded)
+
+    @classmethod
+    def get_stale_batches(cls):
+        """Return the unfinished batches whose status is out of date.
+
+        These are the batches whose item counters do not match their order
+        items or whose items have all finished. Counters drift when order
+        item status changes are not propagated, for example when a deferred
+        status propagation task is lost.
+
+        """
+
+        return cls.objects.exclude(
+            status__in=(CustomizableItem.COMPLETED, CustomizableItem.FAILED)
+        ).annotate(
+            actual_total=Count("order_items"),
+            actual_completed=Count(Case(When(
+                order_items__status=CustomizableItem.COMPLETED, then=1))),
+            actual_failed=Count(Case(When(
+                order_items__status=CustomizableItem.FAILED, then=1))),
+        ).filter(
+            ~Q(total_items=F("actual_total"),
+               completed_items=F("actual_completed"),
+               failed_items=F("actual_failed")) |
+            Q(total_items__gt=0,
+              total_items=F("completed_items") + F("failed_items"))
+        )
+
+    def get_failed_items_info(self):
+        """Return a description of the batch's failed order items"""
+        failed_items = self.order_items.filter(
+            status=CustomizableItem.FAILED).select_related(
+            "item_specification").order_by("id")
+        return " ".join(
+            "{} {}".format(item.item_specification.item_id,
+                           item.additional_status_info)
+            for item in failed_items
+        )
+
     def get_item_processors(self):
+        # all of the items in a batch share their order's type and therefore
+        # its item processor
         processors = []
-        for item in self.order_items.all():
-            processor = utilities.get_item_processor(self.order.order_type)
-            if processor.__class__ not in [p.__class__ for p in processors]:
-                processors.append(processor)
+        if self.order_items.exists():
+            processors.append(
+                utilities.get_item_processor(self.order.order_type))
         return processors
 
+    def propagate_status(self):
+        """Fold any pending order item status changes into the batch.
+
+        This is used with deferred status propagation. The item counters are
+        recalculated and then the batch's and order's status are updated.
+
+        """
+
+        cache.delete(self.PROPAGATION_CACHE_KEY.format(self.pk))
+        self.recount_items()
+        items_started = self.order_items.exclude(
+            status__in=(CustomizableItem.ACCEPTED,
+                        CustomizableItem.CANCELLED,
+                        CustomizableItem.SUBMITTED,
+                        CustomizableItem.SUSPENDED)
+        ).exists()
+        if items_started:
+            self.update_status()
+
+    def recount_items(self):
+        """Recalculate the batch's item counters from its order items.
+
+        The counters are normally kept up to date as order items change
+        their status. This method is meant for fixing them in case they
+        have drifted, for example after order items have been modified
+        with bulk queryset operations.
+
+        """
+
+        counts = self.order_items.aggregate(
+            total_items=Count("id"),
+            completed_items=Count(
+                Case(When(status=CustomizableItem.COMPLETED, then=1))),
+            failed_items=Count(
+                Case(When(status=CustomizableItem.FAILED, then=1))),
+        )
+        Batch.objects.filter(pk=self.pk).update(**counts)
+        for name, value in counts.items():
+            setattr(self, name, value)
+
+    def store_batch_data(self, batch_data):
+        """Store the data that the item processors have prepared.
+
+        Parameters
+        ----------
+        batch_data: dict
+            JSON serializable data, with an entry for each item processor
+
+        Returns
+        -------
+        str
+            A key that identifies the data, to be used with
+            ``get_batch_data``
+
+        """
+
+        self.batch_data = json.dumps(batch_data, sort_keys=True)
+        self.batch_data_key = hashlib.sha1(
+            self.batch_data.encode("utf-8")).hexdigest()
+        Batch.objects.filter(pk=self.pk).update(
+            batch_data=self.batch_data, batch_data_key=self.batch_data_key)
+        return self.batch_data_key
+
+    @classmethod
+    def schedule_status_propagation(cls, batch_id):
+        """Schedule the propagation of a batch's order item status changes
+
+        Scheduling is debounced: only the first order item status change
+        in each propagation interval sends a task. The following changes are
+        picked up when that task runs. Changes are only debounced across
+        processes when django uses a shared cache. Any changes that are
+        missed are picked up by the ``propagate_stale_batch_statuses`` task.
+
+        """
+
+        interval = settings.get_status_propagation_interval() / 1000.0
+        cache_key = cls.PROPAGATION_CACHE_KEY.format(batch_id)
+
+        def send_propagation_task():
+            # the key is only set after the transaction is committed, so
+            # that rolled back changes do not hold back the next ones
+            if cache.add(cache_key, True, timeout=interval + 60):
+                try:
+                    celery.current_app.send_task(
+                        "oseoserver.tasks.propagate_batch_status",
+                        (batch_id,),
+                        countdown=interval
+                    )
+                except Exception:
+                    cache.delete(cache_key)
+                    raise
+
+        transaction.on_commit(send_propagation_task)
+
     def save(self, *args, **kwargs):
         """Save batch instance into the database.
 
         This method reimplements django's default model.save() behaviour in
-        order to update the batch's order status.
+        order to update the batch's order status. The item counters are
+        left out of updates, as they are managed with atomic queries by the
+        batch's order items.
 
         """
 
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields if
+                not field.primary_key and
+                field.name not in self.ITEM_COUNTER_FIELDS
+            ]
         super(Batch, self).save(*args, **kwargs)
         if self.status not in (CustomizableItem.ACCEPTED,
                                CustomizableItem.CANCELLED,
@@ -762,6 +1365,42 @@ class Batch(models.Model):
                                CustomizableItem.SUSPENDED):
             self.update_order_status()
 
+    def update_status(self):
+        """Update the batch's status according to its item counters"""
+        now = dt.datetime.now(pytz.utc)
+        additional = ""
+        if self.total_items == self.completed_items + self.failed_items:
+            completed_on = now
+            if self.failed_items > 0:
+                new_status = CustomizableItem.FAILED
+                additional = self.get_failed_items_info()
+            else:
+                new_status = CustomizableItem.COMPLETED
+        else:
+            completed_on = None
+            new_status = CustomizableItem.IN_PRODUCTION
+            additional = "Items are being processed"
+        previous_status = self.status
+        if previous_status != new_status:
+            logger.debug("Updating batch status to {}...".format(new_status))
+            self.status = new_status
+            self.additional_status_info = additional
+            self.updated_on = now
+            self.completed_on = completed_on
+            self.save()
+            if completed_on is not None and self.fair_share:
+                self._notify_availability()
+            if (completed_on is not None and
+                    self.order.order_type == Order.MASSIVE_ORDER):
+                # the order may now have room for its next batches
+                order_id = self.order_id
+                transaction.on_commit(
+                    lambda: celery.current_app.send_task(
+                        "oseoserver.tasks.schedule_massive_order",
+                        (order_id,)
+                    )
+                )
+
     def update_order_status(self):
         if self.order.order_type == Order.PRODUCT_ORDER:
             new_status = self.status
@@ -787,20 +1426,18 @@ class Batch(models.Model):
             self.order.save()
 
     def _get_massive_order_status(self):
-        existing_batch_statuses = self.order.batches.values_list(
-            "status", flat=True).distinct()
+        existing_batch_statuses = set(self.order.batches.values_list(
+            "status", flat=True).distinct())
+        unfinished = existing_batch_statuses - {CustomizableItem.COMPLETED,
+                                                CustomizableItem.FAILED}
         if CustomizableItem.IN_PRODUCTION in existing_batch_statuses:
             new_status = CustomizableItem.IN_PRODUCTION
+        elif any(unfinished):  # some batches are waiting to be processed
+            new_status = CustomizableItem.SUSPENDED
         else:  # check if we need to create any more batches
-            processor = utilities.get_item_processor(self.order.order_type)
-            item_spec = self.order.item_specifications.get()
-            start, end = processor.get_order_duration(item_spec)
-            total_batches = processor.estimate_number_massive_order_batches(
-                collection=item_spec.collection,
-                start=start,
-                end=end,
-                items_per_batch=settings.get_max_order_items(),
-            )
+            total_batches = self.order.estimated_batches
+            if total_batches is None:
+                total_batches = self.order.refresh_estimated_batches()
             if self.order.batches.count() == total_batches:
                 logger.debug("All batches have been created")
                 if CustomizableItem.FAILED in existing_batch_statuses:
@@ -818,3 +1455,22 @@ class Batch(models.Model):
             new_status = CustomizableItem.SUSPENDED
         return new_status, ""
 
+    def _notify_availability(self):
+        """Notify the user that the batch is available, if configured to.
+
+        Batches that are processed by the fair share dispatcher do not have
+        a celery chord that sends the notification after their last item.
+
+        """
+
+        config = utilities.get_generic_order_config(self.order.order_type)
+        notification = config.get("notifications", {}).get(
+            "batch_availability") or ""
+        if notification.lower() == "immediate":
+            batch_id = self.pk
+            transaction.on_commit(
+                lambda: celery.current_app.send_task(
+                    "oseoserver.tasks.notify_user_batch_available",
+                    (batch_id,)
+                )
+            )
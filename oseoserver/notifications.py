@@ -0,0 +1,168 @@
+# Copyright 2017 Ricardo Garcia Silva
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""An outbox for the notifications that are sent about orders.
+
+Request handling code queues notifications with ``queue_notification``.
+They are stored in the database, in the same transaction as the changes
+that trigger them, and are sent later on by the ``send_notifications``
+celery task.
+
+"""
+
+from __future__ import absolute_import
+import datetime as dt
+import json
+import logging
+
+import celery
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+import pytz
+
+from . import mailsender
+from . import models
+
+logger = logging.getLogger(__name__)
+
+# notifications that fail this many times are not retried anymore
+MAX_ATTEMPTS = 5
+# maximum number of notifications that are sent by each task run
+BATCH_SIZE = 100
+
+
+def queue_notification(kind, order, **kwargs):
+    """Store a notification in the outbox.
+
+    A task that sends the pending notifications is sent after the current
+    transaction is committed.
+
+    Parameters
+    ----------
+    kind: str
+        One of the kinds of notification defined in
+        ``models.Notification``
+    order: models.Order
+        The order that the notification is about
+    kwargs: dict
+        JSON serializable arguments for the notification
+
+    Returns
+    -------
+    models.Notification
+        The stored notification
+
+    """
+
+    notification = models.Notification.objects.create(
+        kind=kind,
+        order=order,
+        arguments=json.dumps(kwargs)
+    )
+    transaction.on_commit(
+        lambda: celery.current_app.send_task(
+            "oseoserver.tasks.send_notifications")
+    )
+    return notification
+
+
+def send_notification(notification):
+    """Send a single notification.
+
+    Parameters
+    ----------
+    notification: models.Notification
+        The notification to send
+
+    """
+
+    order = notification.order
+    kwargs = json.loads(notification.arguments or "{}")
+    if notification.kind == models.Notification.MODERATION_REQUEST:
+        mailsender.send_moderation_request_email(
+            order_type=order.order_type,
+            order_id=order.id
+        )
+    elif notification.kind == models.Notification.ORDER_MODERATED:
+        mail_func = {
+            models.Order.PRODUCT_ORDER: (
+                mailsender.send_product_order_moderated_email),
+            models.Order.SUBSCRIPTION_ORDER: (
+                mailsender.send_subscription_moderated_email),
+        }[order.order_type]
+        _notify_order_stakeholders(order, mail_func, **kwargs)
+    elif notification.kind == models.Notification.ORDER_CANCELLED:
+        _notify_order_stakeholders(
+            order, mailsender.send_order_cancelled_email)
+    elif notification.kind == models.Notification.SUBSCRIPTION_TERMINATED:
+        _notify_order_stakeholders(
+            order, mailsender.send_subscription_terminated_email)
+    else:
+        raise ValueError(
+            "Invalid notification kind: {!r}".format(notification.kind))
+
+
+def send_pending_notifications(batch_size=BATCH_SIZE):
+    """Send the notifications that are waiting in the outbox.
+
+    Notifications that are being sent by another worker are skipped.
+    Notifications that fail are retried the next time, until they reach
+    the maximum number of attempts.
+
+    Parameters
+    ----------
+    batch_size: int, optional
+        Maximum number of notifications to send
+
+    Returns
+    -------
+    int
+        The number of notifications that have been sent
+
+    """
+
+    sent = 0
+    with transaction.atomic():
+        pending = models.Notification.objects.select_for_update(
+            skip_locked=True
+        ).filter(
+            sent_on__isnull=True,
+            attempts__lt=MAX_ATTEMPTS
+        ).select_related("order").order_by("id")[:batch_size]
+        for notification in pending:
+            try:
+                with transaction.atomic():
+                    send_notification(notification)
+            except Exception as err:
+                logger.exception("Could not send notification {}".format(
+                    notification))
+                notification.attempts += 1
+                notification.error = str(err)
+            else:
+                notification.sent_on = dt.datetime.now(pytz.utc)
+                sent += 1
+            notification.save()
+    return sent
+
+
+def _notify_order_stakeholders(order, notification_function, **kwargs):
+    mail_recipients = get_user_model().objects.filter(
+        Q(oseoserver_order_orders__id=order.pk) | Q(is_staff=True)
+    ).exclude(email="").distinct("email")
+    notification_function(
+        order=order,
+        recipients=mail_recipients,
+        **kwargs
+    )
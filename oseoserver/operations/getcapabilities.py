@@ -78,6 +78,13 @@ def build_operations_metadata():
         op.DCP[0].HTTP.Post.append(BIND())
         op.DCP[0].HTTP.Post[0].href = "http://{}{}".format(
             django_settings.SITE_DOMAIN, reverse("oseo_endpoint"))
+        max_page_size = settings.get_status_max_page_size()
+        if op_name == "GetStatus" and max_page_size is not None:
+            op.Constraint.append(ows.DomainType(
+                name="MaximumPageSize",
+                NoValues=BIND(),
+                DefaultValue=str(max_page_size)
+            ))
         op_meta.Operation.append(op)
     return op_meta
 
@@ -98,7 +105,7 @@ def build_contents():
                                       monitoring=False,
                                       off_line=False),
         SubmitCapabilities=BIND(
-            asynchronous=False,
+            asynchronous=settings.get_submit_asynchronous(),
             maxNumberOfProducts=settings.get_max_order_items(),
             globalDeliveryOptions=True,
             localDeliveryOptions=True,
@@ -15,16 +15,27 @@
 """Implements the OSEO GetStatus operation"""
 
 from __future__ import absolute_import
+import base64
 import datetime as dt
 import logging
 
 import dateutil.parser
+from django.db.models import Prefetch
+from django.db.models import Q
+from django.db.models import prefetch_related_objects
+from django.db.models.functions import Coalesce
+from lxml import etree
 from pyxb import BIND
+import pyxb.binding.datatypes as xsd
 import pyxb.bundles.opengis.oseo_1_0 as oseo
+import pyxb.utils.domutils
 
 from .. import models
 from .. import errors
+from .. import settings
 from .. import utilities
+from ..constants import ENCODING
+from ..constants import NAMESPACES
 from ..utilities import _n
 
 logger = logging.getLogger(__name__)
@@ -32,6 +43,218 @@ logger = logging.getLogger(__name__)
 BRIEF = "brief"
 FULL = "full"
 
+# Related objects that are fetched together with each order, using SQL joins
+ORDER_SELECT_RELATED = (
+    "delivery_information",
+    "invoice_address",
+    "selected_delivery_option",
+)
+
+# Number of orders whose related objects are prefetched at a time when
+# streaming responses
+STREAM_PREFETCH_CHUNK_SIZE = 100
+
+# Name of the extension element that carries the continuation cursor of
+# paginated order searches, both in requests and in responses
+PAGE_CURSOR = "pageCursor"
+
+# Possible values for the OSEOSERVER_GET_STATUS_RESPONSE_BUILDER setting
+PYXB_BUILDER = "pyxb"
+LXML_BUILDER = "lxml"
+COMPARE_BUILDER = "compare"
+
+
+def create_delivery_address_element(parent, tag, delivery_address):
+    """Add an OSEO DeliveryAddressType element to the input parent."""
+    address = _sub_element(parent, tag)
+    _optional_sub_element(address, "firstName", delivery_address.first_name)
+    _optional_sub_element(address, "lastName", delivery_address.last_name)
+    _optional_sub_element(address, "companyRef", delivery_address.company_ref)
+    postal_address = _sub_element(address, "postalAddress")
+    _optional_sub_element(postal_address, "streetAddress",
+                          delivery_address.street_address)
+    _optional_sub_element(postal_address, "city", delivery_address.city)
+    _optional_sub_element(postal_address, "state", delivery_address.state)
+    _optional_sub_element(postal_address, "postalCode",
+                          delivery_address.postal_code)
+    _optional_sub_element(postal_address, "country", delivery_address.country)
+    _optional_sub_element(postal_address, "postBox",
+                          delivery_address.post_box)
+    _optional_sub_element(address, "telephoneNumber",
+                          delivery_address.telephone)
+    _optional_sub_element(address, "facsimileTelephoneNumber",
+                          delivery_address.fax)
+    return address
+
+
+def create_delivery_information_element(parent, delivery_information):
+    """Add an OSEO DeliveryInformationType element to the input parent."""
+    information = _sub_element(parent, "deliveryInformation")
+    optional_attrs = [
+        delivery_information.first_name,
+        delivery_information.last_name,
+        delivery_information.company_ref,
+        delivery_information.street_address,
+        delivery_information.city,
+        delivery_information.state,
+        delivery_information.postal_code,
+        delivery_information.country,
+        delivery_information.post_box,
+        delivery_information.telephone,
+        delivery_information.fax
+    ]
+    if any(optional_attrs):
+        create_delivery_address_element(
+            information, "mailAddress", delivery_information)
+    for oa in delivery_information.online_addresses.all():
+        online_address = _sub_element(information, "onlineAddress")
+        _sub_element(online_address, "protocol", oa.protocol)
+        _sub_element(online_address, "serverAddress", oa.server_address)
+        _optional_sub_element(online_address, "userName", oa.user_name)
+        _optional_sub_element(online_address, "userPassword",
+                              oa.user_password)
+        _optional_sub_element(online_address, "path", oa.path)
+    return information
+
+
+def create_delivery_options_element(parent, instance):
+    """Add an OSEO DeliveryOptionsType element to the input parent.
+
+    Nothing is added if the input instance does not have any delivery
+    options.
+
+    """
+
+    ModelClass = models.OrderDeliveryOption if isinstance(
+        instance, models.Order) else models.ItemSpecificationDeliveryOption
+    try:
+        instance_delivery = instance.selected_delivery_option
+    except ModelClass.DoesNotExist:
+        delivery_options = None
+    else:
+        delivery_options = _sub_element(parent, "deliveryOptions")
+        if instance_delivery.delivery_type == (
+                models.BaseDeliveryOption.ONLINE_DATA_ACCESS):
+            online_access = _sub_element(delivery_options, "onlineDataAccess")
+            _sub_element(online_access, "protocol",
+                         instance_delivery.delivery_details)
+        elif instance_delivery.delivery_type == (
+                models.BaseDeliveryOption.ONLINE_DATA_DELIVERY):
+            online_delivery = _sub_element(delivery_options,
+                                           "onlineDataDelivery")
+            _sub_element(online_delivery, "protocol",
+                         instance_delivery.delivery_details)
+        else:  # media delivery
+            medium, shipping = instance_delivery.delivery_details.partition(
+                ",")[::2]
+            media_delivery = _sub_element(delivery_options, "mediaDelivery")
+            _sub_element(media_delivery, "packageMedium", medium)
+            _optional_sub_element(media_delivery, "shippingInstructions",
+                                  shipping)
+        _optional_sub_element(delivery_options, "numberOfCopies",
+                              instance_delivery.copies)
+        _optional_sub_element(delivery_options, "productAnnotation",
+                              instance_delivery.annotation)
+        _optional_sub_element(delivery_options, "specialInstructions",
+                              instance_delivery.special_instructions)
+    return delivery_options
+
+
+def create_items_status_elements(parent, batch):
+    """Add an OSEO CommonOrderStatusItemType element for each batch item"""
+    order_type = batch.order.order_type
+    if order_type not in (models.Order.PRODUCT_ORDER,
+                          models.Order.MASSIVE_ORDER,
+                          models.Order.SUBSCRIPTION_ORDER):
+        raise NotImplementedError  # tasking order
+    # sorting in python keeps any prefetched order items from being queried
+    # again
+    order_items = sorted(batch.order_items.all(),
+                         key=lambda item: item.item_specification_id)
+    for item in order_items:
+        collection_id = utilities.get_collection_identifier(
+            item.item_specification.collection)
+        status_item = _sub_element(parent, "orderItem")
+        _sub_element(status_item, "itemId", item.item_specification.item_id)
+        if order_type == models.Order.SUBSCRIPTION_ORDER:
+            subscription_id = _sub_element(status_item, "subscriptionId")
+            _sub_element(subscription_id, "collectionId", collection_id)
+        else:
+            product_id = _sub_element(status_item, "productId")
+            _sub_element(product_id, "identifier", item.identifier)
+            _sub_element(product_id, "collectionId", collection_id)
+        _sub_element(
+            status_item,
+            "productOrderOptionsId",
+            "Options for {} {}".format(item.item_specification.collection,
+                                       batch.order.order_type)
+        )
+        _optional_sub_element(status_item, "orderItemRemark", item.remark)
+        create_delivery_options_element(status_item, item.item_specification)
+        create_status_element(status_item, "orderItemStatusInfo", item)
+
+
+def create_order_monitor_element(parent, order, presentation="brief"):
+    """Add an OSEO CommonOrderMonitorSpecification element to the parent.
+
+    This function generates the same XML as ``create_oseo_order_monitor()``
+    but it builds it directly with lxml, bypassing pyxb's binding creation
+    and validation.
+
+    """
+
+    is_massive = order.order_type == order.MASSIVE_ORDER
+    order_monitor = _sub_element(parent, "orderMonitorSpecification")
+    _optional_sub_element(
+        order_monitor,
+        "orderReference",
+        order.MASSIVE_ORDER_REFERENCE if is_massive else order.reference
+    )
+    _optional_sub_element(order_monitor, "orderRemark", order.remark)
+    _optional_sub_element(order_monitor, "packaging", order.packaging)
+    # add any 'option' elements
+    create_delivery_options_element(order_monitor, order)
+    _optional_sub_element(order_monitor, "priority", order.priority)
+    try:
+        create_delivery_information_element(
+            order_monitor, order.delivery_information)
+    except models.DeliveryInformation.DoesNotExist:
+        pass
+    try:
+        create_delivery_address_element(
+            order_monitor, "invoiceAddress", order.invoice_address)
+    except models.InvoiceAddress.DoesNotExist:
+        pass
+    _sub_element(order_monitor, "orderType",
+                 order.PRODUCT_ORDER if is_massive else order.order_type)
+    _sub_element(order_monitor, "orderId", order.id)
+    create_status_element(order_monitor, "orderStatusInfo", order)
+    if order.status_changed_on is not None:
+        _sub_element(order_monitor, "orderDateTime",
+                     xsd.dateTime(order.status_changed_on).xsdLiteral())
+    if presentation == FULL:
+        for batch in order.batches.all():
+            create_items_status_elements(order_monitor, batch)
+    return order_monitor
+
+
+def create_page_cursor_extension_element(parent, cursor):
+    """Add an OSEO extension element with a pagination cursor."""
+    extension = _sub_element(parent, "extension")
+    extension.append(_create_page_cursor(cursor))
+    return extension
+
+
+def create_status_element(parent, tag, instance):
+    """Add an OSEO StatusType element to the input parent."""
+    status = _sub_element(parent, tag)
+    _sub_element(status, "status", instance.status)
+    _optional_sub_element(status, "additionalStatusInfo",
+                          instance.additional_status_info)
+    _optional_sub_element(status, "missionSpecificStatusInfo",
+                          instance.mission_specific_status_info)
+    return status
+
 
 def create_oseo_delivery_address(delivery_address):
     return oseo.DeliveryAddressType(
@@ -90,7 +313,7 @@ def create_oseo_delivery_information(delivery_information):
             delivery_information.telephone)
         information.mailAddress.facsimileTelephoneNumber = _n(
             delivery_information.fax)
-    for oa in delivery_information.onlineaddress_set.all():
+    for oa in delivery_information.online_addresses.all():
         information.onlineAddress.append(oseo.OnlineAddressType())
         information.onlineAddress[-1].protocol = oa.protocol
         information.onlineAddress[-1].serverAddress = oa.server_address
@@ -135,8 +358,11 @@ def create_oseo_delivery_options(instance):
 
 def create_oseo_items_status(batch):
     items_status = []
-    queryset = batch.order_items.all().order_by("item_specification__id")
-    for item in queryset:
+    # sorting in python keeps any prefetched order items from being queried
+    # again
+    order_items = sorted(batch.order_items.all(),
+                         key=lambda item: item.item_specification_id)
+    for item in order_items:
         collection_id = utilities.get_collection_identifier(
             item.item_specification.collection)
         status_item = oseo.CommonOrderStatusItemType(
@@ -144,7 +370,7 @@ def create_oseo_items_status(batch):
             productId=item.identifier,
             productOrderOptionsId="Options for {} {}".format(
                 item.item_specification.collection,
-                item.batch.order.order_type
+                batch.order.order_type
             ),
             orderItemRemark=_n(item.remark),
             orderItemStatusInfo=oseo.StatusType(
@@ -176,6 +402,14 @@ def create_oseo_items_status(batch):
 
 
 
+def create_oseo_page_cursor_extension(cursor):
+    """Create an OSEO ExtensionType with a pagination cursor"""
+    extension = oseo.ExtensionType()
+    extension.append(pyxb.utils.domutils.StringToDOM(
+        etree.tostring(_create_page_cursor(cursor))).documentElement)
+    return extension
+
+
 def create_oseo_order_monitor(order, presentation="brief"):
     """Generate the oseo.commonOrderMonitor instance used in GetStatus."""
     order_monitor = oseo.CommonOrderMonitorSpecification(
@@ -244,7 +478,8 @@ def find_orders(user, last_update=None, last_update_end=None,
 
     """
 
-    records_qs = models.Order.objects.filter(user=user)
+    records_qs = models.Order.objects.filter(user=user).select_related(
+        *ORDER_SELECT_RELATED)
     if last_update is not None:
         records_qs = records_qs.filter(status_changed_on__gte=last_update)
     if last_update_end is not None:
@@ -259,7 +494,41 @@ def find_orders(user, last_update=None, last_update_end=None,
     return records_qs
 
 
-def generate_get_status_response(records, presentation):
+def decode_page_cursor(cursor):
+    """Decode a continuation cursor created by ``encode_page_cursor()``
+
+    Returns
+    -------
+    tuple
+        A two-element tuple with the timestamp of the last status change
+        and the identifier of the last order of the previous page
+
+    """
+
+    try:
+        decoded = base64.urlsafe_b64decode(
+            cursor.encode(ENCODING)).decode(ENCODING)
+        timestamp, order_id = decoded.split("|")
+        result = dateutil.parser.parse(timestamp), int(order_id)
+    except (ValueError, TypeError):
+        raise errors.InvalidParameterValueError(
+            locator="extension", value=cursor)
+    return result
+
+
+def encode_page_cursor(order):
+    """Create an opaque continuation cursor pointing after the input order
+
+    The cursor uses the order's pagination key, which is made of the
+    timestamp of its last status change and its identifier.
+
+    """
+
+    raw = "{}|{}".format(order.last_status_change.isoformat(), order.id)
+    return base64.urlsafe_b64encode(raw.encode(ENCODING)).decode(ENCODING)
+
+
+def generate_get_status_response(records, presentation, next_cursor=None):
     """Create an oseo.GetstatusResponse instance with the input records
 
     records: list or django queryset
@@ -268,6 +537,8 @@ def generate_get_status_response(records, presentation):
         list of pyoseo.models.Order while iterating.
     presentation: str
         The presentation to use
+    next_cursor: str, optional
+        Continuation cursor for the next page of a paginated order search
 
     """
 
@@ -276,9 +547,165 @@ def generate_get_status_response(records, presentation):
     for record in records:
         order_monitor = create_oseo_order_monitor(record, presentation)
         response.orderMonitorSpecification.append(order_monitor)
+    if next_cursor is not None:
+        response.extension.append(
+            create_oseo_page_cursor_extension(next_cursor))
     return response
 
 
+def generate_get_status_response_element(records, presentation,
+                                         next_cursor=None):
+    """Create a GetStatusResponse element with the input records
+
+    This is the lxml counterpart of ``generate_get_status_response()``.
+
+    records: list or django queryset
+        Either a one element list with a pyoseo.models.Order
+        or a django queryset, that will be evaluated to an
+        list of pyoseo.models.Order while iterating.
+    presentation: str
+        The presentation to use
+    next_cursor: str, optional
+        Continuation cursor for the next page of a paginated order search
+
+    Returns
+    -------
+    etree.Element
+        The GetStatusResponse element
+
+    """
+
+    response = etree.Element(_qualify("GetStatusResponse"),
+                             nsmap={"oseo": NAMESPACES["oseo"]})
+    _sub_element(response, "status", "success")
+    for record in records:
+        create_order_monitor_element(response, record, presentation)
+    if next_cursor is not None:
+        create_page_cursor_extension_element(response, next_cursor)
+    return response
+
+
+def generate_get_status_response_stream(records, presentation):
+    """Generate a GetStatusResponse incrementally
+
+    This is a streaming counterpart of ``generate_get_status_response()``.
+    Each orderMonitorSpecification element is built and serialized on its
+    own, so that only a single order needs to be kept in memory at any
+    given time.
+
+    The first order is fetched and rendered right away, before the response
+    starts being sent, so that errors in setting up the response are raised
+    by this function. Errors that happen later on cannot change the response
+    anymore. They are logged and raised again, which aborts the response
+    before it is closed, so that clients never receive a successful response
+    with missing orders.
+
+    Parameters
+    ----------
+    records: iterable
+        An iterable with the pyoseo.models.Order instances to include in the
+        response. Pass a queryset's ``iterator()`` in order to have the
+        database results fetched with a server-side cursor.
+    presentation: str
+        The presentation to use
+
+    Returns
+    -------
+    generator
+        Yields successive encoded chunks of the response's XML, without an
+        XML declaration
+
+    """
+
+    records = iter(records)
+    container = etree.Element(_qualify("GetStatusResponse"),
+                              nsmap={"oseo": NAMESPACES["oseo"]})
+    first_chunks = []
+    for record in records:
+        first_chunks.append(
+            _serialize_order_monitor(container, record, presentation))
+        break
+    return _stream_get_status_response(
+        first_chunks, records, container, presentation)
+
+
+def get_order_page(records_qs, page_size, cursor=None):
+    """Return a page of orders from an order search
+
+    Orders are sorted by the time of their last status change and then by
+    their identifier. Orders that have never changed status use their
+    creation time instead.
+
+    Parameters
+    ----------
+    records_qs: django queryset
+        The orders that matched the search criteria
+    page_size: int
+        The maximum number of orders to return
+    cursor: str, optional
+        A continuation cursor obtained from a previous page
+
+    Returns
+    -------
+    page: list
+        The orders that belong to the requested page
+    next_cursor: str
+        The cursor for requesting the next page, or None if this is the
+        last one
+
+    """
+
+    records_qs = records_qs.annotate(
+        last_status_change=Coalesce("status_changed_on", "created_on")
+    ).order_by("last_status_change", "id")
+    if cursor is not None:
+        last_change, last_id = decode_page_cursor(cursor)
+        records_qs = records_qs.filter(
+            Q(last_status_change__gt=last_change) |
+            Q(last_status_change=last_change, id__gt=last_id)
+        )
+    page = list(records_qs[:page_size + 1])
+    if len(page) > page_size:
+        page = page[:page_size]
+        next_cursor = encode_page_cursor(page[-1])
+    else:
+        next_cursor = None
+    return page, next_cursor
+
+
+def get_order_prefetch_lookups(presentation):
+    """Return the prefetch plan for generating the status of orders
+
+    Together with ``ORDER_SELECT_RELATED``, these lookups allow building
+    the GetStatus response with a fixed number of database queries,
+    regardless of the number of orders, batches and items involved.
+
+    Parameters
+    ----------
+    presentation: str
+        The presentation to use. Batches and order items are only
+        prefetched for the 'full' presentation
+
+    Returns
+    -------
+    list
+        The lookups to pass to ``prefetch_related()``
+
+    """
+
+    lookups = ["delivery_information__online_addresses"]
+    if presentation == FULL:
+        lookups.extend([
+            "batches",
+            Prefetch(
+                "batches__order_items",
+                queryset=models.OrderItem.objects.select_related(
+                    "item_specification__selected_delivery_option")
+            ),
+        ])
+    return lookups
+
+
 def get_status(request, user):
     """Implements the OSEO Getstatus operation.
 
@@ -294,16 +721,23 @@ def get_status(request, user):
 
     Returns
     -------
-    oseo.GetStatusResponse
-        The response GetStatusResponse instance
+    oseo.GetStatusResponse or etree.Element or generator
+        The response GetStatusResponse instance. Depending on the
+        configured response builder this may also be an lxml element. When
+        streaming of order search responses is enabled, the response is
+        a generator that yields the encoded XML in chunks
 
     """
 
     records = []
+    next_cursor = None
+    prefetch_lookups = get_order_prefetch_lookups(request.presentation)
     if request.orderId is not None:  # 'order retrieve' type of request
         try:
-            order = models.Order.objects.get(id=int(request.orderId))
-            if order.user == user:
+            order = models.Order.objects.select_related(
+                *ORDER_SELECT_RELATED).prefetch_related(
+                *prefetch_lookups).get(id=int(request.orderId))
+            if order.user_id == user.id:
                 records.append(order)
             else:
                 raise errors.AuthorizationFailedError(locator="orderId")
@@ -318,5 +752,156 @@ def get_status(request, user):
                 status for status in request.filteringCriteria.orderStatus],
             order_reference=request.filteringCriteria.orderReference
         )
-    response = generate_get_status_response(records, request.presentation)
+        page_size = settings.get_status_max_page_size()
+        if page_size is not None:
+            records, next_cursor = get_order_page(
+                records, page_size, cursor=_get_request_page_cursor(request))
+            prefetch_related_objects(records, *prefetch_lookups)
+    if settings.get_stream_get_status_response() and not isinstance(
+            records, list):
+        response = generate_get_status_response_stream(
+            _prefetch_in_chunks(records.iterator(), prefetch_lookups),
+            request.presentation
+        )
+    else:
+        if not isinstance(records, list):
+            records = records.prefetch_related(*prefetch_lookups)
+        response = _generate_get_status_response(
+            records, request.presentation, next_cursor=next_cursor)
+    return response
+
+
+def _create_page_cursor(cursor):
+    cursor_element = etree.Element(
+        "{{{}}}{}".format(NAMESPACES["oseoserver"], PAGE_CURSOR),
+        nsmap={"oseoserver": NAMESPACES["oseoserver"]}
+    )
+    cursor_element.text = cursor
+    return cursor_element
+
+
+def _stream_get_status_response(first_chunks, records, container,
+                                presentation):
+    start = (
+        '<oseo:GetStatusResponse xmlns:oseo="{}">'
+        '<oseo:status>success</oseo:status>'.format(NAMESPACES["oseo"])
+    )
+    yield start.encode(ENCODING)
+    for chunk in first_chunks:
+        yield chunk
+    try:
+        for record in records:
+            yield _serialize_order_monitor(container, record, presentation)
+    except Exception:
+        logger.exception("Could not generate the status of all orders. "
+                         "Aborting the response")
+        raise
+    yield "</oseo:GetStatusResponse>".encode(ENCODING)
+
+
+def _serialize_order_monitor(container, record, presentation):
+    order_monitor = create_order_monitor_element(
+        container, record, presentation)
+    container.remove(order_monitor)
+    return etree.tostring(order_monitor, encoding=ENCODING)
+
+
+def _generate_get_status_response(records, presentation, next_cursor=None):
+    """Generate the response with the configured response builder"""
+    builder = settings.get_status_response_builder()
+    if builder == LXML_BUILDER:
+        response = generate_get_status_response_element(
+            records, presentation, next_cursor=next_cursor)
+    elif builder == COMPARE_BUILDER:
+        response = _generate_compared_get_status_response(
+            records, presentation, next_cursor=next_cursor)
+    else:
+        response = generate_get_status_response(
+            records, presentation, next_cursor=next_cursor)
     return response
+
+
+def _generate_compared_get_status_response(records, presentation,
+                                           next_cursor=None):
+    """Generate the response with both builders and compare their output.
+
+    This is meant for testing the lxml builder against the reference pyxb
+    builder. Any differences are logged and the pyxb response is returned.
+
+    """
+
+    records = list(records)
+    response = generate_get_status_response(
+        records, presentation, next_cursor=next_cursor)
+    reference = etree.fromstring(
+        response.toxml(encoding=ENCODING),
+        parser=utilities.get_etree_parser()
+    )
+    candidate = generate_get_status_response_element(
+        records, presentation, next_cursor=next_cursor)
+    if not utilities.elements_equal(reference, candidate):
+        logger.error(
+            "The lxml GetStatus response differs from the pyxb one.\n"
+            "pyxb:\n{}\nlxml:\n{}".format(
+                etree.tostring(reference, pretty_print=True),
+                etree.tostring(candidate, pretty_print=True)
+            )
+        )
+    return response
+
+
+def _get_request_page_cursor(request):
+    """Extract the pagination cursor from a GetStatus request, if any"""
+    cursor = None
+    for extension in request.extension:
+        for element in extension.wildcardElements():
+            namespace = getattr(element, "namespaceURI", None)
+            name = getattr(element, "localName", None)
+            if namespace == NAMESPACES["oseoserver"] and name == PAGE_CURSOR:
+                cursor = "".join(node.data for node in element.childNodes
+                                 if hasattr(node, "data")).strip()
+    return cursor
+
+
+def _optional_sub_element(parent, name, value):
+    """Add a child element only if there is a value for it"""
+    if value is not None and value != "":
+        result = _sub_element(parent, name, value)
+    else:
+        result = None
+    return result
+
+
+def _prefetch_in_chunks(orders, lookups,
+                        chunk_size=STREAM_PREFETCH_CHUNK_SIZE):
+    """Prefetch related objects for successive chunks of orders
+
+    Django does not apply ``prefetch_related()`` lookups to querysets that
+    are consumed with ``iterator()``, so they are applied here to each chunk
+    of orders as it is read from the server-side cursor.
+
+    """
+
+    chunk = []
+    for order in orders:
+        chunk.append(order)
+        if len(chunk) == chunk_size:
+            prefetch_related_objects(chunk, *lookups)
+            for prefetched in chunk:
+                yield prefetched
+            chunk = []
+    if len(chunk) > 0:
+        prefetch_related_objects(chunk, *lookups)
+        for prefetched in chunk:
+            yield prefetched
+
+
+def _qualify(name):
+    return "{{{}}}{}".format(NAMESPACES["oseo"], name)
+
+
+def _sub_element(parent, name, value=None):
+    element = etree.SubElement(parent, _qualify(name))
+    if value is not None:
+        element.text = str(value)
+    return element
@@ -18,6 +18,7 @@ from __future__ import absolute_import
 import datetime as dt
 import logging
 
+import celery
 from django.db import transaction
 from django.core.exceptions import ObjectDoesNotExist
 from lxml import etree
@@ -28,12 +29,14 @@ from .. import models
 from .. import errors
 from .. import utilities
 from .. import settings
+from ..collectionresolver import resolve_collection_ids
 from ..utilities import _n, _c
 from ..utilities import get_etree_parser
 from ..constants import ENCODING
 from ..models import CustomizableItem
 from ..models import Order
 from ..models import BaseDeliveryOption
+from ..registry import get_registry
 
 logger = logging.getLogger(__name__)
 
@@ -159,8 +162,11 @@ def create_delivery_option(oseo_delivery, collection, order_type,
     return delivery_option
 
 
-def create_item_specification(item, item_processor, order_type):
-    """Create an order item specification.
+def build_item_specification(item, item_processor, order_type,
+                             collection_ids=None):
+    """Build an order item specification and its related records in memory.
+
+    Everything is validated but nothing is saved to the database.
 
     Parameters
     ----------
@@ -168,14 +174,37 @@ def create_item_specification(item, item_processor, order_type):
         The requested item specification
     item_processor: oseoserver.itemprocessor
         The custom item_processor class used to process order items
+    order_type: str
+        Type of order
+    collection_ids: dict, optional
+        Collection identifiers of the order's items that do not specify
+        one, as returned by ``resolve_collection_ids``. Items that are not
+        in this mapping have their collection looked up individually
+
+    Returns
+    -------
+    item_specification: models.ItemSpecification
+        The unsaved item specification
+    options: list
+        The unsaved ``models.SelectedItemOption`` instances of the item
+    delivery_option: models.ItemSpecificationDeliveryOption
+        The unsaved delivery option of the item, or None
 
     """
+
     if order_type in (Order.PRODUCT_ORDER, Order.MASSIVE_ORDER):
-        collection_id = (
-            item.productId.collectionId or
-            item_processor.get_collection_id(item.productId.identifier)
-        )
         identifier = _c(item.productId.identifier)
+        collection_id = item.productId.collectionId
+        if not collection_id:
+            if collection_ids is None or identifier not in collection_ids:
+                collection_ids = resolve_collection_ids(
+                    [identifier], item_processor)
+            collection_id = collection_ids[identifier]
+            if collection_id is None:
+                raise errors.OseoServerError(
+                    "Could not retrieve collection id for item "
+                    "{!r}".format(identifier)
+                )
     elif order_type == Order.SUBSCRIPTION_ORDER:
         collection_id = item.subscriptionId.collectionId
         identifier = ""
@@ -190,7 +219,7 @@ def create_item_specification(item, item_processor, order_type):
         item_id=item.itemId
     )
     item_specification.full_clean()
-    item_specification.save()
+    options = []
     for requested_option in item.option:
         values = requested_option.ParameterData.values
         # since values is an xsd:anyType, we will not do schema
@@ -198,29 +227,100 @@ def create_item_specification(item, item_processor, order_type):
         values_tree = etree.fromstring(
             values.toxml(ENCODING), parser=get_etree_parser())
         for element in values_tree:
-            option = create_option(
-                option_element=element,
-                order_type=Order.PRODUCT_ORDER,
-                collection_name=collection_name,
-                customizable_item=item_specification,
-                item_processor=item_processor
+            options.append(
+                create_option(
+                    option_element=element,
+                    order_type=Order.PRODUCT_ORDER,
+                    collection_name=collection_name,
+                    customizable_item=item_specification,
+                    item_processor=item_processor
+                )
             )
-            option.save()
-            item_specification.selected_options.add(option)
     if item.deliveryOptions is not None:
-        item_delivery = create_delivery_option(
+        delivery_option = create_delivery_option(
             oseo_delivery=item.deliveryOptions,
             collection=collection_name,
             order_type=Order.PRODUCT_ORDER,
             customizable_item=item
         )
-        item_delivery.item_specification = item_specification
-        item_specification.selected_delivery_option = item_delivery
-        item_delivery.save()
+    else:
+        delivery_option = None
     # scene selection options are not implemented yet
     # payment is not implemented yet
     # add extensions?
+    return item_specification, options, delivery_option
+
+
+def bulk_create_item_specifications(order, item_specifications):
+    """Save the input item specifications with a fixed number of queries.
+
+    Parameters
+    ----------
+    order: models.Order
+        The already saved order that the item specifications belong to
+    item_specifications: list
+        An iterable of (item_specification, options, delivery_option)
+        tuples, as returned by ``build_item_specification``
+
+    Returns
+    -------
+    list
+        The saved ``models.ItemSpecification`` instances
+
+    """
+
+    specifications = [spec for spec, options, delivery in item_specifications]
+    for specification in specifications:
+        specification.order = order
+    models.ItemSpecification.objects.bulk_create(specifications)
+    if any(spec.pk is None for spec in specifications):
+        # the database backend cannot return the ids of bulk inserted rows.
+        # This order's item specifications have all been inserted just now
+        ids = order.item_specifications.order_by("id").values_list(
+            "id", flat=True)
+        for specification, pk in zip(specifications, ids):
+            specification.pk = pk
+    selected_options = []
+    delivery_options = []
+    for specification, options, delivery in item_specifications:
+        for option in options:
+            option.item_specification = specification
+            selected_options.append(option)
+        if delivery is not None:
+            delivery.item_specification = specification
+            specification.selected_delivery_option = delivery
+            delivery_options.append(delivery)
+    models.SelectedItemOption.objects.bulk_create(selected_options)
+    models.ItemSpecificationDeliveryOption.objects.bulk_create(
+        delivery_options)
+    return specifications
+
+
+def create_item_specification(item, item_processor, order_type,
+                              collection_ids=None):
+    """Create an order item specification.
+
+    Parameters
+    ----------
+    item: pyxb.bundles.opengis.oseo_1_0.CommonOrderItemType
+        The requested item specification
+    item_processor: oseoserver.itemprocessor
+        The custom item_processor class used to process order items
+    collection_ids: dict, optional
+        Collection identifiers of the order's items that do not specify one
+
+    """
+
+    item_specification, options, item_delivery = build_item_specification(
+        item, item_processor, order_type, collection_ids=collection_ids)
     item_specification.save()
+    for option in options:
+        option.item_specification = item_specification
+        option.save()
+    if item_delivery is not None:
+        item_delivery.item_specification = item_specification
+        item_specification.selected_delivery_option = item_delivery
+        item_delivery.save()
     return item_specification
 
 
@@ -261,14 +361,13 @@ def create_option(option_element, order_type, collection_name,
         raise errors.InvalidParameterValueError(
             locator="option", value=option_name)
     # 3. is the parsed value legal?
-    for allowed_option in settings.get_processing_options():
-        if allowed_option["name"] == option_name:
-            choices = allowed_option.get("choices", [])
-            if parsed_value not in choices and len(choices) > 0:
-                raise errors.InvalidParameterValueError(
-                    "option", value=parsed_value)
-            break
-    else:
+    try:
+        allowed_option = get_registry().options_by_name[option_name]
+    except KeyError:
+        raise errors.InvalidParameterValueError(
+            "option", value=parsed_value)
+    choices = allowed_option.get("choices", [])
+    if parsed_value not in choices and len(choices) > 0:
         raise errors.InvalidParameterValueError(
             "option", value=parsed_value)
     OptionClass = (
@@ -283,12 +382,68 @@ def create_option(option_element, order_type, collection_name,
     return option
 
 
-def create_order_delivery_information(delivery_information):
+def create_order(order_specification, user, status_notification,
+                 submit_request=""):
+    """Create a new order from the general parameters of its specification.
+
+    Parameters
+    ----------
+    order_specification: oseo.OrderSpecification
+        The specification for the order
+    user: django.contrib.auth.models.User
+        The django user instance associated with the order
+    status_notification: str
+        The order status notification
+    submit_request: str, optional
+        The raw Submit request, when the order specification is to be
+        processed asynchronously
+
+    Returns
+    -------
+    models.Order
+        The saved order
+
+    """
+
+    order_type = get_order_type(order_specification)
+    logger.debug("Processing specification for {0!r}".format(order_type))
+    check_order_type_enabled(order_type)
+    if order_specification.packaging is not None:
+        logger.critical("Packaging is not implemented")
+        raise errors.NoApplicableCodeError()
+    if submit_request != "":
+        status_info = "Order is awaiting validation"
+    else:
+        status_info = "Order is awaiting approval"
+    order = models.Order(
+        status=Order.SUBMITTED,
+        additional_status_info=status_info,
+        mission_specific_status_info="",  # not implemented yet
+        remark=_c(order_specification.orderRemark),
+        user=user,
+        order_type=order_type,
+        reference=_c(order_specification.orderReference),
+        packaging=_c(order_specification.packaging),
+        priority=_c(order_specification.priority) or models.Order.STANDARD,
+        status_notification=status_notification,
+        submit_request=submit_request
+    )
+    order.full_clean()
+    order.save()
+    return order
+
+
+def create_order_delivery_information(delivery_information, order=None,
+                                      bulk=False):
     """Extract delivery information from a request
 
     Parameters
     ----------
     delivery_information: oseo.DeliveryInformationType
+    order: models.Order, optional
+        The order that the delivery information belongs to
+    bulk: bool, optional
+        Whether the online addresses are to be saved with a single query
 
     Returns
     -------
@@ -302,6 +457,7 @@ def create_order_delivery_information(delivery_information):
     else:
         address_fields = {}
     info = models.DeliveryInformation(
+        order=order,
         first_name=address_fields.get("first_name", ""),
         last_name =address_fields.get("last_name", ""),
         company_ref =address_fields.get("company_ref", ""),
@@ -318,18 +474,22 @@ def create_order_delivery_information(delivery_information):
     )
     info.full_clean()
     info.save()
-    if len(delivery_information.onlineAddress) > 0:
-        for item in delivery_information.onlineAddress:
-            online_address = models.OnlineAddress(
-                delivery_information=info,
-                protocol=_c(item.protocol),
-                server_address=_c(item.serverAddress),
-                user_name=_c(item.userName),
-                user_password=_c(item.userPassword),
-                path=_c(item.path)
-            )
-            online_address.full_clean()
+    online_addresses = []
+    for item in delivery_information.onlineAddress:
+        online_address = models.OnlineAddress(
+            delivery_information=info,
+            protocol=_c(item.protocol),
+            server_address=_c(item.serverAddress),
+            user_name=_c(item.userName),
+            user_password=_c(item.userPassword),
+            path=_c(item.path)
+        )
+        online_address.full_clean()
+        if bulk:
+            online_addresses.append(online_address)
+        else:
             online_address.save()
+    models.OnlineAddress.objects.bulk_create(online_addresses)
     return info
 
 
@@ -457,15 +617,9 @@ def get_order_configuration(order_type, collection):
 
     """
 
-    for collection_config in settings.get_collections():
-        is_collection = collection_config.get("name") == collection
-        type_specific_config = collection_config.get(
-            order_type.lower(), {})
-        is_enabled = type_specific_config.get("enabled", False)
-        if is_collection and is_enabled:
-            result = type_specific_config
-            break
-    else:
+    try:
+        result = get_registry().order_configurations[(collection, order_type)]
+    except KeyError:
         if order_type in (Order.PRODUCT_ORDER, Order.MASSIVE_ORDER):
             raise errors.ProductOrderingNotSupportedError()
         elif order_type == Order.SUBSCRIPTION_ORDER:
@@ -509,7 +663,7 @@ def get_order_type(order_specification):
 
 
 def process_request_order_specification(order_specification, user,
-                                        status_notification):
+                                        status_notification, order=None):
     """Process an order specification.
 
     This function is responsible for parsing the input
@@ -528,6 +682,10 @@ def process_request_order_specification(order_specification, user,
         The django user instance associated with the order
     status_notification: str
         The order status notification
+    order: models.Order, optional
+        An order that has already been created by an asynchronous Submit
+        request and that is to be populated with the order specification.
+        If not given, a new order is created
 
     Returns
     -------
@@ -538,36 +696,22 @@ def process_request_order_specification(order_specification, user,
 
     """
 
-    order_type = get_order_type(order_specification)
-    logger.debug("Processing specification for {0!r}".format(order_type))
-    check_order_type_enabled(order_type)
-    if order_specification.packaging is not None:
-        logger.critical("Packaging is not implemented")
-        raise errors.NoApplicableCodeError()
-    order = models.Order(
-        status=Order.SUBMITTED,
-        additional_status_info="Order is awaiting approval",
-        mission_specific_status_info="",  # not implemented yet
-        remark=_c(order_specification.orderRemark),
-        user=user,
-        order_type=order_type,
-        reference=_c(order_specification.orderReference),
-        packaging=_c(order_specification.packaging),
-        priority=_c(order_specification.priority) or models.Order.STANDARD,
-        status_notification=status_notification
-    )
-    order.full_clean()
-    order.save()
+    bulk = settings.get_submit_bulk_create()
+    if order is None:
+        order = create_order(order_specification, user, status_notification)
+    else:
+        order.additional_status_info = "Order is awaiting approval"
+        order.submit_request = ""
+        order.save()
+    order_type = order.order_type
     logger.debug("Validated general order parameters")
     if order_type == Order.MASSIVE_ORDER and len(
             order_specification.orderItem) > 1:
         raise RuntimeError("Orders of type {!r} must specify a single "
                            "order item".format(order_type))
     if order_specification.deliveryInformation is not None:
-        delivery_information = create_order_delivery_information(
-            order_specification.deliveryInformation)
-        delivery_information.order = order
-        delivery_information.save()
+        create_order_delivery_information(
+            order_specification.deliveryInformation, order=order, bulk=bulk)
     logger.debug("Extracted order delivery information")
     if order_specification.invoiceAddress is not None:
         order.invoice_address = create_order_invoice_address(
@@ -577,14 +721,30 @@ def process_request_order_specification(order_specification, user,
         models.Extension.objects.create(order=order, text=extension)
     logger.debug("Extracted order extensions")
     item_processor = utilities.get_item_processor(order_type)
+    collection_ids = _resolve_order_collection_ids(
+        order_specification, order_type, item_processor)
     requested_collections = set()
-    for oseo_item in order_specification.orderItem:
-        item_specification = create_item_specification(
-            item=oseo_item,
-            item_processor=item_processor,
-            order_type=order_type
+    if bulk:
+        item_specifications = bulk_create_item_specifications(
+            order,
+            [build_item_specification(item=oseo_item,
+                                      item_processor=item_processor,
+                                      order_type=order_type,
+                                      collection_ids=collection_ids)
+             for oseo_item in order_specification.orderItem]
         )
-        order.item_specifications.add(item_specification)
+    else:
+        item_specifications = []
+        for oseo_item in order_specification.orderItem:
+            item_specification = create_item_specification(
+                item=oseo_item,
+                item_processor=item_processor,
+                order_type=order_type,
+                collection_ids=collection_ids
+            )
+            order.item_specifications.add(item_specification)
+            item_specifications.append(item_specification)
+    for item_specification in item_specifications:
         requested_collections.add(item_specification.collection)
     if order_specification.deliveryOptions is not None:
         for collection in requested_collections:
@@ -607,6 +767,7 @@ def process_request_order_specification(order_specification, user,
     # items first
     validate_order_delivery_options(order)
     logger.debug("Validated delivery options for order and items")
+    order_options = []
     for requested_option in order_specification.option:
         values = requested_option.ParameterData.values
         # since values is an xsd:anyType, we will not do schema
@@ -622,8 +783,13 @@ def process_request_order_specification(order_specification, user,
                     customizable_item=order,
                     item_processor=item_processor
                 )
-                option.save()
-                order.selected_options.add(option)
+                option.order = order
+                order_options.append(option)
+    if bulk:
+        models.SelectedOrderOption.objects.bulk_create(order_options)
+    else:
+        for option in order_options:
+            option.save()
     logger.debug("Extracted order options")
     validate_order_type_specific_constraints(order)
     order.full_clean()
@@ -644,6 +810,47 @@ def process_request_quotation_id():
     raise NotImplementedError
 
 
+def store_request_order_specification(request, user):
+    """Store a Submit request so that it is processed asynchronously.
+
+    Only the general order parameters are checked here. The order is saved
+    together with the raw request and a celery task is sent to validate
+    and save the rest of the order specification later.
+
+    Parameters
+    ----------
+    request: pyxb.bundles.opengis.oseo_1_0.Submit
+        The request to store
+    user: django.contrib.auth.models.User
+        User that has placed the request
+
+    Returns
+    -------
+    oseo.SubmitAck
+        Response to a successfull oseo:Submit order request
+    models.Order
+        The django instance of the newly created order
+
+    """
+
+    order = create_order(
+        request.orderSpecification,
+        user,
+        request.statusNotification,
+        submit_request=request.toxml(ENCODING).decode(ENCODING)
+    )
+    transaction.on_commit(
+        lambda: celery.current_app.send_task(
+            "oseoserver.tasks.process_submit_request", (order.id,))
+    )
+    response = oseo.SubmitAck(
+        status="success",
+        orderId=str(order.id),
+        orderReference=_n(order.reference)
+    )
+    return response, order
+
+
 @transaction.atomic
 def submit(request, user):
     """OSEO Submit handler.
@@ -660,13 +867,16 @@ def submit(request, user):
     response: pyxb.bundles.opengis.oseo_1_0.SubmitAck
         OSEO response to be sent to the client
     order: models.Order
-        Order instance
+        Order instance. When Submit requests are processed asynchronously
+        it has not been validated yet
 
     """
 
     if request.statusNotification != Order.NONE:
         raise NotImplementedError("Status notifications are not supported")
-    if request.orderSpecification:
+    if request.orderSpecification and settings.get_submit_asynchronous():
+        response, order = store_request_order_specification(request, user)
+    elif request.orderSpecification:
         response, order = process_request_order_specification(
             request.orderSpecification, user, request.statusNotification)
     else:
@@ -707,7 +917,9 @@ def validate_order_delivery_options(order):
             "Order {!r} does not specify any delivery options. Inspecting "
             "individual item specifications...".format(order)
         )
-        for item_specification in order.item_specifications.all():
+        item_specifications = order.item_specifications.select_related(
+            "selected_delivery_option")
+        for item_specification in item_specifications:
             try:
                 item_specification.selected_delivery_option
             except models.ItemSpecificationDeliveryOption.DoesNotExist:
@@ -796,24 +1008,49 @@ def _get_order_item_count(order, item_processor):
             collection = item_specification.collection
             start, end = item_processor.get_order_duration(
                 item_specification)
-            ids = item_processor.get_massive_order_batch_item_identifiers(
-                    batch_index=0,
+            ids, checkpoint = (
+                utilities.get_massive_order_batch_item_identifiers(
+                    item_processor,
                     collection=collection,
                     start=start,
                     end=end,
+                    batch_index=0,
                     items_per_batch=settings.get_max_order_items()
                 )
+            )
             item_count += len(ids)
     else:
         raise NotImplementedError
     return item_count
 
 
+def _resolve_order_collection_ids(order_specification, order_type,
+                                  item_processor):
+    """Find the collections of all the order items that do not specify one.
+
+    All of the missing collections are looked up at once, so that an order
+    with many items does not query the catalogues once for each item.
+
+    """
+
+    if order_type not in (Order.PRODUCT_ORDER, Order.MASSIVE_ORDER):
+        return {}
+    unresolved = []
+    for oseo_item in order_specification.orderItem:
+        identifier = _c(oseo_item.productId.identifier)
+        if not oseo_item.productId.collectionId and (
+                identifier not in unresolved):
+            unresolved.append(identifier)
+    if len(unresolved) > 0:
+        result = resolve_collection_ids(unresolved, item_processor)
+    else:
+        result = {}
+    return result
+
+
 def _validate_active_order_items(order_type, order_items, user):
     MAXIMUM_ACTIVE_ITEMS = settings.get_max_active_items()
-    user_items = models.OrderItem.objects.filter(
-        batch__order__user=user
-    ).filter(status=CustomizableItem.IN_PRODUCTION).count()
+    user_items = models.ActiveItemCounter.get_active_items(user.pk)
     if (user_items + order_items) > MAXIMUM_ACTIVE_ITEMS:
         error_msg = (
             "User {0.username!r} has too many active order items. Refusing "
@@ -21,6 +21,7 @@ implementation.
 from __future__ import absolute_import
 import logging
 import datetime as dt
+from multiprocessing.pool import ThreadPool
 
 from lxml import etree
 from pyxb import BIND
@@ -104,6 +105,59 @@ class ExampleOrderProcessor(object):
                                          "id for item {!r}".format(item_id))
         return collection_id
 
+    def get_collection_ids(self, item_ids):
+        """Determine the collection identifiers for several items at once.
+
+        This method is optional. When it is implemented, oseoserver uses it
+        instead of `get_collection_id` in order to find the collections of
+        all the items of an order that do not provide the 'collectionId'
+        element. The example shown here sends a single CSW GetRecordById
+        request with all of the identifiers to each of the defined
+        catalogue endpoints, querying the catalogues concurrently.
+
+        Parameters
+        ----------
+        item_ids: list
+            Identifiers of the order items whose collection is to be found
+
+        Returns
+        -------
+        dict
+            A mapping with the collection identifier of each item. Items
+            that are not present in any catalogue are mapped to None. Items
+            that could not be checked, because some catalogue could not be
+            reached, are left out.
+
+        """
+
+        endpoints = []
+        for collection in settings.get_collections():
+            endpoint = collection.get("catalogue_endpoint")
+            if endpoint is not None and endpoint not in endpoints:
+                endpoints.append(endpoint)
+        pool = ThreadPool(max(1, min(
+            len(endpoints), settings.get_catalogue_max_concurrent_requests())))
+        try:
+            responses = pool.map(
+                lambda endpoint: self._get_catalogue_parent_identifiers(
+                    endpoint, item_ids),
+                endpoints
+            )
+        finally:
+            pool.close()
+            pool.join()
+        result = {}
+        for item_id in item_ids:
+            # the first catalogue where the item is found wins
+            for found in responses:
+                if found is not None and item_id in found:
+                    result[item_id] = found[item_id]
+                    break
+            else:
+                if all(found is not None for found in responses):
+                    result[item_id] = None
+        return result
+
     def get_subscription_batch_identifiers(self, timeslot, collection,
                                            **kwargs):
         """
@@ -233,3 +287,69 @@ class ExampleOrderProcessor(object):
         logger.debug("arguments: {}".format(locals()))
         return "http://fakeurl.com", "/phony/location"
 
+    def setup(self):
+        """Acquire any resources that are reused between order items.
+
+        This method is optional. It is called once, right after the
+        processor is instantiated, which in celery workers happens when the
+        worker process starts. A real implementation could open catalogue
+        sessions or connection pools here.
+
+        """
+
+        pass
+
+    def teardown(self):
+        """Release the resources that have been acquired in `setup`.
+
+        This method is optional. It is called when a celery worker process
+        shuts down.
+
+        """
+
+        pass
+
+    def _get_catalogue_parent_identifiers(self, endpoint, item_ids):
+        """Ask a CSW catalogue for the collections of the input items.
+
+        Returns a mapping with the parent identifier of each item that is
+        present in the catalogue, or None if the catalogue could not be
+        reached.
+
+        """
+
+        ns = {"gmd": gmd.Namespace.uri(), "gco": gco.Namespace.uri(),}
+        req = csw.GetRecordById(
+            service="CSW",
+            version="2.0.2",
+            ElementSetName="summary",
+            outputSchema=ns["gmd"],
+            Id=[BIND(item_id) for item_id in item_ids]
+        )
+        try:
+            response = requests.post(
+                endpoint,
+                data=req.toxml(),
+                headers={"Content-Type": "application/xml"}
+            )
+        except requests.RequestException:
+            logger.warning("Could not reach catalogue {!r}".format(endpoint))
+            return None
+        if response.status_code != 200:
+            logger.warning("Catalogue {!r} returned an error: "
+                           "{}".format(endpoint, response.status_code))
+            return None
+        r = etree.fromstring(response.text.encode(constants.ENCODING))
+        result = {}
+        for record in r.xpath("gmd:MD_Metadata", namespaces=ns):
+            identifier = record.xpath(
+                "gmd:fileIdentifier/gco:CharacterString/text()",
+                namespaces=ns
+            )
+            parent = record.xpath(
+                "gmd:parentIdentifier/gco:CharacterString/text()",
+                namespaces=ns
+            )
+            if any(identifier) and any(parent):
+                result[str(identifier[0])] = str(parent[0])
+        return result
@@ -0,0 +1,257 @@
+# Copyright 2017 Ricardo Garcia Silva
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Precompiled lookup tables for oseoserver's settings.
+
+The collections and processing options are defined in the django settings
+as lists. The registry indexes them in dictionaries so that the functions
+that need to look them up in the request path do not have to scan the
+lists every time. The registry is built on first use and it is rebuilt
+whenever django's ``setting_changed`` signal is sent for one of the
+oseoserver settings.
+
+This module also keeps the item processor instances of the current process.
+Each configured item processor class is instantiated only once and its
+optional ``setup()`` method is called right after. The instances are kept
+until ``teardown_item_processors`` is called, which calls their optional
+``teardown()`` method. Celery workers call ``setup_item_processors`` and
+``teardown_item_processors`` when each worker process starts and stops, so
+processors can hold on to expensive resources, like network sessions or
+open file handles, between order items.
+
+"""
+
+from __future__ import absolute_import
+from collections import namedtuple
+import logging
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from . import settings
+
+try:
+    from types import MappingProxyType as _frozen
+except ImportError:  # python 2
+    _frozen = dict
+
+logger = logging.getLogger(__name__)
+
+# these are the keys used by the collection settings for each order type
+ORDER_TYPE_KEYS = {
+    "PRODUCT_ORDER": "product_order",
+    "SUBSCRIPTION_ORDER": "subscription_order",
+    "MASSIVE_ORDER": "massive_order",
+    "TASKING_ORDER": "tasking_order",
+}
+
+SettingsRegistry = namedtuple("SettingsRegistry", [
+    "collections_by_name",
+    "collections_by_identifier",
+    "options_by_name",
+    "order_configurations",
+])
+SettingsRegistry.__doc__ = """Indexed view over oseoserver's settings.
+
+collections_by_name: mapping
+    Collection settings, keyed by the collection's name
+collections_by_identifier: mapping
+    Collection settings, keyed by the collection's identifier
+options_by_name: mapping
+    Processing option settings, keyed by the option's name
+order_configurations: mapping
+    The settings of each order type that is enabled in a collection, keyed
+    by a (collection name, order type) tuple
+
+"""
+
+_registry = None
+_item_processors = {}
+_item_processors_lock = threading.Lock()
+
+
+def build_registry():
+    """Build a new registry from the current settings"""
+    collections_by_name = {}
+    collections_by_identifier = {}
+    order_configurations = {}
+    for collection_config in settings.get_collections():
+        name = collection_config.get("name")
+        collections_by_name.setdefault(name, collection_config)
+        identifier = collection_config.get("collection_identifier")
+        if identifier is not None:
+            collections_by_identifier.setdefault(identifier,
+                                                 collection_config)
+        for order_type, key in ORDER_TYPE_KEYS.items():
+            type_config = collection_config.get(key, {})
+            if type_config.get("enabled", False):
+                order_configurations.setdefault((name, order_type),
+                                                type_config)
+    options_by_name = {}
+    for option_config in settings.get_processing_options():
+        options_by_name.setdefault(option_config.get("name"), option_config)
+    return SettingsRegistry(
+        collections_by_name=_frozen(collections_by_name),
+        collections_by_identifier=_frozen(collections_by_identifier),
+        options_by_name=_frozen(options_by_name),
+        order_configurations=_frozen(order_configurations),
+    )
+
+
+def get_registry():
+    """Return the registry, building it if needed"""
+    global _registry
+    if _registry is None:
+        _registry = build_registry()
+    return _registry
+
+
+@receiver(setting_changed, dispatch_uid="oseoserver_reset_registry")
+def reset_registry(setting=None, **kwargs):
+    """Discard the current registry when the oseoserver settings change"""
+    global _registry
+    if setting is None or setting.startswith("OSEOSERVER_"):
+        _registry = None
+        teardown_item_processors()
+
+
+def get_item_processor(python_path):
+    """Return the instance of the item processor class at python_path
+
+    The class is imported and instantiated the first time it is requested.
+    Subsequent calls return the same instance.
+
+    Parameters
+    ----------
+    python_path: str
+        Dotted path to the item processor class
+
+    """
+
+    try:
+        return _item_processors[python_path]
+    except KeyError:
+        pass
+    from .utilities import import_class
+    with _item_processors_lock:
+        processor = _item_processors.get(python_path)
+        if processor is None:
+            processor = import_class(python_path)
+            setup = getattr(processor, "setup", None)
+            if setup is not None:
+                logger.debug("Setting up item processor {!r}...".format(
+                    python_path))
+                setup()
+            _item_processors[python_path] = processor
+    return processor
+
+
+def get_item_processor_paths():
+    """Return the dotted paths of the item processors used by each order type
+    """
+
+    paths = set()
+    for get_order_config in (settings.get_product_order,
+                             settings.get_subscription_order,
+                             settings.get_tasking_order,
+                             settings.get_massive_order):
+        path = get_order_config().get("item_processor")
+        if path is not None:
+            paths.add(path)
+    return sorted(paths)
+
+
+def setup_item_processors():
+    """Instantiate and set up all of the configured item processors"""
+    for python_path in get_item_processor_paths():
+        get_item_processor(python_path)
+
+
+def teardown_item_processors():
+    """Tear down and discard the item processor instances of this process
+
+    Errors raised by a processor's ``teardown()`` method are logged and do
+    not prevent the other processors from being torn down.
+
+    """
+
+    with _item_processors_lock:
+        processors = list(_item_processors.items())
+        _item_processors.clear()
+    for python_path, processor in processors:
+        teardown = getattr(processor, "teardown", None)
+        if teardown is not None:
+            logger.debug("Tearing down item processor {!r}...".format(
+                python_path))
+            try:
+                teardown()
+            except Exception:
+                logger.exception("Could not tear down item processor "
+                                 "{!r}".format(python_path))
+
+
+def validate_settings():
+    """Check that the collection and processing option settings are sound
+
+    This is run when django starts, so that configuration errors are
+    detected right away instead of when processing requests. Django keeps
+    starting up anyway and the problems are only logged as warnings.
+
+    Raises
+    ------
+    django.core.exceptions.ImproperlyConfigured
+        If any of the collections or options is incorrectly configured
+
+    """
+
+    problems = []
+    collection_names = set()
+    collection_identifiers = set()
+    for collection_config in settings.get_collections():
+        name = collection_config.get("name")
+        identifier = collection_config.get("collection_identifier")
+        if name is None:
+            problems.append("A collection is missing its 'name'")
+        elif name in collection_names:
+            problems.append("Duplicate collection name {!r}".format(name))
+        if identifier is None:
+            problems.append("Collection {!r} is missing its "
+                            "'collection_identifier'".format(name))
+        elif identifier in collection_identifiers:
+            problems.append(
+                "Duplicate collection identifier {!r}".format(identifier))
+        collection_names.add(name)
+        collection_identifiers.add(identifier)
+    option_names = set()
+    for option_config in settings.get_processing_options():
+        option_name = option_config.get("name")
+        if option_name is None:
+            problems.append("A processing option is missing its 'name'")
+        elif option_name in option_names:
+            problems.append(
+                "Duplicate processing option {!r}".format(option_name))
+        option_names.add(option_name)
+    for (collection, order_type), type_config in get_registry(
+            ).order_configurations.items():
+        for option_name in type_config.get("options", []):
+            if option_name not in option_names:
+                problems.append(
+                    "Collection {!r} uses undefined processing option {!r} "
+                    "for {}".format(collection, option_name, order_type)
+                )
+    if any(problems):
+        raise ImproperlyConfigured(
+            "Invalid oseoserver settings: {}".format("; ".join(problems)))
@@ -44,26 +44,34 @@ result, status_code, response_headers = s.process_request(request)
 #
 from __future__ import absolute_import
 import datetime as dt
+import inspect
+import json
 import logging
 from itertools import product
 
 import celery
-from django.db.models import Q
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.exceptions import ValidationError
 from django.db import transaction
-from django.contrib.auth import get_user_model
 from lxml import etree
+import lxml.sax
 import pytz
+import pyxb.binding.saxer
 import pyxb.bundles.opengis.oseo_1_0 as oseo
 import pyxb.bundles.opengis.ows as ows_bindings
 import pyxb
 
 from . import errors
-from . import mailsender
 from . import models
+from . import notifications
 from . import utilities
 from .constants import ENCODING
 from .models import Order
 from .models import CustomizableItem
+from .operations import submit
+from .settings import get_massive_order_batches_in_flight
+from .settings import get_max_active_items
 from .settings import get_max_order_items
 
 logger = logging.getLogger(__name__)
@@ -81,6 +89,23 @@ OPERATION_CALLABLES = {
     "Cancel": "oseoserver.operations.cancel.cancel",
 }
 
+# statuses of batches and order items that are no longer being processed
+FINISHED_STATUSES = (
+    CustomizableItem.CANCELLED,
+    CustomizableItem.COMPLETED,
+    CustomizableItem.DOWNLOADED,
+    CustomizableItem.FAILED,
+    CustomizableItem.TERMINATED,
+)
+
+MASSIVE_BATCH_IDENTIFIERS_CACHE_KEY = (
+    "oseoserver-order-{}-batch-{}-identifiers")
+MASSIVE_BATCH_IDENTIFIERS_CACHE_TIMEOUT = 60 * 60 * 24  # seconds
+# how long to wait before trying to schedule a massive order that has no
+# batches being processed but cannot get new ones due to the active items
+# limit
+MASSIVE_ORDER_RETRY_DELAY = 60  # seconds
+
 
 def cancel_order(order, notify=False,
                  notification_details="User has cancelled the order"):
@@ -92,10 +117,8 @@ def cancel_order(order, notify=False,
         order.status_changed_on = dt.datetime.now(pytz.utc)
     order.save()
     if notify:
-        _notify_order_stakeholders(
-            order=order,
-            notification_function=mailsender.send_order_cancelled_email,
-        )
+        notifications.queue_notification(
+            models.Notification.ORDER_CANCELLED, order)
 
 
 def terminate_subscription(subscription, notify=True,
@@ -107,10 +130,8 @@ def terminate_subscription(subscription, notify=True,
     )
     subscription.save()
     if notify:
-        _notify_order_stakeholders(
-            subscription,
-            mailsender.send_subscription_terminated_email,
-        )
+        notifications.queue_notification(
+            models.Notification.SUBSCRIPTION_TERMINATED, subscription)
 
 
 def create_exception_report(code, text, locator=None):
@@ -153,33 +174,29 @@ def create_massive_order_batch(order, batch_index=0):
         logger.error("Order {} has a {} status. Cannot create new "
                      "batches".format(order, order.status))
         raise errors.InvalidOrderIdentifierError()
-    processor = utilities.get_item_processor(order.order_type)
-    all_identifiers = []
-    for item_specification in order.item_specifications.all():
-        start, end = processor.get_order_duration(item_specification)
-        identifiers = processor.get_massive_order_batch_item_identifiers(
-            batch_index=batch_index,
-            collection=item_specification.collection,
-            start=start,
-            end=end,
-            items_per_batch=get_max_order_items()
-        )
-        all_identifiers.extend(product([item_specification], identifiers))
+    if batch_index == 0 or order.estimated_batches is None:
+        order.refresh_estimated_batches()
+    all_identifiers, checkpoints = get_massive_order_batch_identifiers(
+        order, batch_index)
+    item_specifications = {
+        item_specification.id: item_specification for item_specification
+        in order.item_specifications.all()
+    }
     batch = models.Batch(
         order=order,
         status=order.status,
-        additional_status_info=order.additional_status_info
+        additional_status_info=order.additional_status_info,
+        identifiers_checkpoint=(
+            json.dumps(checkpoints) if checkpoints is not None else "")
     )
     batch.full_clean()
     batch.save()
-    for (item_specification, item_identifier) in all_identifiers:
-        order_item = models.OrderItem(
-            item_specification=item_specification,
-            batch=batch,
+    batch.create_order_items([
+        models.OrderItem(
+            item_specification=item_specifications[item_specification_id],
             identifier=item_identifier,
-        )
-        order_item.full_clean()
-        order_item.save()
+        ) for item_specification_id, item_identifier in all_identifiers
+    ])
     return batch
 
 
@@ -196,16 +213,14 @@ def create_product_order_batch(order):
     )
     batch.full_clean()
     batch.save()
-    for item_specification in order.item_specifications.all():
-        order_item = models.OrderItem(
+    batch.create_order_items([
+        models.OrderItem(
             status=order.status,
             additional_status_info=order.additional_status_info,
             item_specification=item_specification,
-            batch=batch,
             identifier=item_specification.identifier,
-        )
-        order_item.full_clean()
-        order_item.save()
+        ) for item_specification in order.item_specifications.all()
+    ])
     return batch
 
 
@@ -289,6 +304,36 @@ def create_tasking_order_batch():
     raise NotImplementedError
 
 
+def dispatch_request(request_data, user):
+    """Parse the request and hand it to the relevant operation function.
+
+    Parameters
+    ----------
+    request_data: etree.Element
+        The request data
+    user: django.contrib.auth.models.User
+        The django user that is responsible for the request
+
+    Returns
+    -------
+    pyxb.bundles.opengis.oseo_1_0 subtype or etree.Element
+        The operation's response, not yet serialized
+
+    """
+
+    schema_instance = parse_xml(request_data)
+    operation, op_name = get_operation(schema_instance)
+    logger.debug("Requested operation: {!r}".format(op_name))
+    result = operation(schema_instance, user)
+    if op_name == "Submit":
+        response, order = result
+        if order.submit_request == "":
+            moderate_order(order)
+    else:
+        response = result
+    return response
+
+
 def find_subscription_batch(order, timeslot, collection):
     processor = utilities.get_item_processor(order.order_type)
     item_identifier = processor.get_subscription_item_identifier(
@@ -306,6 +351,40 @@ def find_subscription_batch(order, timeslot, collection):
     return existing_batch
 
 
+def get_massive_order_batch_identifiers(order, batch_index):
+    """Return the identifiers of the order items of a massive order batch.
+
+    Identifiers that have been found in advance by
+    ``precompute_massive_order_batch_identifiers`` are taken from the cache.
+    Otherwise they are requested from the item processor.
+
+    Parameters
+    ----------
+    order: models.Order
+        The massive order
+    batch_index: int
+        Index of the batch in the order
+
+    Returns
+    -------
+    identifiers: list
+        A list of (item_specification_id, item_identifier) tuples
+    checkpoints: dict
+        The checkpoints where the batch stops for each item specification,
+        or None if the item processor does not support them
+
+    """
+
+    cache_key = MASSIVE_BATCH_IDENTIFIERS_CACHE_KEY.format(
+        order.id, batch_index)
+    result = cache.get(cache_key)
+    if result is None:
+        result = _find_massive_order_batch_identifiers(order, batch_index)
+    else:
+        cache.delete(cache_key)
+    return result
+
+
 def get_operation(request):
     """Dynamically import the requested operation function at runtime.
 
@@ -323,31 +402,79 @@ def get_operation(request):
 
     """
 
-    oseo_op = request.toDOM().firstChild.tagName.partition(":")[-1]
+    oseo_op = request._element().name().localName()
     operation_function_path = OPERATION_CALLABLES[oseo_op]
     the_operation = utilities.import_callable(operation_function_path)
     return the_operation, oseo_op
 
 
+def handle_asynchronous_submit(order):
+    """Validate and save the order specification of a stored Submit request.
+
+    This is the second step of asynchronous Submit requests. The order has
+    already been created and acknowledged to the client. If its
+    specification turns out to be invalid, or if it cannot be processed
+    because of some unexpected error, the order is marked as failed.
+    Otherwise it is moderated just like synchronous orders.
+
+    Parameters
+    ----------
+    order: models.Order
+        An order that is waiting to be validated
+
+    Returns
+    -------
+    bool
+        Whether the order specification is valid
+
+    """
+
+    try:
+        request = parse_xml(etree.fromstring(
+            order.submit_request.encode(ENCODING),
+            parser=utilities.get_etree_parser()
+        ))
+        with transaction.atomic():
+            submit.process_request_order_specification(
+                request.orderSpecification,
+                order.user,
+                order.status_notification,
+                order=order
+            )
+            moderate_order(order)
+    except (errors.OseoServerError, ObjectDoesNotExist, ValidationError,
+            RuntimeError) as err:
+        logger.warning("Order {} is not valid: {}".format(order.id, err))
+        _fail_asynchronous_submit(order, "Order is not valid: {}".format(err))
+        valid = False
+    except Exception as err:
+        logger.exception("Could not process order {}".format(order.id))
+        _fail_asynchronous_submit(
+            order, "Order could not be processed: {}".format(err))
+        valid = False
+    else:
+        valid = True
+    return valid
+
+
 def handle_massive_order(order):
     """Handle an already accepted massive order.
 
-    The handling process consists in creating the first batch of the massive
-    order, updating the status accordingly and send the batch to the processing
-    queue.
+    The handling process consists in updating the status of the order and
+    then creating its first batches and sending them to the processing
+    queue. The following batches are scheduled as the previous ones finish.
 
     """
 
     order.status = CustomizableItem.SUSPENDED
     order.additional_status_info = ("Order is waiting in the queue for an "
                                     "available processing slot")
-    batch = create_massive_order_batch(order, batch_index=0)
-    batch.order = order
     order.save()
     logger.info(
-        "Sending first batch of order {!r} to processing queue".format(order))
-    celery.current_app.send_task(
-        "oseoserver.tasks.process_batch", (batch.id,))
+        "Sending first batches of order {!r} to processing queue".format(
+            order)
+    )
+    schedule_massive_order_batches(order)
 
 
 def handle_product_order(order):
@@ -370,7 +497,10 @@ def handle_product_order(order):
     order.save()
     logger.info("Sending order {!r} to processing queue...".format(order))
     celery.current_app.send_task(
-        "oseoserver.tasks.process_batch", (batch.id,))
+        "oseoserver.tasks.process_batch",
+        (batch.id,),
+        **utilities.get_task_routing(order.order_type, order.priority)
+    )
 
 
 def handle_submit(order, approved, notify=False):
@@ -411,17 +541,8 @@ def handle_submit(order, approved, notify=False):
             "Order request has been rejected by the administrators")
     order.save()
     if notify:
-        mail_func = {
-            Order.PRODUCT_ORDER: mailsender.send_product_order_moderated_email,
-            Order.SUBSCRIPTION_ORDER: (
-                mailsender.send_subscription_moderated_email)
-        }[order.order_type]
-
-        _notify_order_stakeholders(
-            order=order,
-            notification_function=mail_func,
-            approved=approved
-        )
+        notifications.queue_notification(
+            models.Notification.ORDER_MODERATED, order, approved=approved)
     return approved
 
 
@@ -474,10 +595,8 @@ def moderate_order(order):
     else:
         logger.debug("Orders of type {!r} have to be manually approved by an "
                      "admin".format(order.order_type))
-        mailsender.send_moderation_request_email(
-            order_type=order.order_type,
-            order_id=order.id
-        )
+        notifications.queue_notification(
+            models.Notification.MODERATION_REQUEST, order)
         result = False
     return result
 
@@ -485,6 +604,10 @@ def moderate_order(order):
 def parse_xml(xml):
     """Parse input XML request and return a valid PyXB object.
 
+    The input element has already been parsed by lxml, so its SAX events are
+    fed straight into PyXB's content handler. This avoids serializing the
+    element back to text just to have PyXB parse it again.
+
     Parameters
     ----------
     xml: lxml.etree.Element
@@ -496,9 +619,12 @@ def parse_xml(xml):
 
     """
 
+    saxer = pyxb.binding.saxer.make_parser(
+        fallback_namespace=oseo.Namespace.fallbackNamespace())
+    handler = saxer.getContentHandler()
     try:
-        document = etree.tostring(xml, encoding=ENCODING)
-        oseo_request = oseo.CreateFromDocument(document)
+        lxml.sax.saxify(xml, handler)
+        oseo_request = handler.rootObject()
     except (pyxb.UnrecognizedDOMRootNodeError,
             pyxb.UnrecognizedContentError,
             pyxb.SimpleFacetValueError):
@@ -506,6 +632,33 @@ def parse_xml(xml):
     return oseo_request
 
 
+def precompute_massive_order_batch_identifiers(order, batch_index):
+    """Find the identifiers of a massive order batch and cache them.
+
+    This is used for looking ahead: the identifiers of the next batch are
+    requested from the item processor, which usually means querying the
+    catalogue, while the previous batches are being processed.
+
+    Returns
+    -------
+    identifiers: list
+        A list of (item_specification_id, item_identifier) tuples
+    checkpoints: dict
+        The checkpoints where the batch stops for each item specification,
+        or None if the item processor does not support them
+
+    """
+
+    cache_key = MASSIVE_BATCH_IDENTIFIERS_CACHE_KEY.format(
+        order.id, batch_index)
+    result = cache.get(cache_key)
+    if result is None:
+        result = _find_massive_order_batch_identifiers(order, batch_index)
+        cache.set(cache_key, result,
+                  timeout=MASSIVE_BATCH_IDENTIFIERS_CACHE_TIMEOUT)
+    return result
+
+
 def process_request(request_data, user):
     """Entry point for the ordering service.
 
@@ -515,6 +668,11 @@ def process_request(request_data, user):
     been processed, it may send order processing tasks to the processing
     queue, according to the configured behaviour on automatic approvals.
 
+    This function returns the response as an ``etree.Element``. Callers that
+    only need to send the response over the wire should use
+    ``dispatch_request`` together with ``serialize_response`` instead, which
+    avoid parsing the response again.
+
     Parameters
     ----------
     request_data: etree.Element
@@ -529,29 +687,165 @@ def process_request(request_data, user):
 
     """
 
-    schema_instance = parse_xml(request_data)
-    operation, op_name = get_operation(schema_instance)
-    logger.debug("Requested operation: {!r}".format(op_name))
-    result = operation(schema_instance, user)
-    if op_name == "Submit":
-        response, order = result
-        moderate_order(order)
+    response = dispatch_request(request_data, user)
+    if etree.iselement(response):
+        response_element = response
     else:
-        response = result
-    response_element = etree.fromstring(response.toxml(
-        encoding=ENCODING), parser=utilities.get_etree_parser())
+        serialized = serialize_response(response)
+        if not isinstance(serialized, bytes):  # a streamed response
+            serialized = b"".join(serialized)
+        response_element = etree.fromstring(
+            serialized, parser=utilities.get_etree_parser())
     return response_element
 
 
-def _notify_order_stakeholders(order, notification_function, **kwargs):
-    mail_recipients = get_user_model().objects.filter(
-        Q(oseoserver_order_orders__id=order.pk) | Q(is_staff=True)
-    ).exclude(email="").distinct("email")
-    notification_function(
-        order=order,
-        recipients=mail_recipients,
-        **kwargs
-    )
+def schedule_massive_order_batches(order):
+    """Create and queue the next batches of a massive order.
+
+    New batches are created while the order has fewer unfinished batches
+    than the OSEOSERVER_MASSIVE_ORDER_BATCHES_IN_FLIGHT setting and while
+    the order's user stays within the OSEOSERVER_MAX_ACTIVE_ITEMS setting.
+    The user's active items are the ones in production, as counted by
+    ``models.ActiveItemCounter``, plus the items of the new batches. The
+    identifiers of the batch that comes after the new ones are then
+    computed in advance by the ``precompute_massive_order_batch`` task.
+
+    This function is called when the order is accepted and whenever one of
+    its batches is finished. The caller should hold a lock on the order, so
+    that concurrent calls do not create the same batch twice.
+
+    Parameters
+    ----------
+    order: models.Order
+        The massive order to schedule
+
+    Returns
+    -------
+    list
+        The newly created batches
+
+    """
+
+    total_batches = order.estimated_batches
+    if total_batches is None:
+        total_batches = order.refresh_estimated_batches()
+    created_batches = order.batches.count()
+    in_flight = order.batches.exclude(status__in=FINISHED_STATUSES).count()
+    active_items = models.ActiveItemCounter.get_active_items(order.user_id)
+    max_in_flight = get_massive_order_batches_in_flight()
+    max_active_items = get_max_active_items()
+    new_batches = []
+    next_batch_precomputed = False
+    while created_batches < total_batches and in_flight < max_in_flight:
+        identifiers, checkpoints = precompute_massive_order_batch_identifiers(
+            order, created_batches)
+        num_items = len(identifiers)
+        if active_items > 0 and active_items + num_items > max_active_items:
+            logger.debug("User {} has too many active items. Batch {} of "
+                         "order {} must wait".format(order.user_id,
+                                                     created_batches, order))
+            next_batch_precomputed = True
+            break
+        new_batches.append(
+            create_massive_order_batch(order, batch_index=created_batches))
+        created_batches += 1
+        in_flight += 1
+        active_items += num_items
+    routing = utilities.get_task_routing(order.order_type, order.priority)
+    for batch in new_batches:
+        logger.info("Sending batch {} to processing queue".format(batch))
+        transaction.on_commit(
+            lambda batch_id=batch.id: celery.current_app.send_task(
+                "oseoserver.tasks.process_batch", (batch_id,), **routing)
+        )
+    if created_batches < total_batches:
+        if in_flight == 0:
+            transaction.on_commit(
+                lambda: celery.current_app.send_task(
+                    "oseoserver.tasks.schedule_massive_order",
+                    (order.id,),
+                    countdown=MASSIVE_ORDER_RETRY_DELAY
+                )
+            )
+        elif len(new_batches) > 0 and not next_batch_precomputed:
+            transaction.on_commit(
+                lambda batch_index=created_batches: (
+                    celery.current_app.send_task(
+                        "oseoserver.tasks.precompute_massive_order_batch",
+                        (order.id, batch_index)
+                    )
+                )
+            )
+    return new_batches
+
+
+def serialize_response(response):
+    """Serialize an operation's response.
+
+    Parameters
+    ----------
+    response: pyxb.bundles.opengis.oseo_1_0 subtype or etree.Element or
+              generator
+        The response returned by one of the OSEO operations. Some operations
+        may build their response directly with lxml or stream it as a
+        generator of already encoded chunks
+
+    Returns
+    -------
+    bytes or iterator
+        The encoded XML of the response, without an XML declaration, so that
+        it may be embedded directly in a SOAP envelope. Streamed responses
+        are returned as an iterator of bytes
+
+    """
+
+    if inspect.isgenerator(response):
+        result = response
+    elif etree.iselement(response):
+        result = etree.tostring(response, encoding=ENCODING,
+                                xml_declaration=False)
+    else:
+        result = response.toxml(encoding=ENCODING, root_only=True)
+    return result
+
+
+def _fail_asynchronous_submit(order, additional_status_info):
+    # discard any changes that were made to the order before the error
+    order.refresh_from_db()
+    order.status = Order.FAILED
+    order.additional_status_info = additional_status_info
+    order.submit_request = ""
+    order.save()
+
+
+def _find_massive_order_batch_identifiers(order, batch_index):
+    processor = utilities.get_item_processor(order.order_type)
+    previous_checkpoints = {}
+    if batch_index > 0:
+        previous = order.batches.order_by("id").values_list(
+            "identifiers_checkpoint", flat=True)[batch_index - 1:batch_index]
+        if len(previous) > 0 and previous[0] != "":
+            previous_checkpoints = json.loads(previous[0])
+    all_identifiers = []
+    checkpoints = {}
+    for item_specification in order.item_specifications.all():
+        key = str(item_specification.id)
+        start, end = processor.get_order_duration(item_specification)
+        identifiers, checkpoints[key] = (
+            utilities.get_massive_order_batch_item_identifiers(
+                processor,
+                collection=item_specification.collection,
+                start=start,
+                end=end,
+                batch_index=batch_index,
+                items_per_batch=get_max_order_items(),
+                checkpoint=previous_checkpoints.get(key)
+            )
+        )
+        all_identifiers.extend(product([item_specification.id], identifiers))
+    if all(checkpoint is None for checkpoint in checkpoints.values()):
+        checkpoints = None
+    return all_identifiers, checkpoints
 
 
 def _validate_subscription_batch_creation(order, collection, timeslot):
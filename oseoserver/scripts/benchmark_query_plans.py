@@ -0,0 +1,262 @@
+"""Show the database query plans of oseoserver's most frequent queries.
+
+The database is migrated to the latest migration and seeded with a large
+number of orders and order items. The plans are then shown twice: first
+with the indexes introduced in migration 0004 dropped and then with them
+recreated.
+
+This script must be run with the DJANGO_SETTINGS_MODULE environment
+variable pointing to the settings of a django project that has oseoserver
+installed. Use a throwaway database, as it is filled with random data and
+its indexes are dropped and recreated. The name of the database must be
+given with the ``--confirm-throwaway-database`` option.
+
+"""
+
+from __future__ import print_function
+import argparse
+import datetime as dt
+import logging
+import os
+import random
+import time
+
+import pytz
+
+logger = logging.getLogger(__name__)
+
+# indexes that were introduced in migration 0004_hot_query_indexes
+HOT_QUERY_INDEXES = {
+    "Order": [("order_type", "status"), ("user", "status_changed_on"),
+              ("user", "status")],
+    "OrderItem": [("identifier",), ("available", "expires_on"),
+                  ("batch", "status")],
+}
+SEED_USERNAME_PREFIX = "benchmark_user_"
+# keeps each INSERT statement within the limits of sqlite
+INSERT_BATCH_SIZE = 500
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(usage=__doc__)
+    parser.add_argument("--verbose", "-v", action="store_true")
+    parser.add_argument("--confirm-throwaway-database", metavar="NAME",
+                        required=True,
+                        help="Name of the database that is used. It must "
+                             "match the database in the django settings, "
+                             "as a confirmation that it may be filled with "
+                             "random data and have its indexes dropped")
+    parser.add_argument("--settings",
+                        help="Python path to the django settings module. "
+                             "Defaults to the DJANGO_SETTINGS_MODULE "
+                             "environment variable")
+    parser.add_argument("--users", type=int, default=100,
+                        help="Number of users to seed. Default: "
+                             "%(default)s")
+    parser.add_argument("--orders", type=int, default=100000,
+                        help="Number of orders to seed. Default: "
+                             "%(default)s")
+    parser.add_argument("--items-per-order", type=int, default=10,
+                        help="Number of order items to seed for each "
+                             "order. Default: %(default)s")
+    parser.add_argument("--skip-seed", action="store_true",
+                        help="Use the data seeded by a previous run")
+    return parser
+
+
+def main():
+    parser = get_parser()
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.WARNING)
+    if args.settings is not None:
+        os.environ["DJANGO_SETTINGS_MODULE"] = args.settings
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from django.db import connection
+    database_name = connection.settings_dict["NAME"]
+    if args.confirm_throwaway_database != database_name:
+        parser.error("The database in the django settings is {!r}. Pass "
+                     "its name to --confirm-throwaway-database if it may "
+                     "be modified".format(database_name))
+    call_command("migrate", verbosity=0)
+    if not args.skip_seed:
+        seed_database(args.users, args.orders, args.items_per_order)
+    toggle_hot_query_indexes(enabled=False)
+    try:
+        show_query_plans("without the hot query indexes")
+    finally:
+        toggle_hot_query_indexes(enabled=True)
+    show_query_plans("with the hot query indexes")
+
+
+def show_query_plans(description):
+    analyze_database()
+    print("=" * 79)
+    print("Query plans {}".format(description))
+    print("=" * 79)
+    for name, queryset in get_hot_queries():
+        print("\n--- {} ---".format(name))
+        print(explain(queryset))
+
+
+def toggle_hot_query_indexes(enabled):
+    """Drop or recreate the indexes that were added in migration 0004
+
+    The rest of the schema is left as it is in the latest migration.
+
+    """
+
+    from django.db import connection
+    from oseoserver import models
+    with connection.schema_editor() as schema_editor:
+        for model_name, indexes in HOT_QUERY_INDEXES.items():
+            model = getattr(models, model_name)
+            for field_names in indexes:
+                fields = [model._meta.get_field(name) for name in field_names]
+                if enabled:
+                    schema_editor.execute(schema_editor._create_index_sql(
+                        model, fields, suffix="_idx" if len(fields) > 1 else ""
+                    ))
+                else:
+                    names = schema_editor._constraint_names(
+                        model, [field.column for field in fields], index=True)
+                    for name in names:
+                        schema_editor.execute(
+                            schema_editor._delete_constraint_sql(
+                                schema_editor.sql_delete_index, model, name)
+                        )
+
+
+def analyze_database():
+    """Refresh the database statistics used by the query planner"""
+    from django.db import connection
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+def explain(queryset):
+    """Return the database's query plan for the input queryset"""
+    from django.db import connection
+    prefix = {
+        "postgresql": "EXPLAIN ANALYZE",
+        "sqlite": "EXPLAIN QUERY PLAN",
+    }.get(connection.vendor, "EXPLAIN")
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute("{} {}".format(prefix, sql), params)
+        rows = cursor.fetchall()
+    return "\n".join(" ".join(str(column) for column in row) for row in rows)
+
+
+def get_hot_queries():
+    """Return the queries that the new indexes are meant to speed up
+
+    Returns
+    -------
+    list
+        A list of (name, queryset) tuples
+
+    """
+
+    from django.contrib.auth import get_user_model
+    from oseoserver import models
+    user = get_user_model().objects.filter(
+        username__startswith=SEED_USERNAME_PREFIX).first()
+    batch = models.Batch.objects.order_by("-id").first()
+    identifier = models.OrderItem.objects.order_by("-id").values_list(
+        "identifier", flat=True).first()
+    now = dt.datetime.now(pytz.utc)
+    return [
+        (
+            "find_orders - lastUpdate",
+            models.Order.objects.filter(
+                user=user, status_changed_on__gte=now - dt.timedelta(days=1))
+        ),
+        (
+            "find_orders - orderStatus",
+            models.Order.objects.filter(
+                user=user, status__in=[models.Order.IN_PRODUCTION])
+        ),
+        (
+            "batch items by status",
+            models.OrderItem.objects.filter(
+                batch=batch, status=models.OrderItem.COMPLETED)
+        ),
+        (
+            "clean_expired_items",
+            models.OrderItem.objects.filter(available=True,
+                                            expires_on__lt=now)
+        ),
+        (
+            "find_subscription_batch",
+            models.OrderItem.objects.filter(identifier=identifier)
+        ),
+        (
+            "process_timeslot and terminate_expired_subscriptions",
+            models.Order.objects.filter(
+                order_type=models.Order.SUBSCRIPTION_ORDER
+            ).exclude(status__in=[
+                models.Order.SUBMITTED,
+                models.Order.CANCELLED,
+                models.Order.TERMINATED,
+            ])
+        ),
+    ]
+
+
+def seed_database(num_users, num_orders, items_per_order, chunk_size=5000):
+    """Fill the database with random orders, batches and order items"""
+    from django.contrib.auth import get_user_model
+    from oseoserver import models
+    start = time.time()
+    user_model = get_user_model()
+    users = []
+    for index in range(num_users):
+        user, created = user_model.objects.get_or_create(
+            username="{}{}".format(SEED_USERNAME_PREFIX, index))
+        users.append(user)
+    statuses = [choice[0] for choice in models.CustomizableItem.STATUS_CHOICES]
+    order_types = [choice[0] for choice in models.Order.ORDER_TYPE_CHOICES]
+    now = dt.datetime.now(pytz.utc)
+    for chunk_start in range(0, num_orders, chunk_size):
+        chunk_length = min(chunk_size, num_orders - chunk_start)
+        orders = models.Order.objects.bulk_create([
+            models.Order(
+                user=random.choice(users),
+                order_type=random.choice(order_types),
+                status=random.choice(statuses),
+                status_changed_on=now - dt.timedelta(
+                    minutes=random.randint(0, 60 * 24 * 365)),
+            ) for _ in range(chunk_length)
+        ], batch_size=INSERT_BATCH_SIZE)
+        if orders[0].pk is None:  # database can't return the new ids
+            orders = list(models.Order.objects.order_by("-id")[:chunk_length])
+        batches = models.Batch.objects.bulk_create(
+            [models.Batch(order=order) for order in orders],
+            batch_size=INSERT_BATCH_SIZE
+        )
+        if batches[0].pk is None:
+            batches = list(
+                models.Batch.objects.order_by("-id")[:chunk_length])
+        items = []
+        for batch in batches:
+            for _ in range(items_per_order):
+                available = random.random() < 0.2
+                items.append(
+                    models.OrderItem(
+                        batch=batch,
+                        identifier="product_{:012d}".format(
+                            random.randint(0, 10 ** 12)),
+                        status=random.choice(statuses),
+                        available=available,
+                        expires_on=(now + dt.timedelta(
+                            days=random.randint(-30, 30))
+                                    if available else None),
+                    )
+                )
+        models.OrderItem.objects.bulk_create(items,
+                                             batch_size=INSERT_BATCH_SIZE)
+        logger.debug("Seeded {} orders...".format(chunk_start + chunk_length))
+    logger.debug("Seeding took {:.1f} seconds".format(time.time() - start))
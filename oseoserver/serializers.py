@@ -4,7 +4,7 @@ from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
 from . import models
-from . import settings
+from .registry import get_registry
 
 
 class SubscriptionOrderSerializer(serializers.ModelSerializer):
@@ -48,7 +48,7 @@ class SubscriptionProcessTimeslotSerializer(serializers.BaseSerializer):
         collection = data.get("collection")
         if collection is None:
             raise ValidationError({"collection": "This field is required"})
-        elif collection not in (c["name"] for c in settings.get_collections()):
+        elif collection not in get_registry().collections_by_name:
             raise ValidationError({"collection": "Invalid collection"})
         force_creation = data.get("force_creation", False)
         return {
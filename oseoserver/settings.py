@@ -19,10 +19,136 @@ def get_processing_class():
     )
 
 
+def get_catalogue_max_concurrent_requests():
+    """Return how many catalogue requests may be performed at the same time.
+
+    This is used when looking up the collections of the order items that
+    do not specify one in Submit requests.
+
+    """
+
+    return _get_setting("OSEOSERVER_CATALOGUE_MAX_CONCURRENT_REQUESTS", 4)
+
+
+def get_collection_id_cache_timeout():
+    """Return for how long, in seconds, item collections are cached."""
+    return _get_setting("OSEOSERVER_COLLECTION_ID_CACHE_TIMEOUT", 60 * 60)
+
+
+def get_collection_id_negative_cache_timeout():
+    """Return for how long, in seconds, unknown item collections are cached.
+
+    Items whose collection could not be found in any catalogue are cached
+    for a shorter time, so that products that are added to the catalogues
+    later on can be ordered without waiting for too long.
+
+    """
+
+    return _get_setting("OSEOSERVER_COLLECTION_ID_NEGATIVE_CACHE_TIMEOUT", 60)
+
+
+def get_concurrency_redis_url():
+    """Return the URL of the redis server that tracks item processing slots.
+
+    Slots are used to limit how many items of a collection may be processed
+    at the same time, as set by the ``max_concurrent_items`` key of the
+    collection's configuration. They are tracked in the database when no
+    redis server is configured.
+
+    """
+
+    return _get_setting("OSEOSERVER_CONCURRENCY_REDIS_URL", None)
+
+
+def get_item_chunk_duration():
+    """Return how long, in seconds, each chunk of order items should take.
+
+    Chunks of items of collections that take longer to process are made
+    smaller, down to a single item.
+
+    """
+
+    return _get_setting("OSEOSERVER_ITEM_CHUNK_DURATION", 60)
+
+
+def get_item_chunk_size():
+    """Return the maximum number of order items that are sent in one task.
+
+    The default value of 1 sends a task for each parallel item. Items that
+    fail inside a chunk are retried together, once the rest of the chunk has
+    been processed, so a single failing item delays the completion of its
+    whole chunk.
+
+    """
+
+    return _get_setting("OSEOSERVER_ITEM_CHUNK_SIZE", 1)
+
+
+def get_item_delivery_queue():
+    """Return the celery queue where prepared order items are delivered.
+
+    When defined, items are processed in two stages: the ``process_item``
+    task prepares them and a ``deliver_item`` task, sent to this queue,
+    delivers them. Preparation and delivery can then be run by separate
+    pools of workers and failed deliveries are retried without preparing
+    the items again.
+
+    """
+
+    return _get_setting("OSEOSERVER_ITEM_DELIVERY_QUEUE", None)
+
+
+def get_item_slot_retry_delay():
+    """Return how long, in seconds, items wait for a free processing slot.
+
+    Items of a collection that has reached its ``max_concurrent_items`` are
+    sent back to the queue to be tried again after this delay.
+
+    """
+
+    return _get_setting("OSEOSERVER_ITEM_SLOT_RETRY_DELAY", 30)
+
+
+def get_item_slot_timeout():
+    """Return for how long, in seconds, an item may hold a processing slot.
+
+    Slots are released when items finish. This timeout frees the slots of
+    items whose worker has died before they could release them.
+
+    """
+
+    return _get_setting("OSEOSERVER_ITEM_SLOT_TIMEOUT", 6 * 60 * 60)
+
+
+def get_max_dispatched_items_per_user():
+    """Return how many items of a user may be queued or in production.
+
+    This is only used when fair share dispatching is enabled. It defaults
+    to the maximum number of active items of each user.
+
+    """
+
+    return _get_setting("OSEOSERVER_MAX_DISPATCHED_ITEMS_PER_USER",
+                        get_max_active_items())
+
+
 def get_max_order_items():
     return _get_setting("OSEOSERVER_MAX_ORDER_ITEMS", 200)
 
 
+def get_fair_share_dispatch():
+    """Return whether order items are released to celery with fair sharing.
+
+    When enabled, the parallel items of a batch are not sent to celery all
+    at once. They wait in a backlog and are released as earlier items
+    finish, round robin between users, so that no user can take over the
+    whole worker pool.
+
+    """
+
+    return _get_setting("OSEOSERVER_FAIR_SHARE_DISPATCH", False)
+
+
 def get_max_active_items():
     return _get_setting("OSEOSERVER_MAX_ACTIVE_ITEMS", 400)
 
@@ -31,6 +157,103 @@ def get_massive_order_max_size():
     return _get_setting("OSEOSERVER_MASSIVE_ORDER_MAX_SIZE", 1000)
 
 
+def get_massive_order_batches_in_flight():
+    """Return how many batches of each massive order are processed at once.
+
+    Massive order batches are created and sent to the processing queue
+    while fewer than this number of the order's batches are unfinished,
+    as long as the user stays within OSEOSERVER_MAX_ACTIVE_ITEMS. The
+    default value of 1 processes the batches one after the other.
+
+    """
+
+    return _get_setting("OSEOSERVER_MASSIVE_ORDER_BATCHES_IN_FLIGHT", 1)
+
+
+def get_submit_bulk_create():
+    """Return whether Submit requests are saved with bulk inserts.
+
+    When enabled, the item specifications of a Submit request and their
+    options and delivery options are all validated in memory first and then
+    each type of record is saved with a single query, instead of being
+    saved one by one.
+
+    """
+
+    return _get_setting("OSEOSERVER_SUBMIT_BULK_CREATE", False)
+
+
+def get_submit_asynchronous():
+    """Return whether Submit requests are processed asynchronously.
+
+    When enabled, Submit requests are only checked for the order type and
+    then stored. The client gets a response with the order identifier right
+    away and the order specification is validated and saved later by a
+    celery worker. Orders that turn out to be invalid are marked as failed.
+
+    """
+
+    return _get_setting("OSEOSERVER_SUBMIT_ASYNCHRONOUS", False)
+
+
+def get_status_propagation():
+    """Return how order item status changes reach their batch and order.
+
+    With the default 'immediate' propagation, each order item status change
+    updates its batch's and order's status right away. With 'deferred'
+    propagation, order item status changes only schedule an update of their
+    batch, which folds all of the changes that happen within the
+    propagation interval into a single batch and order update.
+
+    """
+
+    return _get_setting("OSEOSERVER_STATUS_PROPAGATION", "immediate")
+
+
+def get_status_propagation_interval():
+    """Return the deferred status propagation interval, in milliseconds."""
+    return _get_setting("OSEOSERVER_STATUS_PROPAGATION_INTERVAL", 1000)
+
+
+def get_status_response_builder():
+    """Return the builder used for GetStatus responses.
+
+    Accepted values are 'pyxb' (the default), 'lxml' and 'compare'. The
+    'compare' builder generates the response with both pyxb and lxml,
+    logs any differences between them and returns the pyxb response.
+
+    """
+
+    return _get_setting("OSEOSERVER_GET_STATUS_RESPONSE_BUILDER", "pyxb")
+
+
+def get_status_max_page_size():
+    """Return the maximum number of orders in a GetStatus order search.
+
+    When this is set, order search results are paginated. Responses that do
+    not include all of the matching orders carry a continuation cursor in an
+    extension element, which clients send back in their next request in
+    order to get the following page. The default value of None disables
+    pagination.
+
+    """
+
+    return _get_setting("OSEOSERVER_GET_STATUS_MAX_PAGE_SIZE", None)
+
+
+def get_stream_get_status_response():
+    """Return whether GetStatus order searches are streamed to the client.
+
+    When enabled, the orders found by an 'order search' request are read
+    using a server-side cursor and each orderMonitorSpecification element
+    is sent as soon as it is generated, instead of building the whole
+    response in memory first.
+
+    """
+
+    return _get_setting("OSEOSERVER_STREAM_GET_STATUS_RESPONSE", False)
+
+
 def get_product_order():
     return _get_setting(
         "OSEOSERVER_PRODUCT_ORDER",
@@ -22,6 +22,7 @@ import logging
 
 from django.dispatch import receiver
 from django.db.models.signals import post_save, post_init, pre_save
+from django.db.models.signals import post_delete
 
 from . import signals
 from ..models import CustomizableItem
@@ -32,6 +33,14 @@ from .. import utilities
 logger = logging.getLogger(__name__)
 
 
+@receiver(post_delete, sender=OrderItem, weak=False,
+          dispatch_uid='id_for_update_batch_counters_on_delete')
+def update_batch_counters_on_delete(sender, **kwargs):
+    order_item = kwargs["instance"]
+    if order_item.batch_id is not None:
+        order_item.remove_from_batch_counters()
+
+
 #@receiver(post_init, sender=Order, weak=False,
 #          dispatch_uid='id_for_get_old_status_order')
 #def get_old_status_order(sender, **kwargs):
@@ -1,9 +1,11 @@
 """Functions for dealing with SOAP in oseoserver."""
 
 from __future__ import absolute_import
+import itertools
 
 from lxml import etree
 
+from .constants import ENCODING
 from .constants import NAMESPACES
 from .errors import InvalidSoapVersionError
 from .auth import usernametoken
@@ -44,6 +46,33 @@ def get_soap_version(request_element):
     return result
 
 
+def get_response_envelope(soap_version):
+    """Return the opening and closing tags of a response's SOAP envelope.
+
+    Parameters
+    ----------
+    soap_version: str
+        The version of SOAP to use
+
+    Returns
+    -------
+    start: bytes
+        The encoded opening tags of the envelope, up to the SOAP Body
+    end: bytes
+        The encoded closing tags of the envelope
+
+    """
+
+    soap_ns = NAMESPACES["soap"] if soap_version == "1.2" else NAMESPACES[
+        "soap1.1"]
+    start = (
+        '<soap:Envelope xmlns:ows="{ows}" xmlns:soap="{soap}">'
+        '<soap:Body>'.format(ows=NAMESPACES["ows"], soap=soap_ns)
+    )
+    end = "</soap:Body></soap:Envelope>"
+    return start.encode(ENCODING), end.encode(ENCODING)
+
+
 def get_soap_fault_code(response_text):
     """Retrieve the correct SOAP fault code from a response"""
 
@@ -155,6 +184,40 @@ def wrap_response(response_element, soap_version):
     return soap_env
 
 
+def wrap_serialized_response(response, soap_version=None):
+    """Wrap an already serialized OSEO response in a SOAP envelope.
+
+    This is equivalent to ``wrap_response()``, but it works directly on the
+    encoded response, which does not need to be parsed again.
+
+    Parameters
+    ----------
+    response: bytes or iterator
+        The encoded response, without an XML declaration. Streamed responses
+        are passed as an iterator of bytes
+    soap_version: str, optional
+        The version of SOAP to use. If None, the response is returned
+        unchanged.
+
+    Returns
+    -------
+    bytes or iterator
+        The SOAP-wrapped response. If the input response was an iterator,
+        the result is also an iterator
+
+    """
+
+    if soap_version is None:
+        result = response
+    else:
+        start, end = get_response_envelope(soap_version)
+        if isinstance(response, bytes):
+            result = b"".join((start, response, end))
+        else:
+            result = itertools.chain([start], response, [end])
+    return result
+
+
 def wrap_soap_fault(exception_element, soap_code, soap_version):
     """Wrap the ExceptionReport in a SOAP envelope.
 
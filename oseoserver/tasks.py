@@ -31,23 +31,48 @@ And the flower monitoring tool can be started with:
 from __future__ import division
 from __future__ import absolute_import
 import datetime as dt
+import time
+import traceback
 
 from celery import chain
 from celery import chord
 from celery import group
 from celery import shared_task
 from celery import Task
+from celery.exceptions import Ignore
 from celery.result import allow_join_result
+from celery.signals import worker_process_init
+from celery.signals import worker_process_shutdown
 from celery.utils.log import get_task_logger
+from django.db import transaction
 import pytz
 
+from . import chunking
+from . import concurrency
+from . import dispatcher
 from . import mailsender
 from . import models
+from . import notifications
+from . import registry
+from . import requestprocessor
+from . import settings
 from . import utilities
 
 logger = get_task_logger(__name__)
 
 
+@worker_process_init.connect
+def setup_item_processors(**kwargs):
+    """Set up the item processors when a worker process starts"""
+    registry.setup_item_processors()
+
+
+@worker_process_shutdown.connect
+def teardown_item_processors(**kwargs):
+    """Release the item processors' resources when a worker process stops"""
+    registry.teardown_item_processors()
+
+
 @shared_task(bind=True)
 def clean_expired_items(self):
     """Clean order items that are expired.
@@ -64,6 +89,19 @@ def clean_expired_items(self):
     deletion_group.apply_async()
 
 
+@shared_task(bind=True)
+def dispatch_items(self):
+    """Release order items from the users' backlogs for processing.
+
+    This task is used when fair share dispatching is enabled. It is sent
+    whenever a batch is enqueued or an order item finishes and it should
+    also be run periodically in a celery beat worker.
+
+    """
+
+    dispatcher.dispatch_items()
+
+
 @shared_task(bind=True)
 def expire_item(self, item_id):
     """Clean a single order_item."""
@@ -108,6 +146,8 @@ def process_batch(self, batch_id):
 
     Order items may be processed in parallel or in sequence, depending on the
     value of the ``item_processing`` setting of their respective collection.
+    Parallel items are sent in chunks when the ``OSEOSERVER_ITEM_CHUNK_SIZE``
+    setting is greater than one.
 
     Parameters
     ----------
@@ -126,18 +166,41 @@ def process_batch(self, batch_id):
         batch_processor_data = processor.prepare_batch(
             sequential_items, parallel_items, batch.order.user.username)
         batch_data[processor.__class__.__name__] = batch_processor_data
+    # tasks only get the key of the batch data, so that it is not repeated
+    # in the message of every item
+    batch_data_key = batch.store_batch_data(batch_data)
+    routing = utilities.get_task_routing(batch.order.order_type,
+                                         batch.order.priority)
+    fair_share = settings.get_fair_share_dispatch()
     tasks = []
+    if fair_share:
+        # parallel items are released by the fair share dispatcher
+        dispatcher.enqueue_batch(batch, [i["id"] for i in sequential_items])
+        parallel_items = []
+    if settings.get_item_chunk_size() > 1 and len(parallel_items) > 0:
+        collections = dict(batch.order_items.values_list(
+            "id", "item_specification__collection"))
+        for chunk in chunking.split_items(
+                [i["id"] for i in parallel_items], collections):
+            tasks.append(process_item_chunk.signature(
+                (chunk,),
+                {"batch_data_key": batch_data_key},
+                **routing
+            ))
+        parallel_items = []
     for item_info in parallel_items:
         sig = process_item.signature(
             (item_info["id"],),
-            {"batch_data": batch_data}
+            {"batch_data_key": batch_data_key},
+            **routing
         )
         tasks.append(sig)
     if len(sequential_items) > 0:
         tasks += [
             process_items_sequentially.signature(
                 ([i["id"] for i in sequential_items],),
-                {"batch_data": batch_data}
+                {"batch_data_key": batch_data_key},
+                **routing
             )
         ]
     logger.debug("tasks: {}".format(tasks))
@@ -145,6 +208,9 @@ def process_batch(self, batch_id):
     notify_batch_available = config.get(
         "notifications", {}).get("batch_availability", "")
     notification = notify_batch_available.lower()
+    if fair_share:
+        # the notification is sent by the batch once all items are finished
+        notification = ""
     callback = notify_user_batch_available.signature(
         (batch_id,), immutable=True)
     if len(tasks) == 1:
@@ -160,6 +226,115 @@ def process_batch(self, batch_id):
             batch_group.apply_async()
 
 
+@shared_task(bind=True)
+def precompute_massive_order_batch(self, order_id, batch_index):
+    """Find the identifiers of a massive order batch ahead of its creation.
+
+    The identifiers are cached and then used when the batch is created by
+    the ``schedule_massive_order`` task.
+
+    """
+
+    order = models.Order.objects.get(pk=order_id)
+    requestprocessor.precompute_massive_order_batch_identifiers(
+        order, batch_index)
+
+
+@shared_task(bind=True)
+def process_submit_request(self, order_id):
+    """Validate and save an order that was placed asynchronously.
+
+    This task is sent by asynchronous Submit requests, right after the
+    order has been stored.
+
+    """
+
+    with transaction.atomic():
+        order = models.Order.objects.select_for_update().get(pk=order_id)
+        if order.submit_request == "":
+            logger.debug("Order {} has already been validated".format(order))
+        else:
+            requestprocessor.handle_asynchronous_submit(order)
+
+
+@shared_task(bind=True)
+def propagate_batch_status(self, batch_id):
+    """Update a batch's and its order's status after item status changes.
+
+    This task is scheduled by order items when the deferred status
+    propagation mode is in use. It folds all of the item status changes that
+    have happened since it was scheduled into a single update.
+
+    """
+
+    with transaction.atomic():
+        batch = models.Batch.objects.select_for_update().get(pk=batch_id)
+        batch.propagate_status()
+
+
+@shared_task(bind=True)
+def propagate_stale_batch_statuses(self):
+    """Update the batches whose item counters are out of date.
+
+    This catches any order item status changes that have not reached their
+    batch, for example because a ``propagate_batch_status`` task was lost.
+    This task should be run periodically in a celery beat worker.
+
+    """
+
+    for batch in models.Batch.get_stale_batches().only("id"):
+        logger.debug("Propagating stale status of batch {}".format(batch.pk))
+        with transaction.atomic():
+            models.Batch.objects.select_for_update().get(
+                pk=batch.pk).propagate_status()
+
+
+@shared_task(bind=True)
+def reconcile_active_item_counters(self):
+    """Recalculate the number of active order items of each user.
+
+    The counters are kept up to date as order items change their status,
+    but they may drift when order items are modified by bulk queryset
+    operations. This task should be run periodically in a celery beat
+    worker.
+
+    """
+
+    counts = models.ActiveItemCounter.reconcile()
+    logger.debug("Reconciled active item counters: {}".format(counts))
+
+
+@shared_task(bind=True)
+def schedule_massive_order(self, order_id):
+    """Create and queue the next batches of a massive order.
+
+    This task is sent whenever a massive order batch is finished.
+
+    """
+
+    with transaction.atomic():
+        order = models.Order.objects.select_for_update().get(pk=order_id)
+        if order.status in requestprocessor.FINISHED_STATUSES:
+            logger.debug("Order {} has a {} status. Not scheduling any more "
+                         "batches".format(order, order.status))
+        else:
+            requestprocessor.schedule_massive_order_batches(order)
+
+
+@shared_task(bind=True)
+def send_notifications(self):
+    """Send the notifications that are waiting in the outbox.
+
+    This task is sent whenever a notification is queued. It should also be
+    run periodically in a celery beat worker, so that notifications that
+    have failed are retried.
+
+    """
+
+    sent = notifications.send_pending_notifications()
+    logger.debug("Sent {} notifications".format(sent))
+
+
 class ProcessItemTaskSequential(Task):
     """A custom task that implements custom handlers.
 
@@ -179,19 +354,26 @@ class ProcessItemTaskSequential(Task):
             )
             mailsender.send_item_processing_failed_email(
                 order_item, task_id, exc, args, einfo.traceback)
+        if settings.get_fair_share_dispatch():
+            dispatcher.schedule_dispatch()
 
     def on_success(self, retval, task_id, args, kwargs):
         for item_id in args[0]:
             order_item = models.OrderItem.objects.get(pk=item_id)
             order_item.set_status(order_item.COMPLETED)
+        if settings.get_fair_share_dispatch():
+            dispatcher.schedule_dispatch()
 
 
 @shared_task(
     bind=True,
     base=ProcessItemTaskSequential,
 )
-def process_items_sequentially(self, item_ids, batch_data=None):
+def process_items_sequentially(self, item_ids, batch_data=None,
+                               batch_data_key=None):
     """Process a series of order items sequentially, one after the other"""
+    if batch_data is None and batch_data_key is not None:
+        batch_data = models.Batch.get_batch_data(batch_data_key)
     for item_id in item_ids:
         process_item(item_id, batch_data=batch_data)
 
@@ -214,11 +396,15 @@ class ProcessItemTask(Task):
         )
         mailsender.send_item_processing_failed_email(order_item, task_id, exc,
                                                      args, einfo.traceback)
+        if settings.get_fair_share_dispatch():
+            dispatcher.schedule_dispatch()
 
     def on_success(self, retval, task_id, args, kwargs):
         logger.debug("on_success called with: {}".format(locals()))
         order_item = models.OrderItem.objects.get(pk=args[0])
         order_item.set_status(order_item.COMPLETED)
+        if settings.get_fair_share_dispatch():
+            dispatcher.schedule_dispatch()
 
 
 @shared_task(
@@ -228,7 +414,7 @@ class ProcessItemTask(Task):
     default_retry_delay=30,  # seconds
     max_retries=3,
 )
-def process_item(self, order_item_id, batch_data=None):
+def process_item(self, order_item_id, batch_data=None, batch_data_key=None):
     """Process an order item
 
     Processing is composed by two steps:
@@ -240,15 +426,222 @@ def process_item(self, order_item_id, batch_data=None):
     This task inherits the ProcessItemTask so that it may be possible to
     update the order item's status in case of failure
 
+    Items of collections that define ``max_concurrent_items`` are only
+    processed when one of the collection's slots is free. Otherwise they are
+    sent back to the queue, without counting as a retry.
+
+    The data that item processors have prepared for the batch may be given
+    directly, with ``batch_data``, or as the key returned by
+    ``Batch.store_batch_data``, with ``batch_data_key``.
+
+    When the ``OSEOSERVER_ITEM_DELIVERY_QUEUE`` setting is defined, this
+    task only prepares the item and is then replaced by a ``deliver_item``
+    task in that queue. The delivery keeps the other routing options of the
+    order's priority.
+
     """
 
-    order_item = models.OrderItem.objects.get(pk=order_item_id)
+    order_item = models.OrderItem.objects.select_related(
+        "item_specification", "batch__order").get(pk=order_item_id)
+    collection = order_item.item_specification.collection
+    max_items = utilities.get_max_concurrent_items(collection)
+    # items that are processed sequentially call this task directly and
+    # are not limited
+    limited = max_items is not None and not self.request.called_directly
+    if limited and not concurrency.acquire_item_slot(
+            collection, order_item_id, max_items):
+        delay = settings.get_item_slot_retry_delay()
+        logger.debug("Collection {!r} is processing {} items already. "
+                     "Requeuing item {} in {} seconds".format(
+                         collection, max_items, order_item_id, delay))
+        self.signature_from_request(
+            self.request, countdown=delay).apply_async()
+        raise Ignore()
+    delivery_queue = settings.get_item_delivery_queue()
+    pipeline = delivery_queue is not None and not self.request.called_directly
+    try:
+        if batch_data is None and batch_data_key is not None:
+            batch_data = models.Batch.get_batch_data(batch_data_key)
+        if pipeline:
+            started = time.time()
+            prepared_url = _prepare_order_item(
+                order_item, batch_data, self.request.retries)
+            preparation_duration = time.time() - started
+        else:
+            delivered_url = _process_order_item(
+                order_item, batch_data, self.request.retries)
+    finally:
+        if limited:
+            concurrency.release_item_slot(collection, order_item_id)
+    if pipeline:
+        order = order_item.batch.order
+        routing = utilities.get_task_routing(order.order_type, order.priority)
+        routing["queue"] = delivery_queue
+        # the delivery task takes this task's place, so any chord that the
+        # item belongs to waits for it
+        raise self.replace(deliver_item.signature(
+            (order_item_id, prepared_url),
+            {"preparation_duration": preparation_duration},
+            **routing
+        ))
+    return delivered_url
+
+
+@shared_task(
+    bind=True,
+    base=ProcessItemTask,
+    autoretry_for=(Exception,),
+    default_retry_delay=30,  # seconds
+    max_retries=3,
+)
+def deliver_item(self, order_item_id, prepared_url,
+                 preparation_duration=None):
+    """Deliver an order item that has already been prepared
+
+    This task is sent by ``process_item`` when the
+    ``OSEOSERVER_ITEM_DELIVERY_QUEUE`` setting is defined. Failed deliveries
+    are retried without preparing the item again.
+
+    The time spent preparing and delivering the item, without the time it
+    waited in the queue, is added to the collection's average item
+    duration.
+
+    """
+
+    order_item = models.OrderItem.objects.select_related(
+        "item_specification").get(pk=order_item_id)
     order_item.set_status(
         order_item.IN_PRODUCTION,
-        "Item is being processed (Try number {})".format(self.request.retries)
+        "Item is being delivered (Try number {})".format(self.request.retries)
     )
-    prepared_url = order_item.prepare(batch_data=batch_data)
+    started = time.time()
+    delivered_url = order_item.deliver(prepared_url)
+    if preparation_duration is not None:
+        chunking.record_item_duration(
+            order_item.item_specification.collection,
+            preparation_duration + time.time() - started
+        )
+    return delivered_url
+
+
+class ProcessItemChunkTask(Task):
+    """A custom task that implements a custom failure handler.
+
+    This class is the base for the ``process_item_chunk()`` task. Failures of
+    individual items are handled by the task itself. The on_failure method
+    is reimplemented here in order to mark the chunk's unfinished items as
+    failed when the task stops because of an unexpected error.
+
+    """
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        unfinished = models.OrderItem.objects.filter(
+            pk__in=args[0]).exclude(
+            status__in=requestprocessor.FINISHED_STATUSES)
+        for order_item in unfinished:
+            order_item.set_status(
+                order_item.FAILED,
+                exc.args
+            )
+            mailsender.send_item_processing_failed_email(
+                order_item, task_id, exc, args, einfo.traceback)
+        if settings.get_fair_share_dispatch():
+            dispatcher.schedule_dispatch()
+
+
+@shared_task(
+    bind=True,
+    base=ProcessItemChunkTask,
+    default_retry_delay=30,  # seconds
+    max_retries=3,
+)
+def process_item_chunk(self, item_ids, batch_data=None, batch_data_key=None):
+    """Process a chunk of order items, one after the other
+
+    This task is used instead of ``process_item`` for the parallel items of
+    a batch when the ``OSEOSERVER_ITEM_CHUNK_SIZE`` setting is greater than
+    one. Each item's status is updated as soon as it has been processed.
+    Items that fail do not stop the rest of the chunk. Once the chunk has
+    been gone through, the task is retried with only the failed items, up
+    to the same number of times as ``process_item``. Items that are still
+    failing after that are marked as failed. Retrying under the same task
+    id means that the batch's chord callback, if any, is run after the last
+    chunk.
+
+    When an item's collection has no free processing slot, the remaining
+    items, together with the failed ones, are sent back to the queue under
+    the same task id. This does not count as a retry.
+
+    Items are prepared and delivered inside the chunk, even when the
+    ``OSEOSERVER_ITEM_DELIVERY_QUEUE`` setting is defined.
+
+    """
+
+    requeue_index = None
+    failed_ids = []
+    for index, item_id in enumerate(item_ids):
+        slot_collection = None
+        try:
+            if batch_data is None and batch_data_key is not None:
+                batch_data = models.Batch.get_batch_data(batch_data_key)
+            order_item = models.OrderItem.objects.select_related(
+                "item_specification").get(pk=item_id)
+            collection = order_item.item_specification.collection
+            max_items = utilities.get_max_concurrent_items(collection)
+            if max_items is not None:
+                if not concurrency.acquire_item_slot(
+                        collection, item_id, max_items):
+                    requeue_index = index
+                    break
+                slot_collection = collection
+            _process_order_item(order_item, batch_data, self.request.retries)
+            order_item.set_status(order_item.COMPLETED)
+        except Exception as exc:
+            logger.exception("Could not process item {}".format(item_id))
+            if self.request.retries < self.max_retries:
+                failed_ids.append(item_id)
+            else:
+                order_item = models.OrderItem.objects.get(pk=item_id)
+                order_item.set_status(order_item.FAILED, exc.args)
+                mailsender.send_item_processing_failed_email(
+                    order_item, self.request.id, exc, (item_id,),
+                    traceback.format_exc()
+                )
+        finally:
+            if slot_collection is not None:
+                concurrency.release_item_slot(slot_collection, item_id)
+    if requeue_index is not None:
+        pending_ids = failed_ids + list(item_ids[requeue_index:])
+        delay = settings.get_item_slot_retry_delay()
+        logger.debug("Collection {!r} is processing {} items already. "
+                     "Requeuing {} items in {} seconds".format(
+                         collection, max_items, len(pending_ids), delay))
+        self.signature_from_request(
+            self.request, args=(pending_ids,), countdown=delay
+        ).apply_async()
+        raise Ignore()
+    if failed_ids:
+        logger.debug("Retrying {} failed items".format(len(failed_ids)))
+        raise self.retry(args=(failed_ids,))
+    if settings.get_fair_share_dispatch():
+        dispatcher.schedule_dispatch()
+
+
+def _prepare_order_item(order_item, batch_data, retries):
+    order_item.set_status(
+        order_item.IN_PRODUCTION,
+        "Item is being processed (Try number {})".format(retries)
+    )
+    return order_item.prepare(batch_data=batch_data)
+
+
+def _process_order_item(order_item, batch_data, retries):
+    """Prepare and deliver an order item, timing how long it takes"""
+    started = time.time()
+    prepared_url = _prepare_order_item(order_item, batch_data, retries)
     delivered_url = order_item.deliver(prepared_url)
+    chunking.record_item_duration(
+        order_item.item_specification.collection, time.time() - started)
     return delivered_url
 
 
@@ -15,6 +15,7 @@
 """Some utility functions for pyoseo."""
 
 import importlib
+from itertools import islice
 import logging
 import re
 
@@ -25,6 +26,7 @@ import pytz
 
 from . import settings
 from . import errors
+from . import registry
 
 logger = logging.getLogger(__name__)
 
@@ -64,6 +66,38 @@ def convert_date_range_option(date_range):
     return start, stop
 
 
+def elements_equal(first, second):
+    """Compare two XML elements structurally.
+
+    Elements are considered equal when they have the same qualified name,
+    attributes, text and children, in the same order. Namespace prefixes
+    and whitespace surrounding the text are not taken into account.
+
+    Parameters
+    ----------
+    first: etree.Element
+        The first element to compare
+    second: etree.Element
+        The second element to compare
+
+    Returns
+    -------
+    bool
+        Whether the two elements are equal
+
+    """
+
+    equal = (
+        first.tag == second.tag and
+        dict(first.attrib) == dict(second.attrib) and
+        (first.text or "").strip() == (second.text or "").strip() and
+        len(first) == len(second)
+    )
+    if equal:
+        equal = all(elements_equal(f, s) for f, s in zip(first, second))
+    return equal
+
+
 def get_etree_parser():
     return etree.XMLParser(
         encoding="utf-8",
@@ -95,11 +129,82 @@ def get_generic_order_config(order_type):
     return setting()
 
 
-def get_option_configuration(option_name):
-    for option in settings.get_processing_options():
-        if option["name"] == option_name:
-            return option
+def get_massive_order_batch_item_identifiers(processor, collection, start,
+                                             end, batch_index,
+                                             items_per_batch,
+                                             checkpoint=None):
+    """Return the identifiers of the order items of a massive order batch.
+
+    Item processors may implement an optional
+    ``iterate_massive_order_item_identifiers`` method, which returns an
+    iterator over (identifier, checkpoint) tuples with all of the order's
+    item identifiers. Each checkpoint is an opaque, JSON serializable, token
+    that can be passed back to the method in order to resume the iteration
+    right after its identifier. When the checkpoint of the previous batch is
+    known, the batch's identifiers are read from there. Otherwise the
+    iteration starts from the beginning and skips the identifiers of the
+    previous batches.
+
+    Item processors that do not implement the iterator are asked for the
+    batch's identifiers with their
+    ``get_massive_order_batch_item_identifiers`` method.
+
+    Parameters
+    ----------
+    processor: object
+        The item processor
+    collection: str
+        Name of the collection
+    start: datetime.datetime
+        Start of the order's temporal range
+    end: datetime.datetime
+        End of the order's temporal range
+    batch_index: int
+        Index of the batch in the order
+    items_per_batch: int
+        Maximum number of items in each batch
+    checkpoint: object, optional
+        The checkpoint where the previous batch stopped
+
+    Returns
+    -------
+    identifiers: list
+        The identifiers of the batch's order items
+    checkpoint: object
+        The checkpoint where the batch stops, or None if the item processor
+        does not implement the iterator
+
+    """
+
+    iterate = getattr(processor, "iterate_massive_order_item_identifiers",
+                      None)
+    if iterate is None:
+        identifiers = processor.get_massive_order_batch_item_identifiers(
+            batch_index=batch_index,
+            collection=collection,
+            start=start,
+            end=end,
+            items_per_batch=items_per_batch
+        )
+        next_checkpoint = None
     else:
+        skip = batch_index * items_per_batch if checkpoint is None else 0
+        iterator = iterate(collection=collection, start=start, end=end,
+                           checkpoint=checkpoint)
+        try:
+            found = list(islice(iterator, skip, skip + items_per_batch))
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+        identifiers = [identifier for identifier, token in found]
+        next_checkpoint = found[-1][1] if len(found) > 0 else checkpoint
+    return identifiers, next_checkpoint
+
+
+def get_option_configuration(option_name):
+    try:
+        return registry.get_registry().options_by_name[option_name]
+    except KeyError:
         raise errors.OseoServerError("Invalid option {!r}".format(option_name))
 
 
@@ -110,6 +215,47 @@ def get_subscription_duration(order, collection):
     return convert_date_range_option(date_range.value)
 
 
+def get_task_routing(order_type, priority):
+    """Return the celery routing options for the tasks of an order.
+
+    The settings of each order type may include a ``routing`` mapping with
+    the options to use for each order priority. For example, in order to
+    have ``FAST_TRACK`` orders overtake standard ones:
+
+    .. code:: python
+
+       OSEOSERVER_MASSIVE_ORDER = {
+           ...
+           "routing": {
+               "FAST_TRACK": {"queue": "oseoserver_fast_track"},
+               "STANDARD": {"queue": "oseoserver_standard", "priority": 0},
+           },
+       }
+
+    The options are used when sending the ``process_batch``,
+    ``process_item`` and ``process_items_sequentially`` tasks. The
+    ``deliver_item`` task uses them too, except for the queue, which is
+    given by the ``OSEOSERVER_ITEM_DELIVERY_QUEUE`` setting. Priorities
+    without routing options use celery's default routing.
+
+    Parameters
+    ----------
+    order_type: str
+        One of the allowed order types, as defined in oseoserver.models.Order
+    priority: str
+        The order's priority
+
+    Returns
+    -------
+    dict
+        Keyword arguments for celery's ``send_task`` and ``signature``
+
+    """
+
+    routing = get_generic_order_config(order_type).get("routing", {})
+    return dict(routing.get(priority, {}))
+
+
 def import_callable(python_path):
     module_path, callable_name = python_path.rpartition('.')[::2]
     try:
@@ -123,8 +269,7 @@ def import_callable(python_path):
 
 
 def get_item_processing_type(collection, item_identifier, item_options):
-    conf = [
-        c for c in settings.get_collections() if c["name"] == collection][0]
+    conf = registry.get_registry().collections_by_name[collection]
     declared_type = conf.get("item_processing", "parallel")
     if declared_type.lower() not in ("parallel", "sequential"):
         type_callable = import_callable(declared_type)
@@ -135,6 +280,26 @@ def get_item_processing_type(collection, item_identifier, item_options):
     return parsed_type.lower()
 
 
+def get_max_concurrent_items(collection):
+    """Return how many items of a collection may be processed at once.
+
+    Parameters
+    ----------
+    collection: str
+        Name of the collection
+
+    Returns
+    -------
+    int or None
+        The value of the collection's ``max_concurrent_items`` setting, or
+        None if the collection has no limit
+
+    """
+
+    conf = registry.get_registry().collections_by_name[collection]
+    return conf.get("max_concurrent_items")
+
+
 def import_class(python_path, *instance_args, **instance_kwargs):
     """
     """
@@ -143,11 +308,10 @@ def import_class(python_path, *instance_args, **instance_kwargs):
 
 
 def validate_collection_id(collection_id):
-    for collection_config in settings.get_collections():
-        if collection_config.get("collection_identifier") == collection_id:
-            result = collection_config
-            break
-    else:
+    collections = registry.get_registry().collections_by_identifier
+    try:
+        result = collections[collection_id]
+    except KeyError:
         raise errors.InvalidParameterValueError("collectionId")
     return result
 
@@ -166,7 +330,7 @@ def validate_processing_option(name, value, order_type, collection_name):
     item_processor_class_path = get_generic_order_config(
         order_type)["item_processor"]
     try:
-        item_processor = import_class(item_processor_class_path)
+        item_processor = registry.get_item_processor(item_processor_class_path)
         parsed_value = item_processor.parse_option(name, value)
     except AttributeError:
         raise errors.OseoServerError(
@@ -176,48 +340,47 @@ def validate_processing_option(name, value, order_type, collection_name):
     except IndexError:
         raise errors.InvalidParameterValueError(locator="option", value=name)
     # 3. is the parsed value legal?
-    for option in settings.get_processing_options():
-        if option.get("name") == name:
-            choices = option.get("choices", [])
-            if parsed_value not in choices and len(choices) > 0:
-                raise errors.InvalidParameterValueError("option",
-                                                        value=parsed_value)
-            break
-    else:
+    try:
+        option = registry.get_registry().options_by_name[name]
+    except KeyError:
+        raise errors.InvalidParameterValueError("option", value=parsed_value)
+    choices = option.get("choices", [])
+    if parsed_value not in choices and len(choices) > 0:
         raise errors.InvalidParameterValueError("option", value=parsed_value)
     return parsed_value
 
 
 def get_item_processor(order_type):
+    """Return the item processor instance that handles the input order type
+
+    Item processors are instantiated only once per process. See
+    oseoserver.registry.get_item_processor.
+
+    """
+
     generic_order_settings = get_generic_order_config(order_type)
     item_processor_class_path = generic_order_settings["item_processor"]
-    processor = import_class(item_processor_class_path)
-    return processor
+    return registry.get_item_processor(item_processor_class_path)
 
 
 def get_processing_option_settings(option_name):
-    processing_options = settings.get_processing_options()
-    option_settings = [
-        opt for opt in processing_options if opt["name"] == option_name][0]
-    return option_settings
+    return registry.get_registry().options_by_name[option_name]
 
 
 def get_collection_settings(collection_id):
-    for collection_config in settings.get_collections():
-        if collection_config["collection_identifier"] == collection_id:
-            result = collection_config
-            break
-    else:
+    collections = registry.get_registry().collections_by_identifier
+    try:
+        result = collections[collection_id]
+    except KeyError:
         raise errors.UnsupportedCollectionError()
     return result
 
 
 def get_collection_identifier(name):
-    all_collections = settings.get_collections()
     try:
-        config = [c for c in all_collections if c["name"] == name][0]
+        config = registry.get_registry().collections_by_name[name]
         identifier = config["collection_identifier"]
-    except IndexError:
+    except KeyError:
         identifier = ""
     return identifier
 
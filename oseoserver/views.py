@@ -4,6 +4,7 @@ import logging
 import celery
 from django.http import HttpResponse
 from django.http import HttpResponseForbidden
+from django.http import StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from lxml import etree
 from rest_framework import viewsets
@@ -19,6 +20,7 @@ from . import models
 from . import serializers
 from . import soap
 from . import requestprocessor
+from . import utilities
 from .utilities import get_etree_parser
 
 logger = logging.getLogger(__name__)
@@ -119,7 +121,11 @@ class SubscriptionBatchViewSet(viewsets.ReadOnlyModelViewSet):
                 logger.info(
                     "Sending batch {!r} to processing queue...".format(batch))
                 celery.current_app.send_task(
-                    "oseoserver.tasks.process_batch", (batch.id,))
+                    "oseoserver.tasks.process_batch",
+                    (batch.id,),
+                    **utilities.get_task_routing(order.order_type,
+                                                 order.priority)
+                )
             if batch is not None:
                 new_batches.append(batch)
         if len(new_batches) == 0:
@@ -143,7 +149,6 @@ def oseo_endpoint(request):
     if not request.method == "POST":  # OSEO requests must always be POST
         return HttpResponseForbidden()
     soap_version = None
-    soap_fault_code = None
     try:
         request_element = etree.fromstring(
             request.body, parser=get_etree_parser())
@@ -156,7 +161,12 @@ def oseo_endpoint(request):
                 code="AuthenticationFailed",
                 text="Invalid or missing identity information"
             )
-        response = requestprocessor.process_request(request_data, request.user)
+        response = requestprocessor.dispatch_request(
+            request_data, request.user)
+        serialized = soap.wrap_serialized_response(
+            requestprocessor.serialize_response(response),
+            soap_version=soap_version
+        )
         status_code = 200
     except errors.OseoError as err:
         logger.error(err)
@@ -168,10 +178,14 @@ def oseo_endpoint(request):
         #    request_data=request.body,
         #    exception_report=etree.tostring(response, pretty_print=True),
         #)
-    wrapped = _wrap_response(response, soap_version=soap_version,
-                             soap_code=soap_fault_code)
-    serialized = etree.tostring(wrapped, encoding=ENCODING, pretty_print=True)
-    django_response = HttpResponse(serialized)
+        wrapped = _wrap_response(response, soap_version=soap_version,
+                                 soap_code=soap_fault_code)
+        serialized = etree.tostring(wrapped, encoding=ENCODING,
+                                    pretty_print=True)
+    if isinstance(serialized, bytes):
+        django_response = HttpResponse(serialized)
+    else:
+        django_response = StreamingHttpResponse(serialized)
     django_response.status_code = status_code
     for k, v in _get_response_headers(soap_version).items():
         django_response[k] = v
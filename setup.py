@@ -28,11 +28,12 @@ setup(
     include_package_data=True,
     entry_points= {
         "console_scripts": [
-            "install_pyxb_ogc_bindings=oseoserver.scripts.install_pyxb_ogc_bindings:main"
+            "install_pyxb_ogc_bindings=oseoserver.scripts.install_pyxb_ogc_bindings:main",
+            "oseoserver_benchmark_query_plans=oseoserver.scripts.benchmark_query_plans:main",
         ],
     },
     install_requires=[
-        "celery",
+        "celery>=4.4",
         "coreapi",
         "django",
         "djangorestframework",
@@ -12,3 +12,42 @@ def pytest_configure(config):
         "markers",
         "integration: run only integration tests"
     )
+
+
+@pytest.fixture
+def batch_factory():
+    """Return a function that creates a product order batch with items.
+
+    Each order item gets its own item specification, of the ``lst``
+    collection.
+
+    """
+
+    from oseoserver import models
+
+    def create_batch(user, number_of_items,
+                     item_status=models.CustomizableItem.ACCEPTED,
+                     priority=models.Order.STANDARD):
+        order = models.Order.objects.create(
+            status=models.CustomizableItem.ACCEPTED,
+            user=user,
+            order_type=models.Order.PRODUCT_ORDER,
+            status_notification=models.Order.NONE,
+            priority=priority,
+        )
+        batch = models.Batch.objects.create(order=order)
+        for index in range(number_of_items):
+            item_spec = models.ItemSpecification.objects.create(
+                order=order,
+                collection="lst",
+                identifier="",
+                item_id="item {}".format(index),
+            )
+            models.OrderItem.objects.create(
+                batch=batch,
+                item_specification=item_spec,
+                status=item_status,
+            )
+        return batch
+
+    return create_batch
@@ -0,0 +1,80 @@
+"""Integration tests for oseoserver.concurrency"""
+
+import datetime as dt
+
+import mock
+import pytest
+import pytz
+
+from oseoserver import concurrency
+from oseoserver import models
+from oseoserver import tasks
+
+pytestmark = pytest.mark.integration
+
+
+@pytest.mark.django_db
+def test_database_slots_limit_concurrent_items(admin_user, batch_factory):
+    batch = batch_factory(admin_user, 3)
+    first, second, third = batch.order_items.order_by("id")
+    assert concurrency.acquire_item_slot("lst", first.id, 2)
+    assert concurrency.acquire_item_slot("lst", second.id, 2)
+    assert not concurrency.acquire_item_slot("lst", third.id, 2)
+    # an item that already holds a slot renews it
+    assert concurrency.acquire_item_slot("lst", first.id, 2)
+    # other collections have their own slots
+    assert concurrency.acquire_item_slot("other", third.id, 2)
+    concurrency.release_item_slot("other", third.id)
+    concurrency.release_item_slot("lst", first.id)
+    assert concurrency.acquire_item_slot("lst", third.id, 2)
+    assert models.ItemProcessingSlot.objects.filter(
+        collection="lst").count() == 2
+
+
+@pytest.mark.django_db
+def test_database_slots_expire(admin_user, batch_factory):
+    first, second = batch_factory(admin_user, 2).order_items.order_by("id")
+    assert concurrency.acquire_item_slot("lst", first.id, 1)
+    models.ItemProcessingSlot.objects.update(
+        expires_on=dt.datetime.now(pytz.utc) - dt.timedelta(seconds=1))
+    assert concurrency.acquire_item_slot("lst", second.id, 1)
+    assert not models.ItemProcessingSlot.objects.filter(
+        order_item=first).exists()
+
+
+@pytest.mark.django_db
+def test_process_item_requeues_items_without_a_free_slot(settings, admin_user,
+                                                         batch_factory):
+    settings.OSEOSERVER_ITEM_SLOT_RETRY_DELAY = 10
+    first, second = batch_factory(admin_user, 2).order_items.order_by("id")
+    concurrency.acquire_item_slot("lst", first.id, 1)
+    mock_signature = mock.MagicMock()
+    with mock.patch.object(tasks.utilities, "get_max_concurrent_items",
+                           return_value=1), \
+            mock.patch.object(tasks.process_item, "signature_from_request",
+                              return_value=mock_signature) as mock_from_req:
+        result = tasks.process_item.apply((second.id,))
+    assert result.state == "IGNORED"
+    assert mock_from_req.call_args[1] == {"countdown": 10}
+    mock_signature.apply_async.assert_called_once_with()
+    second.refresh_from_db()
+    assert second.status == models.CustomizableItem.ACCEPTED
+
+
+@pytest.mark.django_db
+def test_process_item_releases_slot_when_batch_data_is_missing(admin_user,
+                                                               batch_factory):
+    item = batch_factory(admin_user, 1).order_items.get()
+    # the task has used up its retries, so the error is raised
+    tasks.process_item.push_request(
+        called_directly=False, retries=3, args=(item.id,),
+        kwargs={"batch_data_key": "missing"}
+    )
+    try:
+        with mock.patch.object(tasks.utilities, "get_max_concurrent_items",
+                               return_value=1):
+            with pytest.raises(models.Batch.DoesNotExist):
+                tasks.process_item.run(item.id, batch_data_key="missing")
+    finally:
+        tasks.process_item.pop_request()
+    assert not models.ItemProcessingSlot.objects.exists()
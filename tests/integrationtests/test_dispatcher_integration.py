@@ -0,0 +1,73 @@
+"""Integration tests for oseoserver.dispatcher"""
+
+from django.core.cache import cache
+import mock
+import pytest
+
+from oseoserver import dispatcher
+from oseoserver import models
+
+pytestmark = pytest.mark.integration
+
+
+@pytest.mark.django_db
+def test_dispatch_items_shares_workers_between_users(settings,
+                                                     django_user_model,
+                                                     batch_factory):
+    settings.OSEOSERVER_MAX_DISPATCHED_ITEMS_PER_USER = 2
+    settings.OSEOSERVER_PRODUCT_ORDER = {
+        "routing": {models.Order.FAST_TRACK: {"queue": "fast"}},
+    }
+    first_user = django_user_model.objects.create(username="first")
+    second_user = django_user_model.objects.create(username="second")
+    massive = batch_factory(first_user, number_of_items=5)
+    fast = batch_factory(second_user, number_of_items=3,
+                         priority=models.Order.FAST_TRACK)
+    sent = []
+    with mock.patch.object(dispatcher.celery.current_app, "send_task",
+                           side_effect=lambda *a, **kw: sent.append(
+                               (a, kw))), \
+            mock.patch.object(dispatcher.transaction, "on_commit",
+                              side_effect=lambda func: func()):
+        massive_key = massive.store_batch_data({"Processor": "data"})
+        dispatcher.enqueue_batch(massive)
+        fast.store_batch_data({})
+        dispatcher.enqueue_batch(fast)
+        assert dispatcher.dispatch_items() == 4
+        item_tasks = [(args[1][0], kwargs) for args, kwargs in sent
+                      if args[0] == "oseoserver.tasks.process_item"]
+        massive_ids = list(massive.order_items.order_by("id").values_list(
+            "id", flat=True))
+        fast_ids = list(fast.order_items.order_by("id").values_list(
+            "id", flat=True))
+        # round robin, with the FAST_TRACK user first
+        assert [item_id for item_id, kwargs in item_tasks] == [
+            fast_ids[0], massive_ids[0], fast_ids[1], massive_ids[1]]
+        assert item_tasks[0][1] == {"queue": "fast"}
+        assert sent[-1][0][2] == {"batch_data_key": massive_key}
+        # nothing else is released until some items finish
+        del sent[:]
+        assert dispatcher.dispatch_items() == 0
+        item = models.OrderItem.objects.get(pk=massive_ids[0])
+        item.set_status(models.CustomizableItem.COMPLETED)
+        assert dispatcher.dispatch_items() == 1
+    assert sent[-1][0][1] == (massive_ids[2],)
+
+
+@pytest.mark.django_db
+def test_schedule_dispatch_is_not_blocked_by_rollbacks():
+    cache.clear()
+    # transactions that are rolled back never run their on_commit callbacks
+    with mock.patch.object(dispatcher.transaction, "on_commit"):
+        dispatcher.schedule_dispatch()
+    with mock.patch.object(dispatcher.celery.current_app,
+                           "send_task") as mock_send_task, \
+            mock.patch.object(dispatcher.transaction, "on_commit",
+                              side_effect=lambda func: func()):
+        mock_send_task.side_effect = RuntimeError("broker is down")
+        with pytest.raises(RuntimeError):
+            dispatcher.schedule_dispatch()
+        mock_send_task.side_effect = None
+        dispatcher.schedule_dispatch()
+        dispatcher.schedule_dispatch()
+    assert mock_send_task.call_count == 2
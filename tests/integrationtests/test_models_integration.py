@@ -0,0 +1,228 @@
+"""Integration tests for oseoserver.models"""
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+import mock
+import pytest
+
+from oseoserver import models
+from oseoserver import tasks
+
+pytestmark = pytest.mark.integration
+
+
+@pytest.mark.django_db
+def test_batch_item_counters_follow_item_transitions(admin_user,
+                                                     batch_factory):
+    batch = batch_factory(admin_user, number_of_items=3)
+    batch.refresh_from_db()
+    assert batch.total_items == 3
+    items = list(models.OrderItem.objects.filter(batch=batch).order_by("id"))
+    items[0].set_status(models.CustomizableItem.FAILED, "some error")
+    items[1].set_status(models.CustomizableItem.COMPLETED)
+    batch.refresh_from_db()
+    assert (batch.completed_items, batch.failed_items) == (1, 1)
+    assert batch.status == models.CustomizableItem.IN_PRODUCTION
+    items[2].set_status(models.CustomizableItem.COMPLETED)
+    batch.refresh_from_db()
+    assert (batch.completed_items, batch.failed_items) == (2, 1)
+    assert batch.status == models.CustomizableItem.FAILED
+    assert batch.additional_status_info == "item 0 some error"
+
+
+@pytest.mark.django_db
+def test_batch_item_counters_follow_item_deletes(admin_user, batch_factory):
+    batch = batch_factory(admin_user, number_of_items=3)
+    first, second, third = models.OrderItem.objects.filter(
+        batch=batch).order_by("id")
+    first.set_status(models.CustomizableItem.COMPLETED)
+    second.set_status(models.CustomizableItem.FAILED, "some error")
+    first.delete()
+    models.OrderItem.objects.filter(pk=third.pk).delete()
+    batch.refresh_from_db()
+    assert (batch.total_items, batch.completed_items,
+            batch.failed_items) == (1, 0, 1)
+    # the batch only has finished items left, so its status is now stale
+    assert batch in models.Batch.get_stale_batches()
+
+
+@pytest.mark.django_db
+def test_batch_recount_items(admin_user, batch_factory):
+    batch = batch_factory(admin_user, number_of_items=2)
+    models.OrderItem.objects.filter(batch=batch).update(
+        status=models.CustomizableItem.COMPLETED)
+    batch.recount_items()
+    batch.refresh_from_db()
+    assert batch.total_items == 2
+    assert batch.completed_items == 2
+    assert batch.failed_items == 0
+
+
+@pytest.mark.django_db
+def test_deferred_status_propagation(admin_user, settings, batch_factory):
+    settings.OSEOSERVER_STATUS_PROPAGATION = models.Batch.DEFERRED_PROPAGATION
+    with mock.patch("oseoserver.models.celery.current_app") as mock_app, \
+            mock.patch("oseoserver.models.transaction.on_commit",
+                       side_effect=lambda function: function()):
+        batch = batch_factory(admin_user, number_of_items=3)
+        for item in models.OrderItem.objects.filter(batch=batch):
+            item.set_status(models.CustomizableItem.COMPLETED)
+        assert mock_app.send_task.call_count == 1
+        batch.refresh_from_db()
+        assert batch.status == models.CustomizableItem.SUBMITTED
+        batch.propagate_status()
+    batch.refresh_from_db()
+    assert batch.completed_items == 3
+    assert batch.status == models.CustomizableItem.COMPLETED
+    assert batch.order.status == models.CustomizableItem.COMPLETED
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("number_of_items", [1, 50])
+def test_batch_create_order_items_constant_queries(admin_user, number_of_items,
+                                                   batch_factory):
+    batch = batch_factory(admin_user, number_of_items=0)
+    item_spec = models.ItemSpecification.objects.create(
+        order=batch.order, collection="lst", item_id="massive")
+    order_items = [
+        models.OrderItem(item_specification=item_spec,
+                         identifier="product {}".format(index),
+                         status=models.CustomizableItem.ACCEPTED)
+        for index in range(number_of_items)
+    ]
+    # insert the items, update the counters and reload them
+    with CaptureQueriesContext(connection) as context:
+        batch.create_order_items(order_items)
+    assert len(context.captured_queries) == 3
+    assert batch.total_items == number_of_items
+    assert batch.order_items.count() == number_of_items
+    assert batch.status == models.CustomizableItem.SUBMITTED
+
+
+@pytest.mark.django_db
+def test_batch_create_order_items_started(admin_user, batch_factory):
+    batch = batch_factory(admin_user, number_of_items=0)
+    item_spec = models.ItemSpecification.objects.create(
+        order=batch.order, collection="lst", item_id="massive")
+    batch.create_order_items([
+        models.OrderItem(item_specification=item_spec,
+                         status=models.CustomizableItem.COMPLETED),
+        models.OrderItem(item_specification=item_spec,
+                         status=models.CustomizableItem.IN_PRODUCTION),
+    ])
+    batch.refresh_from_db()
+    assert (batch.total_items, batch.completed_items) == (2, 1)
+    assert batch.status == models.CustomizableItem.IN_PRODUCTION
+
+
+@pytest.mark.django_db
+def test_massive_order_status_uses_estimated_batches(admin_user):
+    order = models.Order.objects.create(
+        status=models.CustomizableItem.IN_PRODUCTION,
+        user=admin_user,
+        order_type=models.Order.MASSIVE_ORDER,
+    )
+    models.ItemSpecification.objects.create(order=order, collection="lst",
+                                            item_id="massive")
+    with mock.patch("oseoserver.models.utilities.get_item_processor",
+                    autospec=True) as mock_get_processor:
+        processor = mock_get_processor.return_value
+        processor.get_order_duration.return_value = (None, None)
+        processor.estimate_number_massive_order_batches.return_value = 2
+        assert order.refresh_estimated_batches() == 2
+        processor.estimate_number_massive_order_batches.reset_mock()
+        models.Batch.objects.create(
+            order=order, status=models.CustomizableItem.COMPLETED)
+        order.refresh_from_db()
+        assert order.status == models.CustomizableItem.SUSPENDED
+        models.Batch.objects.create(
+            order=order, status=models.CustomizableItem.COMPLETED)
+        order.refresh_from_db()
+        assert order.status == models.CustomizableItem.COMPLETED
+        assert not processor.estimate_number_massive_order_batches.called
+    assert order.estimated_batches == 2
+
+
+@pytest.mark.django_db
+def test_active_item_counter_follows_item_transitions(admin_user,
+                                                      batch_factory):
+    batch = batch_factory(admin_user, number_of_items=3)
+    assert models.ActiveItemCounter.get_active_items(admin_user.pk) == 0
+    items = list(models.OrderItem.objects.filter(batch=batch).order_by("id"))
+    for item in items:
+        item.set_status(models.CustomizableItem.IN_PRODUCTION)
+    assert models.ActiveItemCounter.get_active_items(admin_user.pk) == 3
+    items[0].set_status(models.CustomizableItem.COMPLETED)
+    items[1].set_status(models.CustomizableItem.FAILED)
+    assert models.ActiveItemCounter.get_active_items(admin_user.pk) == 1
+
+
+@pytest.mark.django_db
+def test_active_item_counter_reconcile(admin_user, django_user_model,
+                                       batch_factory):
+    other_user = django_user_model.objects.create(username="other")
+    batch = batch_factory(admin_user, number_of_items=2)
+    models.ActiveItemCounter.objects.create(user=other_user, active_items=5)
+    models.OrderItem.objects.filter(batch=batch).update(
+        status=models.CustomizableItem.IN_PRODUCTION)
+    result = models.ActiveItemCounter.reconcile()
+    assert result == {admin_user.pk: 2}
+    assert models.ActiveItemCounter.get_active_items(admin_user.pk) == 2
+    assert models.ActiveItemCounter.get_active_items(other_user.pk) == 0
+
+
+@pytest.mark.django_db
+def test_batch_data_is_stored_under_a_content_key(admin_user, batch_factory):
+    first = batch_factory(admin_user, number_of_items=1)
+    second = batch_factory(admin_user, number_of_items=1)
+    key = first.store_batch_data({"Processor": {"a": 1, "b": 2}})
+    assert second.store_batch_data({"Processor": {"b": 2, "a": 1}}) == key
+    assert first.store_batch_data({"Processor": {}}) != key
+    models.Batch._batch_data_memo.clear()
+    with CaptureQueriesContext(connection) as context:
+        for index in range(3):
+            batch_data = models.Batch.get_batch_data(key)
+    assert len(context.captured_queries) == 1
+    assert batch_data == {"Processor": {"a": 1, "b": 2}}
+    # each call gets its own copy of the data
+    batch_data["Processor"]["a"] = 10
+    assert models.Batch.get_batch_data(key) == {"Processor": {"a": 1, "b": 2}}
+    with pytest.raises(models.Batch.DoesNotExist):
+        models.Batch.get_batch_data("missing")
+
+
+@pytest.mark.django_db
+def test_status_propagation_is_not_blocked_by_rollbacks(admin_user, settings,
+                                                        batch_factory):
+    settings.OSEOSERVER_STATUS_PROPAGATION = models.Batch.DEFERRED_PROPAGATION
+    batch = batch_factory(admin_user, number_of_items=1)
+    cache.clear()
+    # transactions that are rolled back never run their on_commit callbacks
+    with mock.patch("oseoserver.models.transaction.on_commit"):
+        models.Batch.schedule_status_propagation(batch.pk)
+    with mock.patch("oseoserver.models.celery.current_app") as mock_app, \
+            mock.patch("oseoserver.models.transaction.on_commit",
+                       side_effect=lambda function: function()):
+        mock_app.send_task.side_effect = RuntimeError("broker is down")
+        with pytest.raises(RuntimeError):
+            models.Batch.schedule_status_propagation(batch.pk)
+        mock_app.send_task.side_effect = None
+        models.Batch.schedule_status_propagation(batch.pk)
+    assert mock_app.send_task.call_count == 2
+
+
+@pytest.mark.django_db
+def test_propagate_stale_batch_statuses(admin_user, settings, batch_factory):
+    settings.OSEOSERVER_STATUS_PROPAGATION = models.Batch.DEFERRED_PROPAGATION
+    with mock.patch("oseoserver.models.transaction.on_commit"):
+        stale = batch_factory(admin_user, number_of_items=2)
+        models.OrderItem.objects.filter(batch=stale).update(
+            status=models.CustomizableItem.COMPLETED)
+        up_to_date = batch_factory(admin_user, number_of_items=1)
+        up_to_date.recount_items()
+    assert list(models.Batch.get_stale_batches()) == [stale]
+    tasks.propagate_stale_batch_statuses()
+    stale.refresh_from_db()
+    assert stale.status == models.CustomizableItem.COMPLETED
+    assert list(models.Batch.get_stale_batches()) == []
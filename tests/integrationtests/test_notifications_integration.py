@@ -0,0 +1,62 @@
+"""Integration tests for oseoserver.notifications"""
+
+import mock
+import pytest
+
+from oseoserver import models
+from oseoserver import notifications
+from oseoserver import requestprocessor
+
+pytestmark = pytest.mark.integration
+
+
+@pytest.mark.django_db
+def test_moderate_order_queues_moderation_request(settings, admin_user):
+    settings.OSEOSERVER_PRODUCT_ORDER = {"automatic_approval": False}
+    order = models.Order.objects.create(
+        user=admin_user, order_type=models.Order.PRODUCT_ORDER)
+    with mock.patch.object(notifications.transaction, "on_commit",
+                           autospec=True) as mock_on_commit, \
+            mock.patch.object(notifications, "mailsender",
+                              autospec=True) as mock_mailsender:
+        requestprocessor.moderate_order(order)
+    notification = order.notifications.get()
+    assert notification.kind == models.Notification.MODERATION_REQUEST
+    assert notification.sent_on is None
+    assert mock_on_commit.call_count == 1
+    assert not mock_mailsender.send_moderation_request_email.called
+
+
+@pytest.mark.django_db
+def test_send_pending_notifications(admin_user):
+    order = models.Order.objects.create(
+        user=admin_user, order_type=models.Order.PRODUCT_ORDER)
+    with mock.patch.object(notifications.transaction, "on_commit",
+                           autospec=True):
+        notifications.queue_notification(
+            models.Notification.MODERATION_REQUEST, order)
+        notifications.queue_notification(
+            models.Notification.ORDER_MODERATED, order, approved=True)
+    with mock.patch.object(notifications, "mailsender",
+                           autospec=True) as mock_mailsender, \
+            mock.patch.object(notifications, "_notify_order_stakeholders",
+                              autospec=True) as mock_notify:
+        mock_mailsender.send_moderation_request_email.side_effect = (
+            RuntimeError("smtp is down"))
+        sent = notifications.send_pending_notifications()
+    assert sent == 1
+    mock_notify.assert_called_once_with(
+        order, mock_mailsender.send_product_order_moderated_email,
+        approved=True
+    )
+    failed = order.notifications.get(
+        kind=models.Notification.MODERATION_REQUEST)
+    assert failed.sent_on is None
+    assert failed.attempts == 1
+    assert failed.error == "smtp is down"
+    moderated = order.notifications.get(
+        kind=models.Notification.ORDER_MODERATED)
+    assert moderated.sent_on is not None
+    # only the failed notification is retried
+    with mock.patch.object(notifications, "mailsender", autospec=True):
+        assert notifications.send_pending_notifications() == 1
@@ -1,6 +1,9 @@
 """Integration tests for oseoserver.operations.getstatus"""
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 import pytest
+import pyxb
 from pyxb.bundles.opengis import oseo_1_0 as oseo
 
 from lxml import etree
@@ -8,6 +11,7 @@ from oseoserver import errors
 from oseoserver import models
 from oseoserver.operations import getstatus
 from oseoserver import requestprocessor
+from oseoserver import utilities
 
 pytestmark = pytest.mark.integration
 
@@ -127,6 +131,119 @@ def test_get_status_order_id_items(admin_user, item_specification_identifiers,
     assert len(monitor.orderItem) == expected_items
 
 
+@pytest.mark.django_db
+@pytest.mark.parametrize("presentation", [getstatus.BRIEF, getstatus.FULL])
+def test_get_status_lxml_builder_matches_pyxb(admin_user, presentation):
+    order = models.Order.objects.create(
+        status=models.CustomizableItem.SUBMITTED,
+        user=admin_user,
+        order_type=models.Order.PRODUCT_ORDER,
+        status_notification=models.Order.FINAL,
+        remark="Some order remark",
+    )
+    models.ItemSpecification.objects.create(
+        order=order,
+        remark="Some item remark",
+        collection="lst",
+        identifier="",
+        item_id="some id for the item",
+    )
+    requestprocessor.create_product_order_batch(order)
+    records = [models.Order.objects.get(pk=order.pk)]
+    pyxb_response = getstatus.generate_get_status_response(
+        records, presentation)
+    lxml_response = getstatus.generate_get_status_response_element(
+        records, presentation)
+    reference = etree.fromstring(pyxb_response.toxml(encoding="utf-8"))
+    assert utilities.elements_equal(reference, lxml_response)
+
+
+def _create_orders(user, number_of_orders, batches_per_order,
+                   items_per_order):
+    orders = []
+    for order_index in range(number_of_orders):
+        order = models.Order.objects.create(
+            status=models.CustomizableItem.SUBMITTED,
+            user=user,
+            order_type=models.Order.PRODUCT_ORDER,
+            status_notification=models.Order.FINAL,
+        )
+        for index in range(items_per_order):
+            models.ItemSpecification.objects.create(
+                order=order,
+                collection="lst",
+                identifier="",
+                item_id="item {}".format(index),
+            )
+        for batch_index in range(batches_per_order):
+            requestprocessor.create_product_order_batch(order)
+        orders.append(order)
+    return orders
+
+
+@pytest.mark.django_db
+def test_get_status_full_query_count_is_constant(admin_user):
+    query_counts = []
+    for number_of_items in (1, 5):
+        order = _create_orders(admin_user, 1, 1, number_of_items)[0]
+        request = oseo.GetStatus(
+            service="OS",
+            version="1.0.0",
+            presentation=getstatus.FULL,
+            orderId=str(order.pk)
+        )
+        with CaptureQueriesContext(connection) as context:
+            getstatus.get_status(request, admin_user)
+        query_counts.append(len(context.captured_queries))
+    assert query_counts[0] == query_counts[1]
+
+
+@pytest.mark.django_db
+def test_get_status_search_query_count_is_constant(admin_user):
+    query_counts = []
+    # each round adds more orders, with more batches and items
+    for number_of_orders, batches, items in ((1, 1, 1), (3, 2, 4)):
+        _create_orders(admin_user, number_of_orders, batches, items)
+        request = oseo.GetStatus(
+            service="OS",
+            version="1.0.0",
+            presentation=getstatus.FULL,
+            filteringCriteria=pyxb.BIND()
+        )
+        with CaptureQueriesContext(connection) as context:
+            getstatus.get_status(request, admin_user)
+        query_counts.append(len(context.captured_queries))
+    assert query_counts[0] == query_counts[1]
+
+
+@pytest.mark.django_db
+def test_get_order_page_visits_every_order_once(admin_user):
+    order_ids = []
+    for index in range(7):
+        order = models.Order.objects.create(
+            status=models.CustomizableItem.SUBMITTED,
+            user=admin_user,
+            order_type=models.Order.PRODUCT_ORDER,
+            status_notification=models.Order.FINAL,
+        )
+        order_ids.append(order.id)
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = getstatus.get_order_page(
+            getstatus.find_orders(admin_user), page_size=3, cursor=cursor)
+        assert len(page) <= 3
+        seen.extend(order.id for order in page)
+        if cursor is None:
+            break
+    assert seen == sorted(order_ids)
+
+
+def test_decode_page_cursor_invalid():
+    with pytest.raises(errors.InvalidParameterValueError):
+        getstatus.decode_page_cursor("not a cursor")
+
+
 def _print_response(oseo_response):
     print(
         etree.tostring(
@@ -1,5 +1,14 @@
 """Integration tests for oseoserver.operations.submit"""
 
+try:
+    from http.server import BaseHTTPRequestHandler
+    from http.server import HTTPServer
+except ImportError:  # python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from BaseHTTPServer import HTTPServer
+import threading
+
+from django.core.cache import cache
 from lxml import etree
 import pytest
 from pyxb import BIND
@@ -10,6 +19,9 @@ from pyxb import namespace
 
 from oseoserver.operations import submit
 from oseoserver.models import Order
+from oseoserver.orderpreparation.exampleorderprocessor import (
+    ExampleOrderProcessor)
+from oseoserver import collectionresolver
 from oseoserver import constants
 
 pytestmark = pytest.mark.integration
@@ -174,6 +186,113 @@ class TestSubmitOperation(object):
         print("result: {}".format(result))
 
 
+@pytest.fixture()
+def stub_catalogue():
+    """A local CSW server that knows the parent of some records"""
+
+    records = {
+        "first_item": "first_collection",
+        "second_item": "second_collection",
+    }
+    received = []
+
+    class CswHandler(BaseHTTPRequestHandler):
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            request = etree.fromstring(body)
+            requested = request.xpath(
+                "csw:Id/text()",
+                namespaces={"csw": "http://www.opengis.net/cat/csw/2.0.2"}
+            )
+            received.append(requested)
+            found = "".join(
+                _METADATA_RECORD_TEMPLATE.format(identifier=i,
+                                                 parent=records[i])
+                for i in requested if i in records
+            )
+            response = _GET_RECORD_BY_ID_RESPONSE_TEMPLATE.format(
+                records=found).encode(constants.ENCODING)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/xml")
+            self.send_header("Content-Length", str(len(response)))
+            self.end_headers()
+            self.wfile.write(response)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), CswHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    server.received = received
+    server.url = "http://127.0.0.1:{}/csw".format(server.server_port)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_resolve_collection_ids_with_stub_catalogue(settings, stub_catalogue):
+    cache.clear()
+    settings.OSEOSERVER_COLLECTIONS = [
+        {"name": "first", "collection_identifier": "first_collection",
+         "catalogue_endpoint": stub_catalogue.url},
+        {"name": "second", "collection_identifier": "second_collection",
+         "catalogue_endpoint": stub_catalogue.url},
+    ]
+    processor = ExampleOrderProcessor()
+    item_ids = ["first_item", "second_item", "unknown_item"]
+    result = collectionresolver.resolve_collection_ids(item_ids, processor)
+    assert result == {
+        "first_item": "first_collection",
+        "second_item": "second_collection",
+        "unknown_item": None,
+    }
+    # a single request, with all of the identifiers
+    assert stub_catalogue.received == [item_ids]
+    # both the found and the missing items are served from the cache
+    collectionresolver.resolve_collection_ids(item_ids, processor)
+    assert len(stub_catalogue.received) == 1
+
+
+def test_resolve_collection_ids_with_unreachable_catalogue(settings,
+                                                           stub_catalogue):
+    cache.clear()
+    settings.OSEOSERVER_COLLECTIONS = [
+        {"name": "first", "collection_identifier": "first_collection",
+         "catalogue_endpoint": stub_catalogue.url},
+        {"name": "second", "collection_identifier": "second_collection",
+         "catalogue_endpoint": "http://127.0.0.1:1/csw"},
+    ]
+    processor = ExampleOrderProcessor()
+    result = collectionresolver.resolve_collection_ids(
+        ["first_item", "unknown_item"], processor)
+    assert result == {"first_item": "first_collection", "unknown_item": None}
+    # the missing item was not cached because a catalogue was not checked
+    collectionresolver.resolve_collection_ids(
+        ["first_item", "unknown_item"], processor)
+    assert stub_catalogue.received == [
+        ["first_item", "unknown_item"], ["unknown_item"]]
+
+
+_GET_RECORD_BY_ID_RESPONSE_TEMPLATE = """<?xml version="1.0" encoding="utf-8"?>
+<csw:GetRecordByIdResponse
+    xmlns:csw="http://www.opengis.net/cat/csw/2.0.2"
+    xmlns:gmd="http://www.isotc211.org/2005/gmd"
+    xmlns:gco="http://www.isotc211.org/2005/gco">{records}
+</csw:GetRecordByIdResponse>"""
+
+_METADATA_RECORD_TEMPLATE = """
+  <gmd:MD_Metadata>
+    <gmd:fileIdentifier>
+      <gco:CharacterString>{identifier}</gco:CharacterString>
+    </gmd:fileIdentifier>
+    <gmd:parentIdentifier>
+      <gco:CharacterString>{parent}</gco:CharacterString>
+    </gmd:parentIdentifier>
+  </gmd:MD_Metadata>"""
+
 def _add_order_specification_options(order_spec, xpath_expression, **options):
     """Add options to Submit requests
 
@@ -1,12 +1,15 @@
 """Integration tests for oseoserver.requestprocessor"""
 
+from django.core.cache import cache
 from lxml import etree
+import mock
 import pytest
 from pyxb.bundles.opengis import oseo_1_0 as oseo
 
 from oseoserver import requestprocessor
 from oseoserver import errors
 from oseoserver import constants
+from oseoserver import models
 
 pytestmark = pytest.mark.integration
 
@@ -42,3 +45,166 @@ class TestServer(object):
             requestprocessor.process_request(request_data, fake_user)
         assert excinfo.value.code == "InvalidOrderIdentifier"
 
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "max_active_items, expected_batches, expected_lookup_task", [
+        (400, 2, True),
+        (4, 1, False),
+    ]
+)
+def test_schedule_massive_order_batches(settings, admin_user,
+                                        max_active_items, expected_batches,
+                                        expected_lookup_task):
+    cache.clear()
+    settings.OSEOSERVER_MASSIVE_ORDER_BATCHES_IN_FLIGHT = 2
+    settings.OSEOSERVER_MAX_ACTIVE_ITEMS = max_active_items
+    order = models.Order.objects.create(
+        user=admin_user,
+        order_type=models.Order.MASSIVE_ORDER,
+        status=models.Order.ACCEPTED
+    )
+    models.ItemSpecification.objects.create(order=order, collection="lst",
+                                            item_id="massive")
+    with mock.patch("oseoserver.utilities.get_item_processor",
+                    autospec=True) as mock_get_processor, \
+            mock.patch("oseoserver.requestprocessor.celery") as mock_celery, \
+            mock.patch("oseoserver.requestprocessor.transaction.on_commit",
+                       side_effect=lambda func: func()):
+        processor = mock.Mock(spec=[
+            "get_order_duration",
+            "estimate_number_massive_order_batches",
+            "get_massive_order_batch_item_identifiers",
+        ])
+        mock_get_processor.return_value = processor
+        processor.get_order_duration.return_value = (None, None)
+        processor.estimate_number_massive_order_batches.return_value = 5
+        processor.get_massive_order_batch_item_identifiers.return_value = [
+            "first", "second", "third"]
+        requestprocessor.handle_massive_order(order)
+    assert order.batches.count() == expected_batches
+    assert order.estimated_batches == 5
+    sent_tasks = [call[1][0] for call in
+                  mock_celery.current_app.send_task.mock_calls]
+    assert sent_tasks.count("oseoserver.tasks.process_batch") == (
+        expected_batches)
+    # the identifiers of the next batch are requested ahead of time, either
+    # in a separate task or while checking if the batch fits in the active
+    # items limit
+    lookup_task_sent = (
+        "oseoserver.tasks.precompute_massive_order_batch" in sent_tasks)
+    assert lookup_task_sent == expected_lookup_task
+    assert processor.get_massive_order_batch_item_identifiers.call_count == (
+        expected_batches + int(not expected_lookup_task))
+
+
+@pytest.mark.django_db
+def test_massive_order_batches_resume_from_checkpoint(settings, admin_user):
+    cache.clear()
+    settings.OSEOSERVER_MAX_ORDER_ITEMS = 2
+    identifiers = ["first", "second", "third", "fourth", "fifth"]
+    requested_checkpoints = []
+
+    def iterate_identifiers(collection, start, end, checkpoint=None):
+        requested_checkpoints.append(checkpoint)
+        first = 0 if checkpoint is None else checkpoint + 1
+        for index in range(first, len(identifiers)):
+            yield identifiers[index], index
+
+    order = models.Order.objects.create(
+        user=admin_user,
+        order_type=models.Order.MASSIVE_ORDER,
+        status=models.Order.ACCEPTED
+    )
+    models.ItemSpecification.objects.create(order=order, collection="lst",
+                                            item_id="massive")
+    with mock.patch("oseoserver.utilities.get_item_processor",
+                    autospec=True) as mock_get_processor:
+        processor = mock.Mock(spec=[
+            "get_order_duration",
+            "estimate_number_massive_order_batches",
+            "iterate_massive_order_item_identifiers",
+        ])
+        mock_get_processor.return_value = processor
+        processor.get_order_duration.return_value = (None, None)
+        processor.estimate_number_massive_order_batches.return_value = 3
+        processor.iterate_massive_order_item_identifiers.side_effect = (
+            iterate_identifiers)
+        for batch_index in range(3):
+            requestprocessor.create_massive_order_batch(
+                order, batch_index=batch_index)
+    assert requested_checkpoints == [None, 1, 3]
+    batch_identifiers = [
+        list(batch.order_items.order_by("id").values_list(
+            "identifier", flat=True))
+        for batch in order.batches.order_by("id")
+    ]
+    assert batch_identifiers == [["first", "second"], ["third", "fourth"],
+                                 ["fifth"]]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("error, expected_status", [
+    (None, models.Order.ACCEPTED),
+    (errors.InvalidParameterValueError("collectionId"), models.Order.FAILED),
+    (TypeError("unexpected"), models.Order.FAILED),
+])
+def test_handle_asynchronous_submit(settings, admin_user, error,
+                                    expected_status):
+    settings.OSEOSERVER_PRODUCT_ORDER = {
+        "enabled": True,
+        "automatic_approval": True,
+        "notifications": {"moderation": False},
+    }
+    order = models.Order.objects.create(
+        user=admin_user,
+        order_type=models.Order.PRODUCT_ORDER,
+        submit_request="<fake/>"
+    )
+    assert order not in models.OrderPendingModeration.objects.all()
+
+    def process_order_specification(order_specification, user,
+                                    status_notification, order=None):
+        order.submit_request = ""
+        order.save()
+        if error is not None:
+            raise error
+
+    with mock.patch.object(requestprocessor, "parse_xml",
+                           autospec=True), \
+            mock.patch.object(requestprocessor.submit,
+                              "process_request_order_specification",
+                              side_effect=process_order_specification), \
+            mock.patch.object(requestprocessor, "handle_product_order",
+                              autospec=True):
+        valid = requestprocessor.handle_asynchronous_submit(order)
+    assert valid is (error is None)
+    order.refresh_from_db()
+    assert order.status == expected_status
+    assert order.submit_request == ""
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("priority, expected_options", [
+    (models.Order.FAST_TRACK, {"queue": "fast"}),
+    (models.Order.STANDARD, {}),
+])
+def test_handle_product_order_routes_by_priority(settings, admin_user,
+                                                 priority, expected_options):
+    settings.OSEOSERVER_PRODUCT_ORDER = {
+        "routing": {models.Order.FAST_TRACK: {"queue": "fast"}},
+    }
+    order = models.Order.objects.create(
+        user=admin_user,
+        order_type=models.Order.PRODUCT_ORDER,
+        priority=priority
+    )
+    batch = models.Batch.objects.create(order=order)
+    with mock.patch.object(requestprocessor,
+                           "create_product_order_batch",
+                           return_value=batch), \
+            mock.patch.object(requestprocessor.celery.current_app,
+                              "send_task") as mock_send_task:
+        requestprocessor.handle_product_order(order)
+    mock_send_task.assert_called_once_with(
+        "oseoserver.tasks.process_batch", (batch.id,), **expected_options)
@@ -0,0 +1,191 @@
+"""Integration tests for oseoserver.tasks"""
+
+from celery.exceptions import Ignore
+from celery.exceptions import Retry
+import mock
+import pytest
+
+from oseoserver import models
+from oseoserver import tasks
+
+pytestmark = pytest.mark.integration
+
+
+@pytest.mark.django_db
+def test_process_batch_sends_chunks(settings, admin_user, batch_factory):
+    settings.OSEOSERVER_ITEM_CHUNK_SIZE = 2
+    settings.OSEOSERVER_PRODUCT_ORDER = {
+        "notifications": {"batch_availability": "immediate"},
+    }
+    batch = batch_factory(admin_user, number_of_items=3)
+    item_ids = list(batch.order_items.order_by("id").values_list(
+        "id", flat=True))
+    with mock.patch.object(tasks, "prepare_items_by_processing_type",
+                           return_value=([], [{"id": i} for i in item_ids])), \
+            mock.patch.object(models.Batch, "get_item_processors",
+                              return_value=[]), \
+            mock.patch.object(tasks, "chord") as mock_chord, \
+            mock.patch.object(tasks, "group") as mock_group:
+        tasks.process_batch(batch.id)
+    batch.refresh_from_db()
+    chunks = mock_group.call_args[0]
+    assert [sig.task for sig in chunks] == [
+        "oseoserver.tasks.process_item_chunk"] * 2
+    assert [sig.args for sig in chunks] == [
+        (item_ids[:2],), (item_ids[2:],)]
+    assert chunks[0].kwargs == {"batch_data_key": batch.batch_data_key}
+    # the user is notified once all chunks are done
+    assert mock_chord.call_args[0] == (mock_group.return_value,)
+    assert mock_chord.call_args[1]["body"].args == (batch.id,)
+    mock_chord.return_value.apply_async.assert_called_once_with()
+
+
+@pytest.mark.django_db
+def test_process_item_chunk_updates_each_item(admin_user, batch_factory):
+    batch = batch_factory(admin_user, number_of_items=3)
+    first, second, third = batch.order_items.order_by("id")
+    with mock.patch.object(tasks.utilities, "get_max_concurrent_items",
+                           return_value=None), \
+            mock.patch.object(models.OrderItem, "prepare",
+                              side_effect=["url", RuntimeError("boom"),
+                                           "url"]), \
+            mock.patch.object(models.OrderItem, "deliver",
+                              return_value="delivered"), \
+            mock.patch.object(tasks.process_item_chunk, "retry",
+                              side_effect=Retry()) as mock_retry:
+        with pytest.raises(Retry):
+            tasks.process_item_chunk.run([first.id, second.id, third.id])
+    # only the failed item is retried
+    assert mock_retry.call_args[1] == {"args": ([second.id],)}
+    statuses = [item.status for item in batch.order_items.order_by("id")]
+    assert statuses == [models.CustomizableItem.COMPLETED,
+                        models.CustomizableItem.IN_PRODUCTION,
+                        models.CustomizableItem.COMPLETED]
+
+
+@pytest.mark.django_db
+def test_process_item_chunk_fails_items_after_the_last_retry(admin_user,
+                                                             batch_factory):
+    batch = batch_factory(admin_user, number_of_items=2)
+    first, second = batch.order_items.order_by("id")
+    tasks.process_item_chunk.push_request(retries=3)
+    try:
+        with mock.patch.object(tasks.utilities, "get_max_concurrent_items",
+                               return_value=None), \
+                mock.patch.object(models.OrderItem, "prepare",
+                                  side_effect=[RuntimeError("boom"), "url"]), \
+                mock.patch.object(models.OrderItem, "deliver",
+                                  return_value="delivered"), \
+                mock.patch.object(tasks, "mailsender",
+                                  autospec=True) as mock_mailsender:
+            tasks.process_item_chunk.run([first.id, second.id])
+    finally:
+        tasks.process_item_chunk.pop_request()
+    statuses = [item.status for item in batch.order_items.order_by("id")]
+    assert statuses == [models.CustomizableItem.FAILED,
+                        models.CustomizableItem.COMPLETED]
+    assert mock_mailsender.send_item_processing_failed_email.call_count == 1
+
+
+@pytest.mark.django_db
+def test_process_item_chunk_requeues_remaining_items(admin_user,
+                                                     batch_factory):
+    batch = batch_factory(admin_user, number_of_items=3)
+    item_ids = list(batch.order_items.order_by("id").values_list(
+        "id", flat=True))
+    mock_signature = mock.MagicMock()
+    with mock.patch.object(tasks.utilities, "get_max_concurrent_items",
+                           return_value=1), \
+            mock.patch.object(tasks.concurrency, "acquire_item_slot",
+                              side_effect=[True, False]), \
+            mock.patch.object(tasks, "_process_order_item") as mock_process, \
+            mock.patch.object(tasks.process_item_chunk,
+                              "signature_from_request",
+                              return_value=mock_signature) as mock_from_req:
+        result = tasks.process_item_chunk.apply((item_ids,))
+    assert result.state == "IGNORED"
+    assert mock_process.call_count == 1
+    assert mock_from_req.call_args[1]["args"] == (item_ids[1:],)
+    mock_signature.apply_async.assert_called_once_with()
+
+
+@pytest.mark.django_db
+def test_process_item_hands_prepared_items_to_delivery(settings, admin_user,
+                                                       batch_factory):
+    settings.OSEOSERVER_ITEM_DELIVERY_QUEUE = "delivery"
+    settings.OSEOSERVER_PRODUCT_ORDER = {
+        "routing": {"STANDARD": {"queue": "standard", "priority": 3}},
+    }
+    item = batch_factory(admin_user, number_of_items=1).order_items.get()
+    with mock.patch.object(tasks.utilities, "get_max_concurrent_items",
+                           return_value=None), \
+            mock.patch.object(models.OrderItem, "prepare",
+                              return_value="prepared"), \
+            mock.patch.object(models.OrderItem, "deliver") as mock_deliver, \
+            mock.patch.object(tasks.process_item, "replace",
+                              side_effect=Ignore()) as mock_replace:
+        result = tasks.process_item.apply((item.id,))
+    assert result.state == "IGNORED"
+    assert not mock_deliver.called
+    delivery = mock_replace.call_args[0][0]
+    assert delivery.task == "oseoserver.tasks.deliver_item"
+    assert delivery.args == (item.id, "prepared")
+    assert delivery.kwargs["preparation_duration"] >= 0
+    assert delivery.options["queue"] == "delivery"
+    assert delivery.options["priority"] == 3
+    item.refresh_from_db()
+    assert item.status == models.CustomizableItem.IN_PRODUCTION
+
+
+@pytest.mark.django_db
+def test_deliver_item_does_not_prepare_again(admin_user, batch_factory):
+    item = batch_factory(admin_user, number_of_items=1).order_items.get()
+    with mock.patch.object(models.OrderItem, "prepare") as mock_prepare, \
+            mock.patch.object(models.OrderItem, "deliver",
+                              return_value="delivered") as mock_deliver, \
+            mock.patch.object(tasks.chunking, "record_item_duration",
+                              autospec=True) as mock_record:
+        result = tasks.deliver_item.apply(
+            (item.id, "prepared"), {"preparation_duration": 30})
+    assert result.get() == "delivered"
+    mock_deliver.assert_called_once_with("prepared")
+    assert not mock_prepare.called
+    collection, duration = mock_record.call_args[0]
+    assert collection == "lst"
+    assert duration >= 30
+    item.refresh_from_db()
+    assert item.status == models.CustomizableItem.COMPLETED
+
+
+@pytest.mark.django_db
+def test_process_item_chunk_fails_items_without_batch_data(admin_user,
+                                                           batch_factory):
+    batch = batch_factory(admin_user, number_of_items=2)
+    item_ids = list(batch.order_items.order_by("id").values_list(
+        "id", flat=True))
+    with mock.patch.object(tasks.utilities, "get_max_concurrent_items",
+                           return_value=None), \
+            mock.patch.object(tasks, "mailsender", autospec=True):
+        result = tasks.process_item_chunk.apply(
+            (item_ids,), {"batch_data_key": "missing"})
+    assert result.successful()
+    assert set(batch.order_items.values_list("status", flat=True)) == {
+        models.CustomizableItem.FAILED}
+
+
+@pytest.mark.django_db
+def test_process_item_chunk_on_failure_fails_unfinished_items(admin_user,
+                                                              batch_factory):
+    batch = batch_factory(admin_user, number_of_items=2)
+    first, second = batch.order_items.order_by("id")
+    first.set_status(models.CustomizableItem.COMPLETED)
+    with mock.patch.object(tasks, "mailsender",
+                           autospec=True) as mock_mailsender:
+        tasks.process_item_chunk.on_failure(
+            RuntimeError("database is down"), "task-id",
+            ([first.id, second.id],), {}, mock.Mock(traceback=""))
+    first.refresh_from_db()
+    second.refresh_from_db()
+    assert first.status == models.CustomizableItem.COMPLETED
+    assert second.status == models.CustomizableItem.FAILED
+    assert mock_mailsender.send_item_processing_failed_email.call_count == 1
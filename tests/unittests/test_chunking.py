@@ -0,0 +1,37 @@
+"""Unit tests for oseoserver.chunking"""
+
+from django.core.cache import cache
+import pytest
+
+from oseoserver import chunking
+
+pytestmark = pytest.mark.unit
+
+
+def test_get_chunk_size_adapts_to_item_duration(settings):
+    cache.clear()
+    settings.OSEOSERVER_ITEM_CHUNK_SIZE = 20
+    settings.OSEOSERVER_ITEM_CHUNK_DURATION = 60
+    # collections that have not been measured use the maximum size
+    assert chunking.get_chunk_size("fast") == 20
+    chunking.record_item_duration("fast", 1)
+    chunking.record_item_duration("slow", 15)
+    chunking.record_item_duration("very slow", 600)
+    assert chunking.get_chunk_size("fast") == 20
+    assert chunking.get_chunk_size("slow") == 4
+    assert chunking.get_chunk_size("very slow") == 1
+
+
+def test_record_item_duration_keeps_a_moving_average():
+    cache.clear()
+    chunking.record_item_duration("lst", 10)
+    chunking.record_item_duration("lst", 20)
+    assert chunking.get_item_duration("lst") == pytest.approx(12)
+
+
+def test_split_items_by_collection(settings):
+    cache.clear()
+    settings.OSEOSERVER_ITEM_CHUNK_SIZE = 2
+    collections = {1: "lst", 2: "lst", 3: "ndvi", 4: "lst"}
+    result = chunking.split_items([1, 2, 3, 4], collections)
+    assert result == [[1, 2], [4], [3]]
@@ -0,0 +1,56 @@
+"""Unit tests for oseoserver.collectionresolver"""
+
+from django.core.cache import cache
+import mock
+import pytest
+
+from oseoserver import collectionresolver
+from oseoserver import errors
+
+pytestmark = pytest.mark.unit
+
+
+def test_resolve_collection_ids_uses_batch_method():
+    cache.clear()
+    processor = mock.Mock(spec=["get_collection_ids", "get_collection_id"])
+    processor.get_collection_ids.return_value = {"a": "first", "b": None}
+    result = collectionresolver.resolve_collection_ids(["a", "b"], processor)
+    assert result == {"a": "first", "b": None}
+    processor.get_collection_ids.assert_called_once_with(["a", "b"])
+    assert not processor.get_collection_id.called
+
+
+def test_resolve_collection_ids_queries_each_item():
+    cache.clear()
+    processor = mock.Mock(spec=["get_collection_id"])
+    processor.get_collection_id.side_effect = lambda item_id: {
+        "a": "first", "b": "second"}[item_id]
+    result = collectionresolver.resolve_collection_ids(["a", "b"], processor)
+    assert result == {"a": "first", "b": "second"}
+    assert processor.get_collection_id.call_count == 2
+
+
+def test_resolve_collection_ids_caches_missing_items(settings):
+    cache.clear()
+    settings.OSEOSERVER_COLLECTION_ID_NEGATIVE_CACHE_TIMEOUT = 30
+    processor = mock.Mock(spec=["get_collection_id"])
+    processor.get_collection_id.side_effect = errors.OseoServerError("nope")
+    with mock.patch.object(collectionresolver.cache, "set_many",
+                           wraps=cache.set_many) as mock_set_many:
+        first = collectionresolver.resolve_collection_ids(["a"], processor)
+    second = collectionresolver.resolve_collection_ids(["a"], processor)
+    assert first == second == {"a": None}
+    processor.get_collection_id.assert_called_once_with("a")
+    mock_set_many.assert_any_call(
+        {collectionresolver._get_cache_key("a"): ""}, timeout=30)
+
+
+def test_resolve_collection_ids_only_looks_up_uncached_items():
+    cache.clear()
+    processor = mock.Mock(spec=["get_collection_ids"])
+    processor.get_collection_ids.return_value = {"a": "first"}
+    collectionresolver.resolve_collection_ids(["a"], processor)
+    processor.get_collection_ids.return_value = {"b": "second"}
+    result = collectionresolver.resolve_collection_ids(["a", "b"], processor)
+    assert result == {"a": "first", "b": "second"}
+    processor.get_collection_ids.assert_called_with(["b"])
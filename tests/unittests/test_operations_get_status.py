@@ -1,5 +1,6 @@
 """Unit tests for oseoserver.operations.getstatus"""
 
+from lxml import etree
 import pytest
 import mock
 
@@ -14,3 +15,35 @@ class TestGetStatus(object):
 
     def test_creation(self):
         getstatus.GetStatus()
+
+
+def _fake_order_monitor(container, record, presentation):
+    if record == "broken":
+        raise NotImplementedError("tasking orders")
+    element = etree.SubElement(
+        container, "{{{}}}orderMonitorSpecification".format(
+            constants.NAMESPACES["oseo"]))
+    element.text = record
+    return element
+
+
+def test_get_status_response_stream_aborts_on_error():
+    chunks = []
+    with mock.patch.object(getstatus, "create_order_monitor_element",
+                           side_effect=_fake_order_monitor):
+        stream = getstatus.generate_get_status_response_stream(
+            ["first", "second", "broken", "last"], getstatus.BRIEF)
+        with pytest.raises(NotImplementedError):
+            for chunk in stream:
+                chunks.append(chunk)
+    # the response is left unfinished instead of looking successful
+    with pytest.raises(etree.XMLSyntaxError):
+        etree.fromstring(b"".join(chunks))
+
+
+def test_get_status_response_stream_raises_setup_errors():
+    with mock.patch.object(getstatus, "create_order_monitor_element",
+                           side_effect=_fake_order_monitor):
+        with pytest.raises(NotImplementedError):
+            getstatus.generate_get_status_response_stream(
+                ["broken", "first"], getstatus.BRIEF)
@@ -1,5 +1,7 @@
 """Unit tests for oseoserver.operations.submit"""
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from lxml import etree
 import mock
 import pytest
@@ -59,6 +61,38 @@ def test_submit_invalid_status_notification(status_notification):
         submit.submit(request, "fake_user")
 
 
+@pytest.mark.django_db
+def test_submit_asynchronous(settings, admin_user):
+    settings.OSEOSERVER_SUBMIT_ASYNCHRONOUS = True
+    settings.OSEOSERVER_PRODUCT_ORDER = {"enabled": True}
+    request = oseo.Submit(
+        service="OS",
+        version="1.0.0",
+        statusNotification="None",
+        orderSpecification=oseo.OrderSpecification(
+            orderType="PRODUCT_ORDER",
+            orderItem=[
+                oseo.CommonOrderItemType(
+                    itemId="my_id",
+                    productId=oseo.ProductIdType(identifier="my_identifier")
+                )
+            ]
+        )
+    )
+    with mock.patch.object(submit,
+                           "process_request_order_specification",
+                           autospec=True) as mock_process, \
+            mock.patch.object(submit.transaction, "on_commit",
+                              autospec=True) as mock_on_commit:
+        response, order = submit.submit(request, admin_user)
+    assert not mock_process.called
+    assert mock_on_commit.call_count == 1
+    assert response.orderId == str(order.id)
+    assert order.status == Order.SUBMITTED
+    assert order.item_specifications.count() == 0
+    assert "my_identifier" in order.submit_request
+
+
 @pytest.mark.django_db
 def test_submit_quotation_id():
     request = oseo.Submit(
@@ -97,6 +131,46 @@ def test_create_order_delivery_information(protocol):
     assert isinstance(result, models.DeliveryInformation)
 
 
+@pytest.mark.django_db
+def test_create_order_delivery_information_bulk():
+    delivery_info = oseo.DeliveryInformationType(
+        mailAddress=None,
+        onlineAddress=[
+            oseo.OnlineAddressType(protocol="ftp",
+                                   serverAddress="host{}".format(index))
+            for index in range(3)
+        ]
+    )
+    with CaptureQueriesContext(connection) as context:
+        result = submit.create_order_delivery_information(delivery_info,
+                                                          bulk=True)
+    assert len(context.captured_queries) == 2
+    assert result.online_addresses.count() == 3
+
+
+@pytest.mark.django_db
+def test_bulk_create_item_specifications(admin_user):
+    order = models.Order.objects.create(order_type=Order.PRODUCT_ORDER,
+                                        user=admin_user)
+    built = []
+    for index in range(3):
+        built.append((
+            models.ItemSpecification(collection="fake",
+                                     item_id="item{}".format(index)),
+            [models.SelectedItemOption(option="fakeoption",
+                                       value=str(index))],
+            models.ItemSpecificationDeliveryOption(
+                delivery_details="ftp") if index > 0 else None,
+        ))
+    result = submit.bulk_create_item_specifications(order, built)
+    assert [spec.item_id for spec in result] == ["item0", "item1", "item2"]
+    for index, specification in enumerate(
+            order.item_specifications.order_by("id")):
+        assert specification.selected_options.get().value == str(index)
+    assert models.ItemSpecificationDeliveryOption.objects.filter(
+        item_specification__order=order).count() == 2
+
+
 def test_create_order_invoice_address():
     address_fields = {
         "first_name": "phony first",
@@ -214,27 +288,23 @@ def test_check_collection_enabled_fails(settings, order_type,
         )
 
 
-def test_get_collection_settings():
+def test_get_collection_settings(settings):
     collection_identifier = "some_id"
     fake_collection_settings = [
         {"collection_identifier": collection_identifier},
     ]
-    with mock.patch("oseoserver.operations.submit.settings",
-                    autospec=True) as mock_settings:
-        mock_settings.get_collections.return_value = fake_collection_settings
-        result = submit.get_collection_settings(collection_identifier)
-        assert result == fake_collection_settings[0]
-
-
-def test_get_collection_settings_invalid_collection_identifier():
-    with mock.patch("oseoserver.operations.submit.settings",
-                    autospec=True) as mock_settings, \
-            pytest.raises(errors.OseoServerError):
-        mock_settings.get_collections.return_value = []
+    settings.OSEOSERVER_COLLECTIONS = fake_collection_settings
+    result = submit.get_collection_settings(collection_identifier)
+    assert result == fake_collection_settings[0]
+
+
+def test_get_collection_settings_invalid_collection_identifier(settings):
+    settings.OSEOSERVER_COLLECTIONS = []
+    with pytest.raises(errors.OseoServerError):
         submit.get_collection_settings("some_id")
 
 
-def test_create_option():
+def test_create_option(settings):
     option_name = "dummy"
     option_value = "some_value"
     fake_collection_config = {
@@ -250,12 +320,9 @@ def test_create_option():
     mock_processor = MockProcessor.return_value
     mock_processor.parse_option.return_value = option_value
     with mock.patch.object(
-            submit, "get_order_configuration") as mock_get_order_config, \
-            mock.patch("oseoserver.operations.submit.settings",
-                       autospec=True) as mock_settings:
+            submit, "get_order_configuration") as mock_get_order_config:
         mock_get_order_config.return_value = fake_collection_config
-        mock_settings.get_processing_options.return_value = (
-            fake_processing_options)
+        settings.OSEOSERVER_PROCESSING_OPTIONS = fake_processing_options
         result = submit.create_option(
             option_element=option_el,
             order_type="phony",
@@ -277,8 +344,8 @@ def test_create_option():
         (True, True, True, False, errors.InvalidParameterValueError),
     ]
 )
-def test_create_option_invalid_option(available, parseable, legal, choices,
-                                      expected_exception):
+def test_create_option_invalid_option(settings, available, parseable, legal,
+                                      choices, expected_exception):
     option_name = "dummy"
     option_value = "some_value"
     bad_choices = ["nothing", "here"]
@@ -308,12 +375,9 @@ def test_create_option_invalid_option(available, parseable, legal, choices,
 
     with mock.patch.object(
             submit, "get_order_configuration") as mock_get_order_config, \
-            mock.patch("oseoserver.operations.submit.settings",
-                       autospec=True) as mock_settings, \
             pytest.raises(Exception):
         mock_get_order_config.return_value = fake_collection_config
-        mock_settings.get_processing_options.return_value = (
-            fake_processing_options)
+        settings.OSEOSERVER_PROCESSING_OPTIONS = fake_processing_options
         submit.create_option(
             option_element=option_el,
             order_type="phony",
@@ -0,0 +1,101 @@
+"""Unit tests for oseoserver.registry"""
+
+from django.core.exceptions import ImproperlyConfigured
+import mock
+import pytest
+
+from oseoserver import registry
+
+pytestmark = pytest.mark.unit
+
+
+def test_registry_indexes_settings(settings):
+    settings.OSEOSERVER_COLLECTIONS = [
+        {
+            "name": "first",
+            "collection_identifier": "first_id",
+            "product_order": {"enabled": True, "options": []},
+            "massive_order": {"enabled": False},
+        },
+    ]
+    settings.OSEOSERVER_PROCESSING_OPTIONS = [{"name": "an option"}]
+    result = registry.get_registry()
+    assert result.collections_by_name["first"]["collection_identifier"] == (
+        "first_id")
+    assert result.collections_by_identifier["first_id"]["name"] == "first"
+    assert result.options_by_name["an option"] == {"name": "an option"}
+    assert ("first", "PRODUCT_ORDER") in result.order_configurations
+    assert ("first", "MASSIVE_ORDER") not in result.order_configurations
+
+
+def test_registry_is_rebuilt_when_settings_change(settings):
+    settings.OSEOSERVER_PROCESSING_OPTIONS = [{"name": "first"}]
+    first_registry = registry.get_registry()
+    assert registry.get_registry() is first_registry
+    settings.OSEOSERVER_PROCESSING_OPTIONS = [{"name": "second"}]
+    second_registry = registry.get_registry()
+    assert second_registry is not first_registry
+    assert list(second_registry.options_by_name) == ["second"]
+
+
+def test_registry_is_read_only(settings):
+    settings.OSEOSERVER_PROCESSING_OPTIONS = [{"name": "first"}]
+    with pytest.raises(TypeError):
+        registry.get_registry().options_by_name["second"] = {}
+
+
+@pytest.mark.parametrize(["collections", "options"], [
+    ([{"name": "a", "collection_identifier": "x"},
+      {"name": "a", "collection_identifier": "y"}], []),
+    ([{"name": "a", "collection_identifier": "x"},
+      {"name": "b", "collection_identifier": "x"}], []),
+    ([{"name": "a"}], []),
+    ([], [{"name": "first"}, {"name": "first"}]),
+    ([{"name": "a", "collection_identifier": "x",
+       "product_order": {"enabled": True, "options": ["undefined"]}}], []),
+])
+def test_validate_settings_invalid(settings, collections, options):
+    settings.OSEOSERVER_COLLECTIONS = collections
+    settings.OSEOSERVER_PROCESSING_OPTIONS = options
+    with pytest.raises(ImproperlyConfigured):
+        registry.validate_settings()
+
+
+def test_validate_settings_valid(settings):
+    settings.OSEOSERVER_COLLECTIONS = [
+        {
+            "name": "a",
+            "collection_identifier": "x",
+            "product_order": {"enabled": True, "options": ["first"]},
+        },
+    ]
+    settings.OSEOSERVER_PROCESSING_OPTIONS = [{"name": "first"}]
+    registry.validate_settings()
+
+
+def test_get_item_processor_instantiates_once():
+    registry.teardown_item_processors()
+    with mock.patch("oseoserver.utilities.import_class",
+                    autospec=True) as mock_import_class:
+        first = registry.get_item_processor("fake.Processor")
+        second = registry.get_item_processor("fake.Processor")
+    assert first is second
+    mock_import_class.assert_called_once_with("fake.Processor")
+    first.setup.assert_called_once_with()
+    registry.teardown_item_processors()
+    first.teardown.assert_called_once_with()
+
+
+def test_teardown_item_processors_survives_errors():
+    registry.teardown_item_processors()
+    with mock.patch("oseoserver.utilities.import_class",
+                    autospec=True) as mock_import_class:
+        failing = mock.MagicMock()
+        failing.teardown.side_effect = RuntimeError
+        working = mock.MagicMock()
+        mock_import_class.side_effect = [failing, working]
+        registry.get_item_processor("fake.Failing")
+        registry.get_item_processor("fake.Working")
+    registry.teardown_item_processors()
+    working.teardown.assert_called_once_with()
+    assert registry._item_processors == {}
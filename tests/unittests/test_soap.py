@@ -0,0 +1,50 @@
+"""Unit tests for oseoserver.soap"""
+
+from lxml import etree
+import pytest
+
+from oseoserver import soap
+from oseoserver.constants import NAMESPACES
+
+pytestmark = pytest.mark.unit
+
+
+def test_wrap_serialized_response_no_soap():
+    response = b'<oseo:GetStatusResponse xmlns:oseo="{}"/>'.replace(
+        b"{}", NAMESPACES["oseo"].encode("utf-8"))
+    result = soap.wrap_serialized_response(response, soap_version=None)
+    assert result == response
+
+
+@pytest.mark.parametrize("soap_version, soap_ns", [
+    ("1.2", NAMESPACES["soap"]),
+    ("1.1", NAMESPACES["soap1.1"]),
+])
+def test_wrap_serialized_response(soap_version, soap_ns):
+    response_element = etree.Element(
+        "{{{}}}GetStatusResponse".format(NAMESPACES["oseo"]))
+    etree.SubElement(
+        response_element, "{{{}}}status".format(NAMESPACES["oseo"])
+    ).text = "success"
+    response = etree.tostring(response_element, encoding="utf-8")
+    result = soap.wrap_serialized_response(response,
+                                           soap_version=soap_version)
+    expected = etree.tostring(
+        soap.wrap_response(response_element, soap_version), method="c14n")
+    assert etree.tostring(etree.fromstring(result), method="c14n") == expected
+    body = etree.fromstring(result).find("{{{}}}Body".format(soap_ns))
+    assert body[0].tag == response_element.tag
+
+
+def test_wrap_serialized_response_streamed():
+    chunks = [
+        '<oseo:GetStatusResponse xmlns:oseo="{}">'.format(
+            NAMESPACES["oseo"]).encode("utf-8"),
+        b"<oseo:status>success</oseo:status>",
+        b"</oseo:GetStatusResponse>",
+    ]
+    result = soap.wrap_serialized_response(iter(chunks), soap_version="1.2")
+    assert not isinstance(result, bytes)
+    expected = soap.wrap_serialized_response(b"".join(chunks),
+                                              soap_version="1.2")
+    assert b"".join(result) == expected
@@ -1,16 +1,45 @@
 """Unit tests for oseoserver.utilities"""
 
+from lxml import etree
 import pytest
 import mock
-from mock import DEFAULT
 
 from oseoserver import errors
 from oseoserver.models import Order
+from oseoserver import registry
 from oseoserver import utilities
 
 pytestmark = pytest.mark.unit
 
 
+@pytest.mark.parametrize(["first", "second", "expected"], [
+    (
+        '<a:root xmlns:a="urn:x"><a:child>1</a:child></a:root>',
+        '<b:root xmlns:b="urn:x"><b:child> 1 </b:child></b:root>',
+        True
+    ),
+    (
+        '<root><child>1</child></root>',
+        '<root><child>2</child></root>',
+        False
+    ),
+    (
+        '<root><first/><second/></root>',
+        '<root><second/><first/></root>',
+        False
+    ),
+    (
+        '<root attr="1"/>',
+        '<root attr="2"/>',
+        False
+    ),
+])
+def test_elements_equal(first, second, expected):
+    result = utilities.elements_equal(etree.fromstring(first),
+                                      etree.fromstring(second))
+    assert result == expected
+
+
 def test_get_generic_order_config_incorrect_order_type():
     order_type = "fake"
     with pytest.raises(AttributeError) as excinfo:
@@ -33,27 +62,34 @@ def test_get_generic_order_config(order_type, fake_config):
         assert  result == fake_config
 
 
-def test_validate_processing_option_no_choices():
+def test_validate_processing_option_no_choices(settings):
     fake_option_name = "dummy name"
     fake_parsed_value = "dummy value"
-    order_type = Order.PRODUCT_ORDER
-    with mock.patch.multiple("oseoserver.utilities",
-                             get_order_configuration=DEFAULT,
-                             get_generic_order_config=DEFAULT,
-                             import_class=DEFAULT) as mock_util, \
-            mock.patch("oseoserver.settings.get_processing_options",
-                       autospec=True) as mock_get_options:
-        mock_util["get_order_configuration"].return_value = {
-            "product_order": {"options": [fake_option_name]}
-        }
-        mock_util["get_generic_order_config"].return_value = {
-            "item_processor": "dummy"}
-        mock_util["import_class"].return_value.parse_option.return_value = (
-            fake_parsed_value)
-        mock_get_options.return_value = [{"name": fake_option_name}]
-        result = utilities.validate_processing_option(
-            fake_option_name, fake_parsed_value, order_type, "dummy")
-        assert result == fake_parsed_value
+    settings.OSEOSERVER_COLLECTIONS = [
+        {
+            "name": "dummy",
+            "collection_identifier": "dummy_id",
+            "options": [fake_option_name],
+        },
+    ]
+    settings.OSEOSERVER_PROCESSING_OPTIONS = [{"name": fake_option_name}]
+    settings.OSEOSERVER_PRODUCT_ORDER = {"item_processor": "fake.Processor"}
+    registry.teardown_item_processors()
+    try:
+        with mock.patch("oseoserver.utilities.import_class",
+                        autospec=True) as mock_import_class:
+            processor = mock_import_class.return_value
+            processor.parse_option.return_value = fake_parsed_value
+            result = utilities.validate_processing_option(
+                fake_option_name, fake_parsed_value, Order.PRODUCT_ORDER,
+                "dummy"
+            )
+    finally:
+        registry.teardown_item_processors()
+    assert result == fake_parsed_value
+    mock_import_class.assert_called_once_with("fake.Processor")
+    processor.parse_option.assert_called_once_with(
+        fake_option_name, fake_parsed_value)
 
 
 @pytest.mark.parametrize(["order_type", "expected_exception"], [
@@ -94,41 +130,97 @@ def test_get_order_configuration_enabled(order_type):
     assert result == fake_collection_config
 
 
-def test_get_option_configuration_invalid_option():
+def test_get_option_configuration_invalid_option(settings):
     fake_name = "fake_option"
-    with mock.patch("oseoserver.utilities.settings",
-                    autospec=True) as mock_settings, \
-            pytest.raises(errors.OseoServerError):
-        mock_settings.get_processing_options.return_value = []
+    settings.OSEOSERVER_PROCESSING_OPTIONS = []
+    with pytest.raises(errors.OseoServerError):
         utilities.get_option_configuration(fake_name)
 
 
-def test_get_option_configuration_valid_option():
+def test_get_option_configuration_valid_option(settings):
     fake_name = "fake_option"
     fake_option_config = {"name": fake_name}
-    with mock.patch("oseoserver.utilities.settings",
-                    autospec=True) as mock_settings:
-        mock_settings.get_processing_options.return_value = [
-            fake_option_config]
-        result = utilities.get_option_configuration(fake_name)
-        assert result == fake_option_config
+    settings.OSEOSERVER_PROCESSING_OPTIONS = [fake_option_config]
+    result = utilities.get_option_configuration(fake_name)
+    assert result == fake_option_config
 
 
-def test_validate_collection_id_invalid_id():
+def test_validate_collection_id_invalid_id(settings):
     fake_id = "fake collection id"
-    with mock.patch("oseoserver.utilities.settings",
-                    autospec=True) as mock_settings, \
-            pytest.raises(errors.InvalidParameterValueError):
-        mock_settings.get_collections.return_value = []
+    settings.OSEOSERVER_COLLECTIONS = []
+    with pytest.raises(errors.InvalidParameterValueError):
         utilities.validate_collection_id(fake_id)
 
 
-def test_validate_collection_id_valid_id():
+def test_validate_collection_id_valid_id(settings):
     fake_id = "fake collection id"
     fake_collection_config = {"collection_identifier": fake_id}
-    with mock.patch("oseoserver.utilities.settings",
-                    autospec=True) as mock_settings:
-        mock_settings.get_collections.return_value = [fake_collection_config]
-        result = utilities.validate_collection_id(fake_id)
-        assert result == fake_collection_config
+    settings.OSEOSERVER_COLLECTIONS = [fake_collection_config]
+    result = utilities.validate_collection_id(fake_id)
+    assert result == fake_collection_config
+
+
+class _IteratingProcessor(object):
+    """A fake item processor that lists identifiers with checkpoints"""
+
+    def __init__(self, total):
+        self.identifiers = ["item{}".format(i) for i in range(total)]
+        self.requested_checkpoints = []
 
+    def iterate_massive_order_item_identifiers(self, collection, start, end,
+                                               checkpoint=None):
+        self.requested_checkpoints.append(checkpoint)
+        first = 0 if checkpoint is None else checkpoint + 1
+        for index in range(first, len(self.identifiers)):
+            yield self.identifiers[index], index
+
+
+@pytest.mark.parametrize("batch_index, checkpoint, expected, expected_next", [
+    (0, None, ["item0", "item1", "item2"], 2),
+    (1, 2, ["item3", "item4", "item5"], 5),
+    (1, None, ["item3", "item4", "item5"], 5),
+    (2, 5, ["item6"], 6),
+    (3, 6, [], 6),
+])
+def test_get_massive_order_batch_item_identifiers_iterator(
+        batch_index, checkpoint, expected, expected_next):
+    processor = _IteratingProcessor(total=7)
+    identifiers, next_checkpoint = (
+        utilities.get_massive_order_batch_item_identifiers(
+            processor, collection="fake", start=None, end=None,
+            batch_index=batch_index, items_per_batch=3,
+            checkpoint=checkpoint
+        )
+    )
+    assert identifiers == expected
+    assert next_checkpoint == expected_next
+    assert processor.requested_checkpoints == [checkpoint]
+
+
+def test_get_massive_order_batch_item_identifiers_paged():
+    processor = mock.Mock(spec=["get_massive_order_batch_item_identifiers"])
+    processor.get_massive_order_batch_item_identifiers.return_value = ["a"]
+    identifiers, next_checkpoint = (
+        utilities.get_massive_order_batch_item_identifiers(
+            processor, collection="fake", start=None, end=None,
+            batch_index=4, items_per_batch=3
+        )
+    )
+    assert identifiers == ["a"]
+    assert next_checkpoint is None
+    processor.get_massive_order_batch_item_identifiers.assert_called_once_with(
+        batch_index=4, collection="fake", start=None, end=None,
+        items_per_batch=3
+    )
+
+
+@pytest.mark.parametrize("priority, expected", [
+    ("FAST_TRACK", {"queue": "fast", "priority": 9}),
+    ("STANDARD", {}),
+])
+def test_get_task_routing(settings, priority, expected):
+    settings.OSEOSERVER_MASSIVE_ORDER = {
+        "routing": {"FAST_TRACK": {"queue": "fast", "priority": 9}},
+    }
+    result = utilities.get_task_routing("MASSIVE_ORDER", priority)
+    assert result == expected